@@ -0,0 +1,254 @@
+import argparse
+import sys
+import logging
+import os
+import json
+import time
+import functools
+import tempfile
+import yaml
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv # Optional: for loading API key from .env
+
+# Load environment variables (e.g., GOOGLE_API_KEY)
+load_dotenv()
+
+try:
+    from src.manifest import load_manifest
+    from src.local_extractor import get_local_extraction_stats
+    from src.cli_options import (add_pipeline_arguments, add_form_arguments, add_journal_arguments, create_caches,
+                                 create_fill_plan_cache, configure_gemini, build_ocr_options, start_instrumentation,
+                                 open_run_journal, finish_run_journal)
+    from src.fill_plan import compile_form_plan
+    from src.ocr_templates import load_ocr_templates, OCR_TEMPLATES_FILE
+    from src.utils import load_config, cleanup_temp_dir, percentile
+    from src.metrics import propagate
+    from src.gemini_client import get_client_stats
+except ImportError as e:
+    logging.error(f"Failed to import source modules: {e}")
+    logging.error("Please ensure you are running the script from the project root directory.")
+    sys.exit(1)
+
+
+# Set up basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(threadName)s] %(message)s')
+
+
+def keep_finished_records(output_path, fill_form=False):
+    """
+    Rewrites the output file of an earlier attempt with only its finished records
+    (status 'ok' and, when forms are filled, form_filled), so failed applicants can
+    be appended again without duplicates. Returns {applicant_id: record} of those kept.
+    """
+    finished = {}
+    try:
+        with open(output_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by the interruption
+                if isinstance(record, dict) and record.get('status') == 'ok' and (not fill_form or record.get('form_filled')):
+                    finished[record['applicant_id']] = record
+    except FileNotFoundError:
+        return finished
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        for record in finished.values():
+            f.write(json.dumps(record) + '\n')
+    os.replace(tmp_path, output_path)
+    return finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch document extraction: one consolidated profile per applicant, written as JSON Lines.")
+
+    parser.add_argument(
+        '--manifest',
+        type=str,
+        required=True,
+        help="Directory of per-applicant folders of PDFs, or a .csv/.jsonl file listing each applicant's documents."
+    )
+
+    parser.add_argument(
+        '--output',
+        type=str,
+        required=True,
+        help="Path of the JSON Lines file to write, one consolidated profile per applicant."
+    )
+
+    parser.add_argument(
+        '--applicant_concurrency',
+        type=int,
+        default=4,
+        help="Maximum number of applicants processed at the same time. OCR and Gemini work is shared through the pools below."
+    )
+
+    parser.add_argument(
+        '--temp_dir',
+        type=str,
+        default='temp/',
+        help="Directory to store temporary files like images generated from PDFs. Will be created if it doesn't exist."
+    )
+
+    parser.add_argument(
+        '--config_dir',
+        type=str,
+        default='config/',
+        help="Directory containing configuration files (gemini_prompts.yaml, form_mappings.yaml)."
+    )
+
+    parser.add_argument(
+        '--fill_form',
+        type=str,
+        default=None,
+        help="Also fill this form (a name from config/form_mappings.yaml) for every applicant, in headless browsers from a shared pool."
+    )
+
+    parser.add_argument(
+        '--browser_pool_size',
+        type=int,
+        default=2,
+        help="Number of warm headless Chrome instances used to fill forms concurrently with --fill_form."
+    )
+
+    add_form_arguments(parser)
+    add_journal_arguments(parser)
+    add_pipeline_arguments(parser)
+
+    args = parser.parse_args()
+    start_instrumentation(args)
+
+    # The OCR pipeline (and Pillow, pdf2image and pytesseract) is imported only once
+    # the arguments are valid, so --help and usage errors return at once
+    from src.applicant import process_applicant, fill_applicant_form
+
+    # --- Run journal ---
+    # Per-applicant stage results; re-run the same command with --resume to skip finished work
+    try:
+        journal = open_run_journal(args, {'command': 'batch', 'manifest': args.manifest, 'output': args.output})
+    except FileNotFoundError as e:
+        logging.error(f"Cannot resume: {e}")
+        sys.exit(1)
+
+    os.makedirs(args.temp_dir, exist_ok=True)
+
+    # --- Load Configuration and Manifest ---
+    try:
+        gemini_prompts = load_config(os.path.join(args.config_dir, 'gemini_prompts.yaml'))
+        form_mappings = load_config(os.path.join(args.config_dir, 'form_mappings.yaml')) if args.fill_form else {}
+        ocr_templates = load_ocr_templates(os.path.join(args.config_dir, OCR_TEMPLATES_FILE)) if args.roi_ocr else None
+        applicants = load_manifest(args.manifest)
+    except (FileNotFoundError, ValueError, yaml.YAMLError) as e:
+        logging.error(f"Error loading batch inputs: {e}")
+        sys.exit(1)
+
+    if 'initial_extraction' not in gemini_prompts or 'consolidation' not in gemini_prompts:
+        logging.error("Missing required prompts ('initial_extraction' or 'consolidation') in gemini_prompts.yaml")
+        sys.exit(1)
+
+    if args.batch_extraction and 'batch_extraction' not in gemini_prompts:
+        logging.error("--batch_extraction needs a 'batch_extraction' prompt in gemini_prompts.yaml")
+        sys.exit(1)
+
+    if not applicants:
+        logging.error(f"No applicants found in manifest: {args.manifest}")
+        sys.exit(1)
+
+    form_plan = None
+    if args.fill_form:
+        try:
+            form_plan = compile_form_plan(args.fill_form, form_mappings)
+        except ValueError as e:
+            logging.error(str(e))
+            sys.exit(1)
+
+    if not os.environ.get('GOOGLE_API_KEY'):
+        logging.warning("GOOGLE_API_KEY environment variable not set. Only documents handled locally or from cache can be processed.")
+
+    ocr_cache, gemini_cache = create_caches(args)
+    configure_gemini(args)
+    ocr_options = build_ocr_options(args, ocr_cache, ocr_templates)
+
+    browser_pool = None
+    fill_form = None
+    if args.fill_form:
+        # Selenium is only imported when forms are filled
+        from src.browser_pool import BrowserPool
+        browser_pool = BrowserPool(size=args.browser_pool_size, headless=True)
+        if not browser_pool.warm_up():
+            logging.error("Could not start any browser for form filling. Exiting.")
+            sys.exit(1)
+        fill_form = functools.partial(fill_applicant_form, browser_pool, form_mappings, form_plan,
+                                      create_fill_plan_cache(args), not args.no_batch_fill)
+
+    # --- Process Applicants ---
+    # On --resume, applicants with a finished record in the output file are not processed again
+    finished = keep_finished_records(args.output, bool(args.fill_form)) if args.resume else {}
+    pending_applicants = [applicant for applicant in applicants if applicant['applicant_id'] not in finished]
+    if finished:
+        logging.info(f"{len(applicants) - len(pending_applicants)} applicants already finished in {args.output}; skipping them.")
+    logging.info(f"Processing {len(pending_applicants)} applicants from {args.manifest}...")
+
+    latencies = []
+    succeeded = len(applicants) - len(pending_applicants)
+    filled = succeeded if args.fill_form else 0
+    batch_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=args.ocr_concurrency, thread_name_prefix='ocr') as ocr_pool, \
+         ThreadPoolExecutor(max_workers=args.gemini_concurrency, thread_name_prefix='gemini') as gemini_pool, \
+         ThreadPoolExecutor(max_workers=args.applicant_concurrency, thread_name_prefix='applicant') as applicant_pool, \
+         open(args.output, 'a' if args.resume else 'w') as output_file:
+
+        futures = [applicant_pool.submit(propagate(process_applicant), applicant, gemini_prompts, ocr_options, ocr_pool, gemini_pool,
+                                         not args.no_local_extraction, not args.no_local_consolidation, fill_form, args.batch_extraction, journal)
+                   for applicant in pending_applicants]
+
+        for future in as_completed(futures):
+            record = future.result()
+            latencies.append(record['seconds'])
+            if record['status'] == 'ok':
+                succeeded += 1
+            if record.get('form_filled'):
+                filled += 1
+            # Stream each profile as soon as it is ready
+            output_file.write(json.dumps(record) + '\n')
+            output_file.flush()
+            logging.info(f"Applicant {record['applicant_id']}: {record['status']} in {record['seconds']:.2f}s ({len(latencies)}/{len(pending_applicants)})")
+
+    elapsed = time.perf_counter() - batch_start
+    cleanup_temp_dir(args.temp_dir)
+    if browser_pool is not None:
+        browser_pool.close()
+
+    # Failed applicants (or unfilled forms) keep the journal so the batch can be resumed
+    if succeeded == len(applicants) and (not args.fill_form or filled == succeeded):
+        finish_run_journal(args, journal)
+
+    # --- Summary ---
+    print("\n>>> Batch summary")
+    print(f">>> Applicants: {len(applicants)} ({succeeded} ok, {len(applicants) - succeeded} failed)")
+    print(f">>> Wall time: {elapsed:.1f}s, throughput: {len(pending_applicants) / elapsed * 60:.1f} applicants/min")
+    print(f">>> Latency per applicant: p50 {percentile(latencies, 0.5):.2f}s, p95 {percentile(latencies, 0.95):.2f}s")
+    if not args.no_local_extraction:
+        extraction_stats = get_local_extraction_stats()
+        print(f">>> Local extraction: {extraction_stats['local']} documents (Gemini calls avoided), {extraction_stats['fallback']} sent to Gemini")
+    for cache in (ocr_cache, gemini_cache):
+        if cache is not None:
+            cache_stats = cache.stats()
+            print(f">>> {cache.name}: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    client_stats = get_client_stats()
+    print(f">>> Gemini rate limiting: {client_stats['throttled']} requests throttled ({client_stats['throttle_seconds']:.1f}s waiting), "
+          f"max queue depth {client_stats['max_queue_depth']}, circuit breaker {client_stats['circuit_state']} "
+          f"(opened {client_stats['circuit_opens']} times)")
+    if args.fill_form:
+        print(f">>> Forms filled: {filled} of {succeeded} profiles ('{args.fill_form}', {args.browser_pool_size} browsers)")
+    print(f">>> Profiles written to {args.output}")
+
+    if not succeeded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmarks process_pdf_and_ocr on a PDF with different OCR worker counts.
+
+Usage (from the project root):
+    python benchmarks/bench_ocr.py samples/sample_adhar.pdf --workers 1 2 4 --repeat 3
+    python benchmarks/bench_ocr.py statement.pdf --workers 1 --page_window 1 2
+
+Worker count 1 is the original serial loop and is used as the baseline.
+Page windows compare streaming OCR against it, mainly for peak memory.
+The script also checks that every mode returns exactly the same text.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Allow running the script directly from the project root or the benchmarks folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.pdf_ocr import process_pdf_and_ocr
+from src.utils import PeakMemoryMonitor
+
+
+def time_ocr(pdf_path, temp_dir, workers, repeat, page_window=None):
+    """Runs OCR `repeat` times and returns (best_seconds, peak_mb, text)."""
+    best = None
+    peak_mb = 0.0
+    text = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with PeakMemoryMonitor() as memory_monitor:
+            # The text layer fast path is disabled so every page is actually OCR'd
+            text = process_pdf_and_ocr(pdf_path, temp_dir=temp_dir, workers=workers, page_window=page_window,
+                                       use_text_layer=False)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        peak_mb = max(peak_mb, memory_monitor.peak_mb)
+    return best, peak_mb, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial vs parallel OCR.")
+    parser.add_argument('pdf', type=str, help="Path to the PDF file to benchmark.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="Worker counts to compare (1 = serial).")
+    parser.add_argument('--page_window', type=int, nargs='*', default=[], help="Streaming page windows to compare (serial OCR only).")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per worker count; the best time is reported.")
+    parser.add_argument('--temp_dir', type=str, default='temp/', help="Temporary directory passed to process_pdf_and_ocr.")
+    args = parser.parse_args()
+
+    # Keep the per-page logging out of the results table
+    logging.getLogger().setLevel(logging.WARNING)
+    os.makedirs(args.temp_dir, exist_ok=True)
+
+    # Serial baseline always runs first; memory is measured in this process only,
+    # so peak figures for parallel runs exclude the worker processes.
+    modes = [(workers, None) for workers in dict.fromkeys([1] + args.workers)]
+    modes += [(1, window) for window in args.page_window]
+    baseline_time, baseline_text = None, None
+
+    print(f"Benchmarking OCR on {args.pdf} (best of {args.repeat})")
+    print(f"{'workers':>8} {'window':>7} {'seconds':>10} {'speedup':>8} {'peak MB':>9} {'same output':>12}")
+
+    for workers, page_window in modes:
+        elapsed, peak_mb, text = time_ocr(args.pdf, args.temp_dir, workers, args.repeat, page_window)
+        if baseline_time is None:
+            baseline_time, baseline_text = elapsed, text
+        speedup = baseline_time / elapsed if elapsed else float('inf')
+        window_label = page_window or 'all'
+        print(f"{workers:>8} {window_label:>7} {elapsed:>10.2f} {speedup:>7.2f}x {peak_mb:>9.1f} {str(text == baseline_text):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Compares the per-page cost of the OCR engines: pytesseract (a tesseract process
+per page, with the image written to a temporary file) and tesserocr (one engine
+per thread with the language model loaded once, fed from memory).
+
+Pages are rendered once up front so only the OCR call is timed. The fixed
+per-call overhead is measured separately on a tiny blank image, where recognition
+itself costs almost nothing.
+
+Usage (from the project root):
+    python benchmarks/bench_ocr_engine.py samples/sample_adhar.pdf
+    python benchmarks/bench_ocr_engine.py statement.pdf --pages 5 --overhead_calls 20
+
+Engines that are not installed are reported as skipped. The script also checks
+that each engine returns the same text as pytesseract.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Allow running the script directly from the project root or the benchmarks folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from pdf2image import convert_from_path
+
+from src.pdf_ocr import ocr_image, get_tesseract_version, OCR_DPI
+from src.tesseract_engine import set_ocr_engine, resolve_ocr_engine
+
+ENGINES = ('pytesseract', 'tesserocr')
+
+
+def time_engine(engine, images, overhead_calls):
+    """
+    OCRs every image with engine. Returns (first page seconds, mean seconds of the
+    other pages, mean seconds per call on a blank image, texts), or None if the
+    engine is not available.
+    """
+    set_ocr_engine(engine)
+    if resolve_ocr_engine() != engine:
+        return None
+    try:
+        get_tesseract_version()
+    except RuntimeError:
+        return None
+
+    texts = []
+    page_times = []
+    for image in images:
+        start = time.perf_counter()
+        texts.append(ocr_image(image))
+        page_times.append(time.perf_counter() - start)
+
+    blank = Image.new('L', (64, 32), 255)
+    start = time.perf_counter()
+    for _ in range(overhead_calls):
+        ocr_image(blank)
+    overhead = (time.perf_counter() - start) / overhead_calls
+
+    later_pages = page_times[1:] or page_times
+    return page_times[0], sum(later_pages) / len(later_pages), overhead, texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-page OCR cost of pytesseract vs in-process tesserocr.")
+    parser.add_argument('pdf', type=str, help="Path to the PDF file to benchmark.")
+    parser.add_argument('--pages', type=int, default=0, help="Number of pages to OCR from the start of the PDF (0 = all).")
+    parser.add_argument('--dpi', type=int, default=OCR_DPI, help="Resolution the pages are rendered at.")
+    parser.add_argument('--overhead_calls', type=int, default=10, help="OCR calls on a blank image used to measure the fixed per-call cost.")
+    args = parser.parse_args()
+
+    # Keep the per-page logging out of the results table
+    logging.getLogger().setLevel(logging.WARNING)
+
+    images = convert_from_path(args.pdf, dpi=args.dpi, first_page=1, last_page=args.pages or None)
+    if not images:
+        print(f"No pages rendered from {args.pdf}")
+        sys.exit(1)
+
+    print(f"Benchmarking OCR engines on {len(images)} pages of {args.pdf} at {args.dpi} DPI")
+    print(f"{'engine':>12} {'first page ms':>14} {'ms/page':>9} {'overhead ms':>12} {'speedup':>8} {'same output':>12}")
+
+    baseline_time, baseline_texts = None, None
+    for engine in ENGINES:
+        result = time_engine(engine, images, args.overhead_calls)
+        if result is None:
+            print(f"{engine:>12} {'skipped (not installed)':>57}")
+            continue
+        first_page, per_page, overhead, texts = result
+        if baseline_time is None:
+            baseline_time, baseline_texts = per_page, texts
+        speedup = baseline_time / per_page if per_page else float('inf')
+        print(f"{engine:>12} {first_page * 1000:>14.1f} {per_page * 1000:>9.1f} {overhead * 1000:>12.1f} "
+              f"{speedup:>7.2f}x {str(texts == baseline_texts):>12}")
+
+    for image in images:
+        image.close()
+
+
+if __name__ == "__main__":
+    main()
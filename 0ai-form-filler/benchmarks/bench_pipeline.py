@@ -0,0 +1,253 @@
+"""
+End-to-end benchmark of the run.py pipeline without external services.
+
+Synthetic Aadhaar/PAN/passbook PDFs are generated, Gemini is replaced by a local
+stub with a fixed latency and canned JSON, and the form is served from a static
+copy of local_test_form for headless Chrome. Results are written as JSON so runs
+on different commits can be compared.
+
+Usage (from the project root):
+    python benchmarks/bench_pipeline.py --applicants 4 --pages 3 --gemini_latency 0.5
+    python benchmarks/bench_pipeline.py --ocr_workers 2 --compare benchmarks/results/pipeline-abc1234.json
+    python benchmarks/bench_pipeline.py --skip_fill --no_local_extraction
+
+Two passes are made over the documents:
+  * a stage breakdown, running rasterize, OCR, extract, consolidate and fill one
+    after another so each stage is timed on its own (serial in-memory OCR path);
+  * an end-to-end pass through extract_documents/consolidate_documents with the
+    pipeline options given on the command line, which gives documents/sec.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Allow running the script directly from the project root or the benchmarks folder
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from pdf2image import convert_from_path
+
+from src.pdf_ocr import OCR_DPI, ocr_image
+from src.pipeline import extract_document, extract_documents, extract_documents_batched, consolidate_documents
+from src.local_extractor import get_local_extraction_stats
+from src.cli_options import add_pipeline_arguments, build_ocr_options, configure_gemini
+from src.ocr_templates import load_ocr_templates, OCR_TEMPLATES_FILE
+from src.utils import load_config, cleanup_temp_dir, PeakMemoryMonitor
+
+from synthetic_documents import generate_documents
+from gemini_stub import GeminiStub, install
+from form_server import StaticFormServer
+
+STAGES = ('rasterize', 'ocr', 'extract', 'consolidate', 'fill')
+FORM_NAME = 'local_test_form'
+
+
+def git_commit():
+    """Returns the short commit hash of the working tree, or 'unknown'."""
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PROJECT_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{output}-dirty" if dirty else output
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class StageTimer:
+    """Accumulates wall time and call counts per stage."""
+
+    def __init__(self):
+        self.seconds = {stage: 0.0 for stage in STAGES}
+        self.calls = {stage: 0 for stage in STAGES}
+
+    def add(self, stage, start_time):
+        self.seconds[stage] += time.perf_counter() - start_time
+        self.calls[stage] += 1
+
+    def as_dict(self):
+        return {stage: {'seconds': round(self.seconds[stage], 4), 'calls': self.calls[stage]} for stage in STAGES}
+
+
+def fill_form(profile, form_mappings, form_url):
+    """Fills the static form headlessly; returns False if no browser could be started."""
+    from src.selenium_filler import fill_online_form
+
+    mappings = {FORM_NAME: dict(form_mappings[FORM_NAME], url=form_url)}
+    driver, _ = fill_online_form(FORM_NAME, profile, mappings, headless=True)
+    if driver is None:
+        return False
+    driver.quit()
+    return True
+
+
+def run_stage_breakdown(applicants, prompts, form_mappings, args):
+    timer = StageTimer()
+    fill_available = not args.skip_fill
+
+    with PeakMemoryMonitor() as memory_monitor, StaticFormServer() as form_server:
+        for applicant in applicants:
+            results = []
+            for doc_path in applicant['documents']:
+                start_time = time.perf_counter()
+                images = convert_from_path(doc_path, dpi=OCR_DPI)
+                timer.add('rasterize', start_time)
+
+                start_time = time.perf_counter()
+                page_texts = [f"[--- Page {number} ---]\n{ocr_image(image)}" for number, image in enumerate(images, 1)]
+                timer.add('ocr', start_time)
+                del images
+
+                start_time = time.perf_counter()
+                result = extract_document(doc_path, "\n".join(page_texts), prompts['initial_extraction'],
+                                          not args.no_local_extraction)
+                timer.add('extract', start_time)
+                if result is not None:
+                    results.append(result)
+
+            start_time = time.perf_counter()
+            profile = consolidate_documents(results, prompts['consolidation'], prompts.get('conflict_resolution'),
+                                            not args.no_local_consolidation) if results else None
+            timer.add('consolidate', start_time)
+
+            if fill_available and profile:
+                start_time = time.perf_counter()
+                fill_available = fill_form(profile, form_mappings, form_server.url)
+                if fill_available:
+                    timer.add('fill', start_time)
+                else:
+                    logging.warning("No browser available; skipping the fill stage.")
+
+    return timer, memory_monitor.peak_mb
+
+
+def run_end_to_end(applicants, prompts, ocr_options, args):
+    profiles = 0
+    start_time = time.perf_counter()
+    with PeakMemoryMonitor() as memory_monitor:
+        for applicant in applicants:
+            profile = None
+            if args.batch_extraction:
+                results, profile = extract_documents_batched(applicant['documents'], prompts, ocr_options,
+                                                             ocr_concurrency=args.ocr_concurrency,
+                                                             gemini_concurrency=args.gemini_concurrency,
+                                                             local_extraction=not args.no_local_extraction,
+                                                             include_profile=args.no_local_consolidation)
+            else:
+                results = extract_documents(applicant['documents'], prompts['initial_extraction'], ocr_options,
+                                            ocr_concurrency=args.ocr_concurrency, gemini_concurrency=args.gemini_concurrency,
+                                            local_extraction=not args.no_local_extraction)
+            if results and (profile or consolidate_documents(results, prompts['consolidation'],
+                                                             prompts.get('conflict_resolution'), not args.no_local_consolidation)):
+                profiles += 1
+    return time.perf_counter() - start_time, profiles, memory_monitor.peak_mb
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit', '?')}):")
+    rows = [(stage, baseline['stages'][stage]['seconds'], results['stages'][stage]['seconds']) for stage in STAGES
+            if stage in baseline.get('stages', {})]
+    rows.append(('end_to_end', baseline['end_to_end']['seconds'], results['end_to_end']['seconds']))
+    for name, before, after in rows:
+        change = f"{(after - before) / before:+.1%}" if before else 'n/a'
+        print(f"{name:>12} {before:>10.3f}s -> {after:>8.3f}s {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extraction pipeline with synthetic documents and a Gemini stub.")
+    parser.add_argument('--applicants', type=int, default=2, help="Number of synthetic applicants (three documents each).")
+    parser.add_argument('--pages', type=int, default=1, help="Pages per synthetic document.")
+    parser.add_argument('--gemini_latency', type=float, default=0.5, help="Seconds the Gemini stub waits before answering.")
+    parser.add_argument('--skip_fill', action='store_true', help="Skip the headless Selenium fill stage.")
+    parser.add_argument('--output', type=str, default=None,
+                        help="Path of the JSON results file (default benchmarks/results/pipeline-<commit>.json).")
+    parser.add_argument('--compare', type=str, default=None, help="Earlier results JSON to compare against.")
+    parser.add_argument('--temp_dir', type=str, default='temp/', help="Temporary directory passed to process_pdf_and_ocr.")
+    parser.add_argument('--config_dir', type=str, default='config/', help="Directory containing the YAML configuration files.")
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+
+    # Keep the per-document logging out of the results table
+    logging.getLogger().setLevel(logging.WARNING)
+    os.makedirs(args.temp_dir, exist_ok=True)
+
+    prompts = load_config(os.path.join(args.config_dir, 'gemini_prompts.yaml'))
+    form_mappings = load_config(os.path.join(args.config_dir, 'form_mappings.yaml'))
+    # Caches are disabled so every run does the full work
+    ocr_templates = load_ocr_templates(os.path.join(args.config_dir, OCR_TEMPLATES_FILE)) if args.roi_ocr else None
+    ocr_options = build_ocr_options(args, ocr_cache=None, ocr_templates=ocr_templates)
+    configure_gemini(args)
+
+    with tempfile.TemporaryDirectory(prefix='bench_docs_') as documents_dir:
+        applicants = generate_documents(documents_dir, applicants=args.applicants, pages=args.pages)
+        stub = install(GeminiStub([applicant['profile'] for applicant in applicants], latency=args.gemini_latency))
+        document_count = sum(len(applicant['documents']) for applicant in applicants)
+        print(f"Benchmarking {args.applicants} applicants x 3 documents x {args.pages} pages "
+              f"(Gemini stub latency {args.gemini_latency}s)")
+
+        timer, breakdown_peak_mb = run_stage_breakdown(applicants, prompts, form_mappings, args)
+        breakdown_gemini_calls = stub.calls
+        elapsed, profiles, end_to_end_peak_mb = run_end_to_end(applicants, prompts, ocr_options, args)
+
+    cleanup_temp_dir(args.temp_dir)
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {
+            'applicants': args.applicants,
+            'pages': args.pages,
+            'documents': document_count,
+            'gemini_latency': args.gemini_latency,
+            'ocr_options': {key: value for key, value in ocr_options.items() if key not in ('temp_dir', 'ocr_cache', 'templates')},
+            'roi_ocr': args.roi_ocr,
+            'ocr_engine': args.ocr_engine,
+            'ocr_concurrency': args.ocr_concurrency,
+            'gemini_concurrency': args.gemini_concurrency,
+            'local_extraction': not args.no_local_extraction,
+            'local_consolidation': not args.no_local_consolidation,
+            'batch_extraction': args.batch_extraction,
+            'prompt_compaction': not args.no_prompt_compaction,
+            'gemini_token_budget': args.gemini_token_budget,
+        },
+        'stages': timer.as_dict(),
+        'stage_breakdown_peak_mb': round(breakdown_peak_mb, 1),
+        'end_to_end': {
+            'seconds': round(elapsed, 4),
+            'documents_per_sec': round(document_count / elapsed, 3) if elapsed else None,
+            'profiles': profiles,
+            'peak_mb': round(end_to_end_peak_mb, 1),
+        },
+        'gemini_stub_calls': {'stage_breakdown': breakdown_gemini_calls, 'end_to_end': stub.calls - breakdown_gemini_calls},
+        'local_extraction': get_local_extraction_stats(),
+    }
+
+    print(f"\n{'stage':>12} {'seconds':>10} {'calls':>6} {'per call':>9}")
+    for stage in STAGES:
+        seconds, calls = timer.seconds[stage], timer.calls[stage]
+        per_call = f"{seconds / calls:.3f}" if calls else '-'
+        print(f"{stage:>12} {seconds:>10.3f} {calls:>6} {per_call:>9}")
+    print(f"\nEnd to end: {elapsed:.2f}s for {document_count} documents "
+          f"({results['end_to_end']['documents_per_sec']} documents/sec), {profiles} profiles")
+    print(f"Peak memory: {breakdown_peak_mb:.1f} MB (stage breakdown), {end_to_end_peak_mb:.1f} MB (end to end)")
+
+    output_path = args.output or os.path.join(PROJECT_ROOT, 'benchmarks', 'results', f"pipeline-{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output_path}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
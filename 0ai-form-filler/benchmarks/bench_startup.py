@@ -0,0 +1,101 @@
+"""
+Checks that the command-line entry points start quickly.
+
+Each entry point is imported in a fresh interpreter with `python -X importtime`.
+The script reports the import cost and the slowest imports, and checks that the
+heavy backends (Gemini SDK, Selenium, the OCR stack) are not imported at startup
+or by `--help`. It exits with
+status 1 if a budget is exceeded. The same checks run in the test suite
+(tests/test_startup.py).
+
+Usage (from the project root):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --budget_ms 150 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = ('run', 'batch', 'service')
+
+# Maximum cumulative import time of each entry point module, in milliseconds
+DEFAULT_BUDGET_MS = 200.0
+
+# Modules that must only be imported on first use, never at startup
+LAZY_MODULES = ('google.generativeai', 'selenium', 'webdriver_manager', 'pypdf', 'tesserocr',
+                'PIL', 'pdf2image', 'pytesseract', 'src.pdf_ocr', 'src.gemini_processor')
+
+
+def import_times(module, script_args=None):
+    """
+    Imports a module in a fresh interpreter with -X importtime, or with script_args
+    (e.g. ['--help']) runs it as a script. Returns (wall seconds, {imported module:
+    cumulative microseconds}).
+    """
+    if script_args is None:
+        command = [sys.executable, '-X', 'importtime', '-c', f"import {module}"]
+    else:
+        command = [sys.executable, '-X', 'importtime', f"{module}.py", *script_args]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=PROJECT_ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Running {' '.join(command[3:])} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return elapsed, times
+
+
+def eagerly_imported(times, modules):
+    """Returns the modules (or packages) of modules that appear in the import times."""
+    return [module for module in modules if any(name == module or name.startswith(module + '.') for name in times)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the CLI entry points against a budget.")
+    parser.add_argument('--budget_ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help="Maximum cumulative import time of each entry point module, in milliseconds.")
+    parser.add_argument('--top', type=int, default=10, help="Number of slowest imports to list per entry point.")
+    args = parser.parse_args()
+
+    failures = []
+    for entry_point in ENTRY_POINTS:
+        elapsed, times = import_times(entry_point)
+        own_ms = times.get(entry_point, 0) / 1000
+        print(f"\n{entry_point}.py: import {own_ms:.1f} ms (budget {args.budget_ms:.0f} ms), "
+              f"interpreter start + import {elapsed * 1000:.0f} ms")
+
+        print(f"  {'cumulative ms':>13}  module")
+        heaviest = sorted(times.items(), key=lambda item: item[1], reverse=True)
+        for name, cumulative in heaviest[:args.top]:
+            print(f"  {cumulative / 1000:>13.1f}  {name}")
+
+        if own_ms > args.budget_ms:
+            failures.append(f"{entry_point}: import took {own_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+        eager = eagerly_imported(times, LAZY_MODULES)
+        if eager:
+            failures.append(f"{entry_point}: imported at startup but should be lazy: {', '.join(eager)}")
+        _, help_times = import_times(entry_point, ['--help'])
+        eager = eagerly_imported(help_times, LAZY_MODULES)
+        if eager:
+            failures.append(f"{entry_point} --help: imports modules that should be lazy: {', '.join(eager)}")
+
+    if failures:
+        print("\nStartup budget exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll entry points within the startup budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Serves the static copy of local_test_form (benchmarks/fixtures/) on a free local
+port, so form filling can be benchmarked without the React dev server.
+"""
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FORM_PAGE = 'local_test_form.html'
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass  # Keep request lines out of the benchmark output
+
+
+class StaticFormServer:
+    """Context manager running an HTTP server in a background thread; .url is the form page."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        handler = functools.partial(_QuietHandler, directory=FIXTURES_DIR)
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/{FORM_PAGE}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        return False
@@ -0,0 +1,96 @@
+"""
+Local stand-in for src.gemini_processor.call_gemini_api used by benchmarks.
+
+It sleeps for a configurable latency (to model the network round trip) and
+returns canned JSON (plain, as with structured output) built from the synthetic
+applicant profiles, so the rest of the pipeline (prompt building, JSON parsing,
+validation, consolidation) runs unchanged.
+"""
+import json
+import re
+import threading
+import time
+
+from src.local_extractor import PAN_DOCUMENT, AADHAAR_DOCUMENT, PASSBOOK_DOCUMENT
+from src.output_schema import REASK_PROMPT
+
+# Delimited documents of a batched extraction prompt
+DOCUMENT_BLOCK_PATTERN = re.compile(r'<<<DOCUMENT (\d+)>>>\n(.*?)\n<<<END DOCUMENT \1>>>', re.DOTALL)
+
+# Fields Gemini would typically extract from each document type
+DOCUMENT_FIELDS = {
+    PAN_DOCUMENT: ('full_name', 'father_name', 'date_of_birth', 'pan_number'),
+    AADHAAR_DOCUMENT: ('full_name', 'date_of_birth', 'gender', 'aadhaar_number', 'address'),
+    PASSBOOK_DOCUMENT: ('full_name', 'account_number', 'bank_name', 'ifsc_code', 'address'),
+}
+
+
+class GeminiStub:
+    """Callable with the same signature as call_gemini_api."""
+
+    def __init__(self, profiles, latency=0.5):
+        self.profiles = list(profiles)
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _profile_for(self, text):
+        upper_text = text.upper()
+        for profile in self.profiles:
+            if profile['full_name'] in upper_text:
+                return profile
+        return self.profiles[0]
+
+    def _extraction_response(self, document_text):
+        upper_text = document_text.upper()
+        if 'INCOME TAX' in upper_text:
+            document_type = PAN_DOCUMENT
+        elif 'AADHAAR' in upper_text or 'UNIQUE IDENTIFICATION' in upper_text:
+            document_type = AADHAAR_DOCUMENT
+        elif 'PASSBOOK' in upper_text or 'IFSC' in upper_text:
+            document_type = PASSBOOK_DOCUMENT
+        else:
+            return {'document_type': 'Other', 'data': {}}
+        profile = self._profile_for(document_text)
+        return {'document_type': document_type,
+                'data': {field: profile[field] for field in DOCUMENT_FIELDS[document_type]}}
+
+    def _batch_response(self, prompt_text):
+        instruction, documents_text = prompt_text.split('Documents:\n', 1)
+        response = []
+        for number, document_text in DOCUMENT_BLOCK_PATTERN.findall(documents_text):
+            response.append(dict(self._extraction_response(document_text), document=int(number)))
+        if 'consolidated_profile' in instruction:
+            response.append({'consolidated_profile': self._profile_for(documents_text)})
+        return response
+
+    def __call__(self, prompt_text, max_retries=3, delay=5, generation_config=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+        if prompt_text.startswith(REASK_PROMPT.split('{', 1)[0]):
+            fields = re.findall(r'^- (\w+)', prompt_text, re.MULTILINE)
+            profile = self._profile_for(prompt_text)
+            response = {field: profile.get(field) for field in fields}
+        elif 'Conflicting Fields:' in prompt_text:
+            conflicts = json.loads(prompt_text.split('Conflicting Fields:', 1)[1])
+            response = {field: candidates[0]['value'] for field, candidates in conflicts.items()}
+        elif '<<<DOCUMENT 1>>>' in prompt_text:
+            response = self._batch_response(prompt_text)
+        elif 'Extracted Data from Documents:' in prompt_text:
+            response = self._profile_for(prompt_text.split('Extracted Data from Documents:', 1)[1])
+        else:
+            response = self._extraction_response(prompt_text.split('Document Text:', 1)[-1])
+
+        # Plain JSON, as returned with response_mime_type='application/json'
+        return json.dumps(response)
+
+
+def install(stub):
+    """Routes all Gemini calls in this process to the stub; prompt tokens are estimated locally."""
+    from src import gemini_processor
+    gemini_processor.call_gemini_api = stub
+    gemini_processor.count_prompt_tokens = gemini_processor.estimate_tokens
+    gemini_processor.set_response_cache(None)
+    return stub
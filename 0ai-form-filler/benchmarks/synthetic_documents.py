@@ -0,0 +1,132 @@
+"""
+Generates synthetic Aadhaar, PAN and bank passbook PDFs for benchmarks.
+
+Pages are rendered as images (no text layer), so every page goes through the
+same rasterize + Tesseract path as a scanned document. The first page holds the
+card or passbook front page; any further pages are filler transaction rows.
+"""
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+from src.local_extractor import verhoeff_valid, PAN_DOCUMENT, AADHAAR_DOCUMENT, PASSBOOK_DOCUMENT
+
+# A4 at 150 DPI keeps the files small; pdf2image re-renders them at OCR_DPI anyway
+PAGE_SIZE = (1240, 1754)
+PAGE_DPI = 150
+FONT_SIZE = 36
+FONT_PATHS = ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', 'DejaVuSans.ttf', 'Arial.ttf')
+
+FIRST_NAMES = ('RAHUL', 'PRIYA', 'AMIT', 'SNEHA', 'VIKRAM', 'ANJALI', 'ARJUN', 'KAVYA')
+LAST_NAMES = ('SHARMA', 'VERMA', 'GUPTA', 'IYER', 'REDDY', 'NAIR', 'PATEL', 'SINGH')
+BANKS = (('STATE BANK OF INDIA', 'SBIN'), ('HDFC BANK', 'HDFC'), ('PUNJAB NATIONAL BANK', 'PUNB'))
+
+
+def _load_font():
+    for font_path in FONT_PATHS:
+        try:
+            return ImageFont.truetype(font_path, FONT_SIZE)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def _aadhaar_number(rng):
+    """Returns a random 12-digit number that passes the Verhoeff check."""
+    base = str(rng.randint(2, 9)) + ''.join(str(rng.randint(0, 9)) for _ in range(10))
+    check_digit = next(digit for digit in '0123456789' if verhoeff_valid(base + digit))
+    return base + check_digit
+
+
+def make_applicant(seed=0):
+    """Returns a random but reproducible applicant profile (the expected consolidation output)."""
+    rng = random.Random(seed)
+    first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    bank_name, bank_code = rng.choice(BANKS)
+    aadhaar_number = _aadhaar_number(rng)
+    return {
+        'full_name': f"{first_name} {last_name}",
+        'father_name': f"{rng.choice(FIRST_NAMES)} {last_name}",
+        'date_of_birth': f"{rng.randint(1960, 2004)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'gender': 'Female' if first_name in ('PRIYA', 'SNEHA', 'ANJALI', 'KAVYA') else 'Male',
+        'pan_number': ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(5))
+                      + f"{rng.randint(0, 9999):04d}" + rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ'),
+        'aadhaar_number': f"{aadhaar_number[:4]} {aadhaar_number[4:8]} {aadhaar_number[8:]}",
+        'account_number': ''.join(str(rng.randint(0, 9)) for _ in range(11)),
+        'bank_name': bank_name,
+        'ifsc_code': f"{bank_code}0{rng.randint(0, 999999):06d}",
+        'address': f"{rng.randint(1, 200)} MG Road, Bengaluru, Karnataka 5600{rng.randint(10, 99)}",
+    }
+
+
+def _display_date(iso_date):
+    year, month, day = iso_date.split('-')
+    return f"{day}/{month}/{year}"
+
+
+def document_lines(document_type, applicant):
+    """Returns the text lines printed on the first page of a document type."""
+    if document_type == PAN_DOCUMENT:
+        return ['INCOME TAX DEPARTMENT', 'GOVT. OF INDIA', 'Permanent Account Number Card',
+                applicant['pan_number'], 'Name', applicant['full_name'], "Father's Name",
+                applicant['father_name'], 'Date of Birth', _display_date(applicant['date_of_birth'])]
+    if document_type == AADHAAR_DOCUMENT:
+        return ['Government of India', 'Unique Identification Authority of India', applicant['full_name'],
+                f"DOB: {_display_date(applicant['date_of_birth'])}", applicant['gender'].upper(),
+                applicant['aadhaar_number'], 'Address:', applicant['address'], 'AADHAAR - Mera Aadhaar, Meri Pehchaan']
+    if document_type == PASSBOOK_DOCUMENT:
+        return [applicant['bank_name'], 'SAVINGS ACCOUNT PASSBOOK', 'Branch: MG Road',
+                f"IFSC: {applicant['ifsc_code']}", f"Account No: {applicant['account_number']}",
+                f"Name: {applicant['full_name']}", f"Address: {applicant['address']}"]
+    raise ValueError(f"Unknown document type: {document_type}")
+
+
+def _filler_lines(rng, page_number):
+    lines = [f"Statement of transactions - page {page_number}", 'Date Particulars Withdrawal Deposit Balance']
+    balance = rng.randint(1000, 90000)
+    for _ in range(30):
+        amount = rng.randint(100, 5000)
+        balance += amount
+        lines.append(f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024 UPI/{rng.randint(100000, 999999)} - {amount}.00 {balance}.00")
+    return lines
+
+
+def render_page(lines, font):
+    page = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(page)
+    y = 120
+    for line in lines:
+        draw.text((100, y), line, fill=0, font=font)
+        y += int(FONT_SIZE * 1.5)
+    return page
+
+
+def write_document(path, document_type, applicant, pages=1, seed=0):
+    """Writes an image-only PDF of the given type with `pages` pages."""
+    rng = random.Random(seed)
+    font = _load_font()
+    images = [render_page(document_lines(document_type, applicant), font)]
+    images += [render_page(_filler_lines(rng, page_number), font) for page_number in range(2, pages + 1)]
+    images[0].save(path, 'PDF', resolution=PAGE_DPI, save_all=True, append_images=images[1:])
+    return path
+
+
+def generate_documents(output_dir, applicants=1, pages=1):
+    """
+    Writes one Aadhaar, PAN and passbook PDF per synthetic applicant.
+
+    Returns:
+        list: [{'applicant_id': ..., 'profile': {...}, 'documents': [paths]}, ...]
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    generated = []
+    for index in range(applicants):
+        applicant_id = f"applicant_{index + 1:03d}"
+        profile = make_applicant(seed=index)
+        documents = []
+        for document_type in (AADHAAR_DOCUMENT, PAN_DOCUMENT, PASSBOOK_DOCUMENT):
+            file_name = f"{applicant_id}_{document_type.lower().replace(' ', '_')}.pdf"
+            documents.append(write_document(os.path.join(output_dir, file_name), document_type, profile, pages, seed=index))
+        generated.append({'applicant_id': applicant_id, 'profile': profile, 'documents': documents})
+    return generated
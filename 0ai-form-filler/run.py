@@ -11,9 +11,13 @@ load_dotenv()
 
 # Import functions from src modules (assuming they exist)
 try:
-    from src.pdf_ocr import process_pdf_and_ocr
-    from src.gemini_processor import process_document_with_gemini, consolidate_data_with_gemini
-    from src.selenium_filler import fill_online_form
+    from src.local_extractor import get_local_extraction_stats
+    from src.cli_options import (add_pipeline_arguments, add_form_arguments, add_journal_arguments, create_caches,
+                                 create_fill_plan_cache, configure_gemini, build_ocr_options, start_instrumentation,
+                                 open_run_journal, finish_run_journal)
+    from src.fill_plan import compile_form_plan
+    from src.ocr_templates import load_ocr_templates, OCR_TEMPLATES_FILE
+    from src.gemini_client import get_client_stats
     from src.utils import load_config, cleanup_temp_dir # Import cleanup utility
 except ImportError as e:
     logging.error(f"Failed to import source modules: {e}")
@@ -35,15 +39,13 @@ def main():
         '--documents',
         type=str,
         nargs='+', # '+' means one or more arguments are required
-        required=True,
-        help="Paths to the PDF document files (e.g., --documents path/to/doc1.pdf path/to/doc2.pdf)"
+        help="Paths to the PDF document files (e.g., --documents path/to/doc1.pdf path/to/doc2.pdf). Required unless --resume is given."
     )
 
     parser.add_argument(
         '--form',
         type=str,
-        required=True, # This argument is mandatory
-        help="Name or identifier of the target online form (e.g., 'local_test_form'). Requires a corresponding mapping in config/form_mappings.yaml"
+        help="Name or identifier of the target online form (e.g., 'local_test_form'). Requires a corresponding mapping in config/form_mappings.yaml. Required unless --resume is given."
     )
 
     parser.add_argument(
@@ -67,8 +69,31 @@ def main():
         help="Skip the Selenium form filling step after data extraction and consolidation."
     )
 
+    # Form filling, run journal, OCR, pipeline and cache options shared with batch.py
+    add_form_arguments(parser)
+    add_journal_arguments(parser)
+    add_pipeline_arguments(parser)
+
 
     args = parser.parse_args()
+    if not args.resume and (not args.documents or not args.form):
+        parser.error("--documents and --form are required unless an earlier run is continued with --resume")
+    start_instrumentation(args)
+
+    # The OCR pipeline (and Pillow, pdf2image and pytesseract) is imported only once
+    # the arguments are valid, so --help and usage errors return at once
+    from src.pipeline import extract_documents, extract_documents_batched, consolidate_documents
+
+    # --- Run journal ---
+    # Records each stage's results so an interrupted run can be continued with --resume
+    try:
+        journal = open_run_journal(args, {'command': 'run', 'documents': args.documents, 'form': args.form})
+    except FileNotFoundError as e:
+        logging.error(f"Cannot resume: {e}")
+        sys.exit(1)
+    if args.resume:
+        args.documents = args.documents or journal.metadata.get('documents')
+        args.form = args.form or journal.metadata.get('form')
 
     # --- Prepare directories ---
     if not os.path.exists(args.temp_dir):
@@ -102,115 +127,129 @@ def main():
          logging.error("Missing required prompts ('initial_extraction' or 'consolidation') in gemini_prompts.yaml")
          sys.exit(1)
 
-    # --- Process Each Document ---
-    extracted_document_results = [] # List to hold structured data from each document
+    if args.batch_extraction and 'batch_extraction' not in gemini_prompts:
+         logging.error("--batch_extraction needs a 'batch_extraction' prompt in gemini_prompts.yaml")
+         sys.exit(1)
 
-    logging.info(f"Processing {len(args.documents)} documents...")
+    # Validate the form mapping now rather than after OCR and Gemini have run
+    try:
+        form_plan = compile_form_plan(args.form, form_mappings)
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+    ocr_templates = None
+    if args.roi_ocr:
+        try:
+            ocr_templates = load_ocr_templates(os.path.join(args.config_dir, OCR_TEMPLATES_FILE))
+        except (FileNotFoundError, ValueError, yaml.YAMLError) as e:
+            logging.error(f"Error loading OCR templates: {e}")
+            sys.exit(1)
 
-    for doc_path in args.documents:
-        if not os.path.exists(doc_path):
-            logging.warning(f"Document not found, skipping: {doc_path}")
-            continue
+    if not os.environ.get('GOOGLE_API_KEY'):
+        logging.warning("GOOGLE_API_KEY environment variable not set. Only documents handled locally or from cache can be processed.")
 
-        logging.info(f"Processing document: {doc_path}")
+    ocr_cache, gemini_cache = create_caches(args)
+    configure_gemini(args)
 
-        try:
-            # 1. Process PDF and get OCR text
-            # process_pdf_and_ocr needs to handle the Poppler/Image conversion and Tesseract call
-            logging.info("  Running OCR...")
-            full_ocr_text = process_pdf_and_ocr(doc_path, temp_dir=args.temp_dir)
-
-            if not full_ocr_text or len(full_ocr_text.strip()) < 50: # Basic check for sufficient text
-                 logging.warning(f"  Could not get enough text from {doc_path} via OCR. Skipping extraction for this document.")
-                 continue
-
-            # 2. Use Gemini for Classification and Initial Extraction
-            logging.info("  Sending text to Gemini for initial processing...")
-            initial_extraction_prompt = gemini_prompts['initial_extraction']
-            # Expect Gemini to return JSON like {'document_type': '...', 'data': {...}}
-            gemini_output = process_document_with_gemini(full_ocr_text, initial_extraction_prompt)
-
-            if gemini_output and isinstance(gemini_output, dict) and 'document_type' in gemini_output and 'data' in gemini_output and isinstance(gemini_output['data'], dict):
-                logging.info(f"  Gemini identified document type: {gemini_output['document_type']}")
-                logging.info(f"  Gemini extracted initial data: {json.dumps(gemini_output['data'], indent=2)[:500]}...") # Log snippet
-                extracted_document_results.append({
-                    'doc_path': doc_path, # Keep track of the source file
-                    'extracted': gemini_output # Store the structured output from Gemini
-                })
-            else:
-                 logging.warning(f"  Gemini did not return expected structured output (dict with 'document_type' and 'data' keys) for {doc_path}.")
-                 # Optionally log the raw Gemini response for debugging
-                 # logging.warning(f"  Raw Gemini response (if available): {gemini_output}")
-
-
-        except Exception as e:
-            # Catch potential errors during processing one document to allow others to proceed
-            logging.error(f"  Error processing {doc_path}: {e}", exc_info=True)
-
-
-    # --- Consolidate Data using Gemini ---
-    if not extracted_document_results:
+    # --- Process Each Document ---
+    # OCR and Gemini extraction run as a pipeline: OCR of the next document
+    # overlaps with the Gemini request for the previous one.
+    logging.info(f"Processing {len(args.documents)} documents...")
+
+    # List to hold structured data from each document
+    extracted_document_results = []
+    batched_profile = None
+    resumed_profile = journal.load('consolidated') if journal is not None else None
+    if resumed_profile is not None:
+        logging.info(f"Consolidated profile found in run journal {journal.run_id}; skipping OCR, extraction and consolidation.")
+    elif args.batch_extraction:
+        # One Gemini request for all documents; it also returns the profile if Gemini would consolidate anyway
+        extracted_document_results, batched_profile = extract_documents_batched(
+            args.documents,
+            gemini_prompts,
+            build_ocr_options(args, ocr_cache, ocr_templates),
+            ocr_concurrency=args.ocr_concurrency,
+            gemini_concurrency=args.gemini_concurrency,
+            local_extraction=not args.no_local_extraction,
+            include_profile=args.no_local_consolidation,
+            journal=journal,
+        )
+    else:
+        extracted_document_results = extract_documents(
+            args.documents,
+            gemini_prompts['initial_extraction'],
+            build_ocr_options(args, ocr_cache, ocr_templates),
+            ocr_concurrency=args.ocr_concurrency,
+            gemini_concurrency=args.gemini_concurrency,
+            local_extraction=not args.no_local_extraction,
+            journal=journal,
+        )
+
+    if not args.no_local_extraction:
+        extraction_stats = get_local_extraction_stats()
+        logging.info(f"Local extraction: {extraction_stats['local']} documents handled locally (Gemini calls avoided), {extraction_stats['fallback']} sent to Gemini.")
+
+    if ocr_cache is not None:
+        cache_stats = ocr_cache.stats()
+        logging.info(f"OCR cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['size_bytes'] / (1024 * 1024):.1f} MB on disk.")
+
+    # --- Consolidate Data ---
+    if resumed_profile is None and not extracted_document_results:
         logging.error("No data was successfully extracted from any document for consolidation. Exiting.")
         # Cleanup temp files even on error
         cleanup_temp_dir(args.temp_dir)
         sys.exit(1)
 
-    logging.info(f"Consolidating data from {len(extracted_document_results)} documents using Gemini...")
-
     consolidated_data = None
     try:
         consolidation_prompt = gemini_prompts['consolidation']
-        # Pass the list of all initial extracted results to Gemini
-        consolidated_data = consolidate_data_with_gemini(extracted_document_results, consolidation_prompt)
-
-        if not consolidated_data or not isinstance(consolidated_data, dict):
-             logging.error("Gemini failed to consolidate data or returned invalid format. Exiting.")
+        if resumed_profile is not None:
+            consolidated_data = resumed_profile
+        elif batched_profile:
+            logging.info("Using the consolidated profile returned with the batched extraction (consolidation call skipped).")
+            consolidated_data = batched_profile
+        else:
+            # Merge locally with source-priority rules; only conflicting fields go to Gemini
+            consolidated_data = consolidate_documents(
+                extracted_document_results,
+                consolidation_prompt,
+                conflict_prompt=gemini_prompts.get('conflict_resolution'),
+                local_consolidation=not args.no_local_consolidation,
+            )
+
+        if consolidated_data is None:
+             logging.error("Consolidation failed. Exiting.")
              # Cleanup temp files even on error
              cleanup_temp_dir(args.temp_dir)
              sys.exit(1)
 
         logging.info(f"Consolidated Data: {json.dumps(consolidated_data, indent=2)}") # Pretty print consolidated data
+        if journal is not None and resumed_profile is None:
+            journal.save('consolidated', consolidated_data)
 
     except Exception as e:
-         logging.error(f"An error occurred during data consolidation with Gemini: {e}", exc_info=True)
+         logging.error(f"An error occurred during data consolidation: {e}", exc_info=True)
          # Cleanup temp files even on error
          cleanup_temp_dir(args.temp_dir)
          sys.exit(1)
 
 
     # --- Map Consolidated Data to Target Form Fields ---
-    if args.form not in form_mappings:
-        logging.error(f"No form mapping found for target form: '{args.form}'. Please check config/form_mappings.yaml")
-        # Cleanup temp files even on error
-        cleanup_temp_dir(args.temp_dir)
-        sys.exit(1)
-
-    target_form_mapping = form_mappings[args.form]
     logging.info(f"Using mapping for form: '{args.form}'")
 
-    # Prepare data for form filling - this involves looking up values in consolidated_data
-    # based on the keys/paths specified in target_form_mapping.
+    # Prepare data for form filling - the compiled plan lists each field locator and its key in consolidated_data
     data_to_fill = {}
-    # Exclude 'url' key from mappings when preparing data for filling
-    field_map_only = {k: v for k, v in target_form_mapping.items() if k != 'url'}
-
-    for field_locator, data_key in field_map_only.items():
-        # data_key is expected to be a key from the consolidated_data dictionary
-        try:
-             # Check if data_key exists and is not None in consolidated_data
-             if data_key in consolidated_data and consolidated_data[data_key] is not None:
-                 # Ensure data is string for Selenium, handle booleans etc. if needed
-                 value_to_fill = consolidated_data[data_key]
-                 data_to_fill[field_locator] = str(value_to_fill)
-                 # log value to fill, but maybe censor sensitive data in logs in a real tool
-                 logging.debug(f"  Mapping '{data_key}' to field '{field_locator}' with value '{data_to_fill[field_locator]}'")
-             else:
-                 # Field might be optional or data wasn't found/consolidated
-                 logging.debug(f"  Data field '{data_key}' required for form field '{field_locator}' not found or is null in consolidated data. This field will be left empty.")
-                 # We don't add it to data_to_fill if not found; selenium_filler skips if not in dict.
-
-        except Exception as e:
-             logging.warning(f"  Error mapping data field '{data_key}' to form field '{field_locator}': {e}")
+    for field in form_plan['fields']:
+        field_locator, data_key = field['locator'], field['data_key']
+        if consolidated_data.get(data_key) is not None:
+            # Ensure data is string for Selenium; the fill coerces it further once element kinds are known
+            data_to_fill[field_locator] = str(consolidated_data[data_key])
+            # log value to fill, but maybe censor sensitive data in logs in a real tool
+            logging.debug(f"  Mapping '{data_key}' to field '{field_locator}' with value '{data_to_fill[field_locator]}'")
+        else:
+            # Field might be optional or data wasn't found/consolidated
+            logging.debug(f"  Data field '{data_key}' required for form field '{field_locator}' not found or is null in consolidated data. This field will be left empty.")
 
 
     if not data_to_fill and not args.skip_fill:
@@ -224,16 +263,27 @@ def main():
 
     # --- Use Selenium to fill the form (unless skip_fill is set) ---
     driver_instance = None # Initialize driver_instance outside try
+    form_already_filled = journal is not None and journal.load('form_filled') is not None
     try:
-        if not args.skip_fill:
+        if form_already_filled:
+            logging.info(f"Run {journal.run_id} already filled form '{args.form}'; nothing left to resume.")
+        elif not args.skip_fill:
             try:
                 logging.info(f"Launching browser and filling form '{args.form}'...")
-                # fill_online_form now returns the driver instance or None
-                driver_instance = fill_online_form(args.form, consolidated_data, form_mappings)
+                # Selenium is only imported when a form is actually filled, which keeps startup fast
+                from src.selenium_filler import fill_online_form
+                # fill_online_form returns the driver instance (or None) and the fill status of each field
+                driver_instance, field_report = fill_online_form(args.form, consolidated_data, form_mappings, batch_fill=not args.no_batch_fill,
+                                                                 plan=form_plan, plan_cache=create_fill_plan_cache(args))
 
                 if driver_instance: # Check if driver was successfully created and returned
                     logging.info("  Selenium form filling complete.")
+                    if journal is not None:
+                        journal.save('form_filled', {'form': args.form, 'fields': field_report})
                     print("\n>>> Browser should have opened and form filled now.")
+                    unfilled_fields = [field_locator for field_locator, status in field_report.items() if status != 'filled']
+                    if unfilled_fields:
+                        print(f">>> These fields could not be filled and need to be completed by hand: {', '.join(unfilled_fields)}")
                     print(">>> Please **review the form** in the opened browser window, make any corrections, and click the 'Simulate Submit' button manually.")
                     # Pause the script execution while the browser stays open
                     input(">>> Press Enter in this console window after you have reviewed and submitted the form, or closed the browser...")
@@ -260,9 +310,21 @@ def main():
             logging.info("Quitting browser.")
             driver_instance.quit()
 
+        if gemini_cache is not None:
+            cache_stats = gemini_cache.stats()
+            logging.info(f"Gemini cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%} hit rate).")
+
+        client_stats = get_client_stats()
+        if client_stats['throttled'] or client_stats['circuit_opens']:
+            logging.info(f"Gemini rate limiting: {client_stats['throttled']} requests throttled ({client_stats['throttle_seconds']:.1f}s waiting), circuit breaker opened {client_stats['circuit_opens']} times.")
+
         logging.info("Cleaning up temporary files...")
         cleanup_temp_dir(args.temp_dir)
 
+    # The run is complete once the form was filled (or filling was skipped); a failed fill keeps the journal for --resume
+    if form_already_filled or driver_instance or args.skip_fill:
+        finish_run_journal(args, journal)
+
     logging.info("Script finished.")
 
 
@@ -0,0 +1,395 @@
+import argparse
+import sys
+import logging
+import os
+import re
+import json
+import stat
+import socket
+import socketserver
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv # Optional: for loading API key from .env
+
+# Load environment variables (e.g., GOOGLE_API_KEY)
+load_dotenv()
+
+try:
+    from src.job_service import JobService, QueueFullError, DEFAULT_MAX_QUEUE, DEFAULT_JOB_WORKERS
+    from src.cli_options import (add_pipeline_arguments, add_form_arguments, create_caches, create_fill_plan_cache,
+                                 configure_gemini, build_ocr_options, start_instrumentation)
+    from src.fill_plan import compile_form_plan
+    from src.ocr_templates import load_ocr_templates, OCR_TEMPLATES_FILE
+    from src.utils import load_config
+    from src import metrics
+    from src.gemini_client import get_client_stats
+except ImportError as e:
+    logging.error(f"Failed to import source modules: {e}")
+    logging.error("Please ensure you are running the script from the project root directory.")
+    sys.exit(1)
+
+
+# Set up basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(threadName)s] %(message)s')
+
+# Largest request body accepted by POST /jobs
+MAX_REQUEST_BYTES = 64 * 1024
+
+JOB_PATH_PATTERN = re.compile(r'^/jobs/([0-9a-f]+)(/profile)?$')
+
+
+class ServiceState:
+    """Resources kept warm for the life of the service and shared by all jobs."""
+
+    def __init__(self, args, gemini_prompts, form_mappings, form_plans, ocr_options, ocr_pool, gemini_pool,
+                 browser_pool=None, plan_cache=None, caches=()):
+        self.args = args
+        self.gemini_prompts = gemini_prompts
+        self.form_mappings = form_mappings
+        self.form_plans = form_plans
+        self.ocr_options = ocr_options
+        self.ocr_pool = ocr_pool
+        self.gemini_pool = gemini_pool
+        self.browser_pool = browser_pool
+        self.plan_cache = plan_cache
+        self.caches = [cache for cache in caches if cache is not None]
+        self.documents_root = os.path.realpath(args.documents_root)
+
+    def run_job(self, job):
+        """Processes one job on the shared pools. Returns the applicant record."""
+        from src.applicant import process_applicant, fill_applicant_form  # Loaded by warm_up() before the first job
+        fill_form = None
+        if job['form']:
+            form_plan = self.form_plans[job['form']]
+            fill_form = lambda profile: fill_applicant_form(self.browser_pool, self.form_mappings, form_plan,
+                                                            self.plan_cache, not self.args.no_batch_fill, profile)
+        applicant = {'applicant_id': job['applicant_id'], 'documents': job['documents']}
+        return process_applicant(applicant, self.gemini_prompts, self.ocr_options, self.ocr_pool, self.gemini_pool,
+                                 not self.args.no_local_extraction, not self.args.no_local_consolidation, fill_form,
+                                 self.args.batch_extraction)
+
+
+def warm_up(args):
+    """Pays the one-off startup costs before the first job: pipeline and Tesseract probe, pypdf import, Gemini setup."""
+    # Imported here rather than at module level, so --help and usage errors return at once
+    from src.applicant import process_applicant  # noqa: F401
+    from src.pdf_ocr import get_tesseract_version
+    try:
+        get_tesseract_version()
+    except RuntimeError as e:
+        logging.warning(str(e))
+    if not args.no_text_layer:
+        import pypdf  # noqa: F401  (imported lazily by the text layer path)
+    if os.environ.get('GOOGLE_API_KEY'):
+        from src.gemini_processor import get_genai
+        get_genai()
+    else:
+        logging.warning("GOOGLE_API_KEY environment variable not set. Only documents handled locally or from cache can be processed.")
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """
+    Local JSON API of the service:
+
+        POST /jobs                {"documents": ["a.pdf", ...], "form": "local_test_form", "applicant_id": "A1"}
+                                  -> 202 job summary; 400 invalid job; 503 queue full
+        GET  /jobs/<id>           -> job summary (status, timings, per-stage metrics)
+        GET  /jobs/<id>/profile   -> consolidated profile; 409 while the job is not done
+        GET  /health              -> queue depth, job counts, latency, Gemini client and cache statistics
+        GET  /metrics             -> counters and span totals in Prometheus text format
+    """
+
+    server_version = 'FormFillerService/1.0'
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise ValueError(f"Request body larger than {MAX_REQUEST_BYTES} bytes.")
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise ValueError("Request body is not valid JSON.") from None
+
+    def _validate_job(self, body):
+        """Returns (documents, form, applicant_id) of a job request. Raises ValueError if it is invalid."""
+        state = self.server.state
+        documents = body.get('documents') if isinstance(body, dict) else None
+        if not isinstance(documents, list) or not documents or not all(isinstance(path, str) for path in documents):
+            raise ValueError("'documents' must be a non-empty list of PDF paths.")
+        # Paths are relative to --documents_root; symlinks and '..' are resolved before the check
+        documents_root = state.documents_root
+        resolved = [os.path.realpath(os.path.join(documents_root, path)) for path in documents]
+        outside = [path for path, real_path in zip(documents, resolved)
+                   if os.path.commonpath([documents_root, real_path]) != documents_root]
+        if outside:
+            raise ValueError(f"Documents outside the documents root: {', '.join(outside)}")
+        missing = [path for path, real_path in zip(documents, resolved) if not os.path.isfile(real_path)]
+        if missing:
+            raise ValueError(f"Documents not found: {', '.join(missing)}")
+        documents = resolved
+        form = body.get('form')
+        if form is not None:
+            if state.browser_pool is None:
+                raise ValueError("Form filling is disabled in this service (--browser_pool_size 0).")
+            if form not in state.form_plans:
+                raise ValueError(f"Unknown form '{form}'; known forms: {', '.join(sorted(state.form_plans))}")
+        applicant_id = body.get('applicant_id')
+        if applicant_id is not None and not isinstance(applicant_id, str):
+            raise ValueError("'applicant_id' must be a string.")
+        return documents, form, applicant_id
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            documents, form, applicant_id = self._validate_job(self._read_json())
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        try:
+            job = self.server.jobs.submit(documents, form=form, applicant_id=applicant_id)
+        except QueueFullError as e:
+            self._send_json(503, {'error': str(e)}, headers={'Retry-After': '5'})
+            return
+        self._send_json(202, job, headers={'Location': f"/jobs/{job['job_id']}"})
+
+    def do_GET(self):
+        if self.path == '/health':
+            state = self.server.state
+            health = {'status': 'ok', 'jobs': self.server.jobs.stats(), 'gemini': get_client_stats(),
+                      'caches': {cache.name: cache.stats() for cache in state.caches}}
+            self._send_json(200, health)
+            return
+        if self.path == '/metrics':
+            payload = metrics.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        match = JOB_PATH_PATTERN.match(self.path)
+        if not match:
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        job_id, profile_requested = match.groups()
+        if not profile_requested:
+            job = self.server.jobs.get(job_id)
+            if job is None:
+                self._send_json(404, {'error': f"Unknown job {job_id}"})
+            else:
+                self._send_json(200, job)
+            return
+
+        status, profile = self.server.jobs.get_profile(job_id)
+        if status is None:
+            self._send_json(404, {'error': f"Unknown job {job_id}"})
+        elif status != 'done':
+            self._send_json(409, {'error': f"Job {job_id} is {status}; no profile available.", 'status': status})
+        else:
+            self._send_json(200, profile)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer listening on a Unix domain socket."""
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def is_socket(path):
+    """Returns True if path exists and is a Unix domain socket."""
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def create_server(args):
+    """
+    Returns the HTTP server bound to --socket if given, else to --host/--port.
+    A socket left at --socket by an earlier run is replaced; any other file there
+    raises FileExistsError, so a mistyped path never deletes it.
+    """
+    if args.socket:
+        if is_socket(args.socket):
+            os.unlink(args.socket)
+        elif os.path.lexists(args.socket):
+            raise FileExistsError(f"{args.socket} exists and is not a socket")
+        return UnixHTTPServer(args.socket, JobRequestHandler)
+    return ThreadingHTTPServer((args.host, args.port), JobRequestHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker service: keeps OCR, Gemini and browser resources warm and processes applicant jobs submitted over a local HTTP API.")
+
+    parser.add_argument(
+        '--host',
+        type=str,
+        default='127.0.0.1',
+        help="Address to listen on. Keep the default so only local clients can submit jobs."
+    )
+
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=8765,
+        help="TCP port to listen on."
+    )
+
+    parser.add_argument(
+        '--socket',
+        type=str,
+        default=None,
+        help="Listen on this Unix domain socket path instead of a TCP port."
+    )
+
+    parser.add_argument(
+        '--documents_root',
+        type=str,
+        required=True,
+        help="Directory jobs may read documents from. Job document paths are resolved relative to it, and paths outside it (including through symlinks or '..') are rejected."
+    )
+
+    parser.add_argument(
+        '--max_queue',
+        type=int,
+        default=DEFAULT_MAX_QUEUE,
+        help="Maximum number of jobs waiting to run. Further submissions are rejected with HTTP 503 until the queue drains."
+    )
+
+    parser.add_argument(
+        '--job_workers',
+        type=int,
+        default=DEFAULT_JOB_WORKERS,
+        help="Number of jobs processed at the same time. OCR and Gemini work is shared through the pools below."
+    )
+
+    parser.add_argument(
+        '--browser_pool_size',
+        type=int,
+        default=1,
+        help="Number of warm headless Chrome instances used to fill forms for jobs that name a form. 0 disables form filling."
+    )
+
+    parser.add_argument(
+        '--temp_dir',
+        type=str,
+        default='temp/',
+        help="Directory to store temporary files like images generated from PDFs. Will be created if it doesn't exist."
+    )
+
+    parser.add_argument(
+        '--config_dir',
+        type=str,
+        default='config/',
+        help="Directory containing configuration files (form_mappings.yaml, gemini_prompts.yaml)."
+    )
+
+    add_form_arguments(parser)
+    add_pipeline_arguments(parser)
+
+    args = parser.parse_args()
+    start_instrumentation(args)
+
+    if not os.path.isdir(args.documents_root):
+        logging.error(f"Documents root not found: {args.documents_root}")
+        sys.exit(1)
+
+    os.makedirs(args.temp_dir, exist_ok=True)
+
+    # --- Load Configuration ---
+    try:
+        gemini_prompts = load_config(os.path.join(args.config_dir, 'gemini_prompts.yaml'))
+        form_mappings = load_config(os.path.join(args.config_dir, 'form_mappings.yaml')) if args.browser_pool_size else {}
+        ocr_templates = load_ocr_templates(os.path.join(args.config_dir, OCR_TEMPLATES_FILE)) if args.roi_ocr else None
+    except (FileNotFoundError, ValueError, yaml.YAMLError) as e:
+        logging.error(f"Error loading configuration: {e}")
+        sys.exit(1)
+
+    if 'initial_extraction' not in gemini_prompts or 'consolidation' not in gemini_prompts:
+        logging.error("Missing required prompts ('initial_extraction' or 'consolidation') in gemini_prompts.yaml")
+        sys.exit(1)
+
+    if args.batch_extraction and 'batch_extraction' not in gemini_prompts:
+        logging.error("--batch_extraction needs a 'batch_extraction' prompt in gemini_prompts.yaml")
+        sys.exit(1)
+
+    # Every form is validated up front; jobs name one of them
+    try:
+        form_plans = {form_name: compile_form_plan(form_name, form_mappings) for form_name in form_mappings or {}}
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+    # --- Warm Resources ---
+    ocr_cache, gemini_cache = create_caches(args)
+    configure_gemini(args)
+    ocr_options = build_ocr_options(args, ocr_cache, ocr_templates)
+    warm_up(args)
+
+    browser_pool = None
+    if args.browser_pool_size:
+        # Selenium is only imported when forms are filled
+        from src.browser_pool import BrowserPool
+        browser_pool = BrowserPool(size=args.browser_pool_size, headless=True)
+        if not browser_pool.warm_up():
+            logging.error("Could not start any browser for form filling. Exiting (use --browser_pool_size 0 to run without form filling).")
+            sys.exit(1)
+
+    with ThreadPoolExecutor(max_workers=args.ocr_concurrency, thread_name_prefix='ocr') as ocr_pool, \
+         ThreadPoolExecutor(max_workers=args.gemini_concurrency, thread_name_prefix='gemini') as gemini_pool:
+        state = ServiceState(args, gemini_prompts, form_mappings, form_plans, ocr_options, ocr_pool, gemini_pool,
+                             browser_pool, create_fill_plan_cache(args), (ocr_cache, gemini_cache))
+        jobs = JobService(state.run_job, max_queue=args.max_queue, workers=args.job_workers)
+
+        try:
+            server = create_server(args)
+        except OSError as e:
+            logging.error(f"Could not listen on {args.socket or f'{args.host}:{args.port}'}: {e}")
+            jobs.close()
+            sys.exit(1)
+        server.state = state
+        server.jobs = jobs
+
+        logging.info(f"Service listening on {args.socket or f'http://{args.host}:{args.port}'} "
+                     f"({args.job_workers} job workers, queue of {args.max_queue}). Press Ctrl+C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Stopping: finishing queued jobs...")
+        finally:
+            server.server_close()
+            jobs.close()
+            if browser_pool is not None:
+                browser_pool.close()
+            if args.socket and is_socket(args.socket):
+                os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
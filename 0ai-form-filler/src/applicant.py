@@ -0,0 +1,92 @@
+import time
+import logging
+from src.pipeline import extract_documents, extract_documents_batched, consolidate_documents
+from src.metrics import span, propagate
+
+# One applicant's documents through OCR, extraction, consolidation and optionally
+# form filling, on pools shared with other applicants. Used by batch.py and by the
+# worker service (service.py).
+
+# Parts of an applicant's output record kept in the run journal once consolidation succeeds
+JOURNALED_RECORD_KEYS = ('status', 'documents_extracted', 'profile', 'form_filled', 'form_fields')
+
+
+def fill_applicant_form(browser_pool, form_mappings, form_plan, plan_cache, batch_fill, consolidated_data):
+    """
+    Fills the form for one applicant in a browser leased from the pool. Returns
+    (True on success, {field locator: fill status}).
+    """
+    from src.selenium_filler import fill_online_form
+
+    with browser_pool.lease() as driver:
+        filled_driver, field_report = fill_online_form(form_plan['form'], consolidated_data, form_mappings, headless=True,
+                                                       batch_fill=batch_fill, driver=driver, plan=form_plan,
+                                                       plan_cache=plan_cache)
+        return filled_driver is not None, field_report
+
+
+def process_applicant(applicant, gemini_prompts, ocr_options, ocr_pool, gemini_pool, local_extraction=True,
+                      local_consolidation=True, fill_form=None, batch_extraction=False, journal=None):
+    """
+    Runs OCR, extraction and consolidation for one applicant on the shared pools,
+    then fill_form(consolidated_data) if given, which returns (filled, per-field fill
+    statuses) as fill_applicant_form does. With a run journal, the stages this
+    applicant completed in an earlier attempt of the run are skipped.
+    Returns the output record for the JSONL file; errors are recorded, not raised.
+    """
+    applicant_id = applicant['applicant_id']
+    start_time = time.perf_counter()
+    record = {'applicant_id': applicant_id, 'documents': applicant['documents']}
+    journal = journal.scope(applicant_id) if journal is not None else None
+
+    with span('applicant', applicant_id=applicant_id):
+        try:
+            resumed = journal.load('consolidated') if journal is not None else None
+            if resumed is not None:
+                logging.info(f"Applicant {applicant_id}: consolidated profile found in run journal.")
+                record.update(resumed)
+                if fill_form is not None and not record.get('form_filled'):
+                    record['form_filled'], record['form_fields'] = fill_form(record['profile'])
+                    if record['form_filled']:
+                        journal.save('consolidated', {key: record[key] for key in JOURNALED_RECORD_KEYS if key in record})
+                record['seconds'] = round(time.perf_counter() - start_time, 3)
+                return record
+
+            batched_profile = None
+            if batch_extraction:
+                extracted_document_results, batched_profile = extract_documents_batched(
+                    applicant['documents'], gemini_prompts, ocr_options, ocr_pool=ocr_pool, gemini_pool=gemini_pool,
+                    local_extraction=local_extraction, include_profile=not local_consolidation, journal=journal)
+            else:
+                extracted_document_results = extract_documents(
+                    applicant['documents'], gemini_prompts['initial_extraction'], ocr_options,
+                    ocr_pool=ocr_pool, gemini_pool=gemini_pool, local_extraction=local_extraction, journal=journal)
+
+            if not extracted_document_results:
+                raise RuntimeError("No data was successfully extracted from any document.")
+
+            if batched_profile:
+                consolidated_data = batched_profile
+            else:
+                # Consolidation also goes through the Gemini pool so any Gemini call respects the concurrency cap
+                consolidated_data = gemini_pool.submit(
+                    propagate(consolidate_documents), extracted_document_results, gemini_prompts['consolidation'],
+                    gemini_prompts.get('conflict_resolution'), local_consolidation).result()
+
+            if consolidated_data is None:
+                raise RuntimeError("Consolidation failed or returned invalid format.")
+
+            record.update({'status': 'ok', 'documents_extracted': len(extracted_document_results), 'profile': consolidated_data})
+            if journal is not None:
+                journal.save('consolidated', {key: record[key] for key in JOURNALED_RECORD_KEYS if key in record})
+
+            if fill_form is not None:
+                record['form_filled'], record['form_fields'] = fill_form(consolidated_data)
+                if journal is not None and record['form_filled']:
+                    journal.save('consolidated', {key: record[key] for key in JOURNALED_RECORD_KEYS if key in record})
+        except Exception as e:
+            logging.error(f"Applicant {applicant_id} failed: {e}")
+            record.update({'status': 'error', 'error': str(e)})
+
+    record['seconds'] = round(time.perf_counter() - start_time, 3)
+    return record
@@ -0,0 +1,136 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from src.selenium_filler import get_browser_driver, get_driver_path
+from src.metrics import span, increment
+
+# Clears per-origin storage so one applicant's data never leaks into the next lease
+_CLEAR_STORAGE_SCRIPT = """
+try { window.localStorage.clear(); } catch (error) {}
+try { window.sessionStorage.clear(); } catch (error) {}
+"""
+
+
+class BrowserPool:
+    """
+    Keeps up to `size` warm Chrome instances and leases them out one fill at a time.
+
+    Browsers are started on demand (or all at once with warm_up()) and reused:
+    launching Chrome takes seconds, resetting one takes milliseconds. Between leases
+    cookies and storage are cleared, extra windows are closed and the page is reset
+    to about:blank. A browser that fails to reset is quit and replaced on next use.
+
+        with BrowserPool(size=4) as pool:
+            with pool.lease() as driver:
+                _, field_report = fill_online_form(form_name, data, form_mappings, driver=driver, headless=True)
+    """
+
+    def __init__(self, size=2, headless=True):
+        self.size = max(1, size)
+        self.headless = headless
+        self._idle = queue.LifoQueue()  # Most recently used first, so warm browsers stay warm
+        self._lock = threading.Lock()
+        self._drivers = []
+        self._capacity = threading.Semaphore(self.size)
+        self._closed = False
+
+    def _start_driver(self):
+        with span('browser_pool.start'):
+            driver = get_browser_driver(headless=self.headless)
+        if driver is None:
+            raise RuntimeError("Could not start a Chrome browser for the pool.")
+        with self._lock:
+            self._drivers.append(driver)
+        increment('browser_pool_starts_total')
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _reset(self, driver):
+        """Returns a used browser to a clean state. Returns False if it is unusable."""
+        try:
+            with span('browser_pool.reset'):
+                handles = driver.window_handles
+                for handle in handles[1:]:
+                    driver.switch_to.window(handle)
+                    driver.close()
+                driver.switch_to.window(handles[0])
+                driver.delete_all_cookies()
+                driver.execute_script(_CLEAR_STORAGE_SCRIPT)
+                driver.get('about:blank')
+            return True
+        except Exception as e:
+            logging.warning(f"Browser could not be reset and will be replaced: {e}")
+            return False
+
+    def warm_up(self):
+        """Starts all browsers up front, in parallel. Returns the number started."""
+        get_driver_path()  # Resolve the driver binary once before launching in parallel
+        with ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='browser_start') as executor:
+            futures = [executor.submit(self._start_driver) for _ in range(self.size - len(self._drivers))]
+        started = 0
+        for future in futures:
+            try:
+                self._idle.put(future.result())
+                started += 1
+            except RuntimeError as e:
+                logging.error(str(e))
+        logging.info(f"Browser pool warmed up with {started} of {self.size} browsers.")
+        return started
+
+    @contextmanager
+    def lease(self):
+        """Yields a browser for exclusive use, waiting if all are busy."""
+        if self._closed:
+            raise RuntimeError("Browser pool is closed.")
+        self._capacity.acquire()
+        driver = None
+        try:
+            try:
+                driver = self._idle.get_nowait()
+                increment('browser_pool_leases_total', browser='reused')
+            except queue.Empty:
+                driver = self._start_driver()
+                increment('browser_pool_leases_total', browser='new')
+
+            yield driver
+
+            if self._closed or not self._reset(driver):
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+            driver = None
+        finally:
+            if driver is not None:
+                # The fill raised; don't hand a browser in an unknown state to the next lease
+                self._discard(driver)
+            self._capacity.release()
+
+    def close(self):
+        """Quits every browser in the pool."""
+        self._closed = True
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        logging.info(f"Browser pool closed ({len(drivers)} browsers quit).")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,144 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+from src.metrics import increment
+
+def make_cache_key(*parts):
+    """Builds a stable hex cache key from JSON-serializable parts."""
+    serialized = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+def hash_file(filepath, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class DiskCache:
+    """
+    Persistent key/value cache storing one small JSON file per entry under a directory.
+
+    The total size is bounded by max_bytes; when it is exceeded, the least recently
+    used entries (oldest modification time, refreshed on every read) are deleted.
+    If ttl (seconds) is set, entries older than that are treated as misses.
+    Writes are atomic, so a crashed run never leaves a half-written entry behind.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, name='cache', ttl=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # Guards counters and the size total across threads
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        # Fan out into sub-directories so no single directory grows too large
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self):
+        """Yields (path, size, mtime) for every cache entry on disk."""
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def get(self, key):
+        """Returns the cached string for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            value = entry['value']
+        except (OSError, ValueError, KeyError, TypeError):
+            self._count(hit=False)
+            return None
+
+        if self.ttl is not None and time.time() - entry.get('created', 0) > self.ttl:
+            self._count(hit=False)
+            self.delete(key)
+            return None
+
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        self._count(hit=True)
+        return value
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        increment('cache_requests_total', cache=self.name, result='hit' if hit else 'miss')
+
+    def set(self, key, value):
+        """Stores a string under key, then evicts old entries if over the size limit."""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'created': time.time(), 'value': value}, f)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._total_bytes += os.path.getsize(path) - old_size
+        except OSError as e:
+            logging.warning(f"Failed to write {self.name} entry {key[:12]}: {e}")
+            return
+
+        if self._total_bytes > self.max_bytes:
+            with self._lock:
+                self._evict()
+
+    def delete(self, key):
+        """Removes an entry, e.g. one that turned out to be unusable."""
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+        except OSError:
+            return
+        with self._lock:
+            self._total_bytes -= size
+
+    def _evict(self):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                self._total_bytes -= size
+            except OSError as e:
+                logging.warning(f"Failed to evict {self.name} entry {path}: {e}")
+
+    def stats(self):
+        """Returns hit/miss counters and current size for reporting."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size_bytes': self._total_bytes,
+        }
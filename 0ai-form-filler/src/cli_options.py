@@ -0,0 +1,395 @@
+import atexit
+import argparse
+import logging
+
+from src import metrics
+from src.cache import DiskCache
+from src.run_journal import RunJournal, prune_run_journals
+from src.gemini_client import configure_client, DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE
+from src.option_defaults import (MIN_TEXT_LAYER_CHARS, ADAPTIVE_MIN_CONFIDENCE, OCR_ENGINES, TRIAGE_MIN_PAGES,
+                                 TRIAGE_MAX_PAGES, DEFAULT_TOKEN_BUDGET)
+
+# The OCR and Gemini processing modules (and Pillow, pdf2image and pytesseract behind
+# them) are imported inside the functions that need them, after the arguments are
+# parsed, so building the parser and --help stay cheap (see tests/test_startup.py).
+
+
+def add_pipeline_arguments(parser):
+    """Adds the OCR, concurrency and cache options shared by run.py and batch.py."""
+    parser.add_argument(
+        '--ocr_workers',
+        type=int,
+        default=1,
+        help="Number of worker processes used to OCR the pages of a document in parallel. 1 runs OCR serially, 0 uses one process per CPU core."
+    )
+
+    parser.add_argument(
+        '--ocr_concurrency',
+        type=int,
+        default=1,
+        help="Maximum number of documents OCR'd at the same time."
+    )
+
+    parser.add_argument(
+        '--gemini_concurrency',
+        type=int,
+        default=2,
+        help="Maximum number of Gemini requests in flight at the same time. OCR of later documents continues while requests are pending."
+    )
+
+    parser.add_argument(
+        '--page_window',
+        type=int,
+        default=0,
+        help="Stream PDFs through OCR this many pages at a time to keep memory flat on long documents. 0 renders all pages up front."
+    )
+
+    parser.add_argument(
+        '--no_text_layer',
+        action='store_true',
+        help="Always OCR every page, even when the PDF has an embedded text layer."
+    )
+
+    parser.add_argument(
+        '--min_text_chars',
+        type=int,
+        default=MIN_TEXT_LAYER_CHARS,
+        help="Minimum characters of embedded text for a page to skip OCR and use its text layer directly."
+    )
+
+    parser.add_argument(
+        '--adaptive_ocr',
+        action='store_true',
+        help="OCR pages at low DPI with grayscale/binarize/deskew preprocessing first, and re-render at 300 DPI only pages with low Tesseract confidence."
+    )
+
+    parser.add_argument(
+        '--min_ocr_confidence',
+        type=float,
+        default=ADAPTIVE_MIN_CONFIDENCE,
+        help="Mean Tesseract word confidence (0-100) a low-DPI page needs in --adaptive_ocr mode to skip the high-DPI pass."
+    )
+
+    parser.add_argument(
+        '--page_triage',
+        action='store_true',
+        help=f"Render documents with {TRIAGE_MIN_PAGES} or more pages to OCR as low-DPI thumbnails first, and give a full 300 DPI OCR only to the pages showing holder details (name, IFSC, account number, DOB). Other pages are skipped, so details found only on them (e.g. an address on a back page) are lost."
+    )
+
+    parser.add_argument(
+        '--triage_max_pages',
+        type=int,
+        default=TRIAGE_MAX_PAGES,
+        help="Pages per document kept for full OCR by page triage."
+    )
+
+    parser.add_argument(
+        '--ocr_pages',
+        type=parse_page_spec,
+        default=None,
+        metavar='PAGES',
+        help="OCR only these pages of every document, e.g. '1' or '1,3-4' (1-based). Overrides page triage."
+    )
+
+    parser.add_argument(
+        '--roi_ocr',
+        action='store_true',
+        help="For document types with a template in config/ocr_templates.yaml (PAN, Aadhaar), OCR only the field regions of matching pages, each with field-specific Tesseract settings, instead of the whole page."
+    )
+
+    parser.add_argument(
+        '--ocr_engine',
+        choices=OCR_ENGINES,
+        default='auto',
+        help="Tesseract backend. 'tesserocr' keeps one Tesseract engine per OCR worker with the language model loaded and passes page images from memory; 'pytesseract' starts a tesseract process per page. 'auto' uses tesserocr when it is installed."
+    )
+
+    parser.add_argument(
+        '--no_local_extraction',
+        action='store_true',
+        help="Always use Gemini for classification and extraction, even for PAN/Aadhaar/passbook documents the local rule-based extractor can handle."
+    )
+
+    parser.add_argument(
+        '--no_local_consolidation',
+        action='store_true',
+        help="Send all extracted results to Gemini for consolidation instead of merging locally and escalating only conflicting fields."
+    )
+
+    parser.add_argument(
+        '--batch_extraction',
+        action='store_true',
+        help="Send all documents the local extractor cannot handle to Gemini in one request instead of one request per document. With --no_local_consolidation, the same request also returns the consolidated profile."
+    )
+
+    parser.add_argument(
+        '--no_prompt_compaction',
+        action='store_true',
+        help="Send raw OCR text and indented JSON to Gemini instead of compacting whitespace, noise lines, repeated lines, irrelevant pages and file paths."
+    )
+
+    parser.add_argument(
+        '--gemini_token_budget',
+        type=int,
+        default=DEFAULT_TOKEN_BUDGET,
+        help="Maximum prompt tokens per Gemini call; longer OCR text is truncated. 0 disables the budget."
+    )
+
+    parser.add_argument(
+        '--gemini_rpm',
+        type=int,
+        default=DEFAULT_REQUESTS_PER_MINUTE,
+        help="Gemini requests per minute allowed by your quota. Requests beyond it wait instead of failing with 429 errors. 0 disables the limit."
+    )
+
+    parser.add_argument(
+        '--gemini_tpm',
+        type=int,
+        default=DEFAULT_TOKENS_PER_MINUTE,
+        help="Gemini prompt tokens per minute allowed by your quota. 0 disables the limit."
+    )
+
+    parser.add_argument(
+        '--ocr_cache_dir',
+        type=str,
+        default='.cache/ocr/',
+        help="Directory for the persistent per-page OCR cache, keyed by file content, page, DPI, language and Tesseract version."
+    )
+
+    parser.add_argument(
+        '--ocr_cache_max_mb',
+        type=int,
+        default=200,
+        help="Maximum size of the OCR cache in MB. Least recently used entries are evicted beyond this."
+    )
+
+    parser.add_argument(
+        '--no_ocr_cache', '--no-ocr-cache',
+        dest='no_ocr_cache',
+        action='store_true',
+        help="Disable the OCR cache and always run OCR."
+    )
+
+    parser.add_argument(
+        '--gemini_cache_dir',
+        type=str,
+        default='.cache/gemini/',
+        help="Directory for the persistent Gemini response cache, keyed by model, prompt hash and generation settings."
+    )
+
+    parser.add_argument(
+        '--gemini_cache_ttl_hours',
+        type=float,
+        default=24,
+        help="Cached Gemini responses older than this many hours are ignored and refreshed."
+    )
+
+    parser.add_argument(
+        '--gemini_cache_max_mb',
+        type=int,
+        default=50,
+        help="Maximum size of the Gemini response cache in MB. Least recently used entries are evicted beyond this."
+    )
+
+    parser.add_argument(
+        '--no_gemini_cache', '--no-gemini-cache',
+        dest='no_gemini_cache',
+        action='store_true',
+        help="Disable the Gemini response cache and always call the API."
+    )
+
+    parser.add_argument(
+        '--metrics_json',
+        type=str,
+        default=None,
+        help="Write timing spans (per document, page, Gemini attempt and form field) and counters to this JSON file at the end of the run."
+    )
+
+    parser.add_argument(
+        '--metrics_prometheus',
+        type=str,
+        default=None,
+        help="Write span totals and counters to this file in Prometheus text format at the end of the run."
+    )
+
+    parser.add_argument(
+        '--profile',
+        type=str,
+        default=None,
+        help="Run under cProfile (including pipeline worker threads) and write the statistics to this file, e.g. run.prof."
+    )
+
+
+def parse_page_spec(spec):
+    """Parses a page list such as '1,3-5' into sorted 1-based page numbers (argparse type)."""
+    pages = set()
+    try:
+        for part in spec.split(','):
+            first, _, last = part.strip().partition('-')
+            first, last = int(first), int(last or first)
+            if first < 1 or last < first:
+                raise ValueError
+            pages.update(range(first, last + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid page list '{spec}', expected e.g. '1' or '1,3-4'") from None
+    return sorted(pages)
+
+
+def add_form_arguments(parser):
+    """Adds the form filling options shared by run.py and batch.py."""
+    parser.add_argument(
+        '--no_batch_fill',
+        action='store_true',
+        help="Fill the form with separate WebDriver calls per field instead of one batched JavaScript call."
+    )
+
+    parser.add_argument(
+        '--fill_plan_cache_dir',
+        type=str,
+        default='.cache/fill_plans/',
+        help="Directory for compiled form fill plans (element kinds, fill strategy and value coercion per field), keyed by mapping hash and page fingerprint."
+    )
+
+    parser.add_argument(
+        '--no_fill_plan_cache',
+        action='store_true',
+        help="Inspect the form fields on every fill instead of reusing cached fill plans."
+    )
+
+
+def add_journal_arguments(parser):
+    """Adds the run journal options shared by run.py and batch.py."""
+    parser.add_argument(
+        '--journal_dir',
+        type=str,
+        default='.runs/',
+        help="Directory of per-run journals. Each run records its OCR text, extraction results and consolidated profiles there as they complete."
+    )
+
+    parser.add_argument(
+        '--resume',
+        type=str,
+        default=None,
+        metavar='RUN_ID',
+        help="Continue an interrupted run from its journal, skipping the stages it already completed. The run id is logged at the start of every run."
+    )
+
+    parser.add_argument(
+        '--no_journal',
+        action='store_true',
+        help="Do not record a run journal (the run cannot be resumed)."
+    )
+
+    parser.add_argument(
+        '--keep_runs',
+        type=int,
+        default=0,
+        metavar='N',
+        help="Keep the journals of the N most recent completed runs. Journals hold OCR text and applicant profiles; by default a run's journal is deleted as soon as the run completes. Interrupted runs are always kept for --resume."
+    )
+
+
+def open_run_journal(args, metadata):
+    """
+    Returns the journal of the run being resumed (--resume), a new journal recording
+    metadata, or None with --no_journal. Raises FileNotFoundError for an unknown run id.
+    """
+    if args.resume:
+        journal = RunJournal.open(args.journal_dir, args.resume)
+        logging.info(f"Resuming run {journal.run_id} from {journal.directory}")
+        return journal
+    if args.no_journal:
+        return None
+    journal = RunJournal.create(args.journal_dir, metadata)
+    logging.info(f"Run journal: {journal.directory} (if interrupted, continue with --resume {journal.run_id})")
+    return journal
+
+
+def finish_run_journal(args, journal):
+    """Marks a run as completed and deletes completed run journals beyond --keep_runs."""
+    if journal is None:
+        return
+    journal.complete()
+    deleted = prune_run_journals(args.journal_dir, args.keep_runs)
+    if deleted:
+        logging.info(f"Deleted {deleted} completed run journals from {args.journal_dir} (keeping {args.keep_runs}).")
+
+
+def create_fill_plan_cache(args):
+    """Returns the fill plan cache requested on the command line, or None."""
+    if args.no_fill_plan_cache:
+        return None
+    return DiskCache(args.fill_plan_cache_dir, max_bytes=5 * 1024 * 1024, name='Fill plan cache')
+
+
+def create_caches(args):
+    """
+    Creates the OCR and Gemini response caches requested on the command line and
+    enables the Gemini cache. Returns (ocr_cache, gemini_cache); either may be None.
+    """
+    ocr_cache = None
+    if not args.no_ocr_cache:
+        ocr_cache = DiskCache(args.ocr_cache_dir, max_bytes=args.ocr_cache_max_mb * 1024 * 1024, name='OCR cache')
+
+    gemini_cache = None
+    if not args.no_gemini_cache:
+        gemini_cache = DiskCache(args.gemini_cache_dir, max_bytes=args.gemini_cache_max_mb * 1024 * 1024,
+                                 name='Gemini cache', ttl=args.gemini_cache_ttl_hours * 3600)
+        from src.gemini_processor import set_response_cache
+        set_response_cache(gemini_cache)
+
+    return ocr_cache, gemini_cache
+
+
+def configure_gemini(args):
+    """Applies the prompt compaction, token budget and rate limit options to the Gemini calls."""
+    from src.gemini_processor import set_prompt_options
+    set_prompt_options(compact=not args.no_prompt_compaction, token_budget=args.gemini_token_budget)
+    configure_client(requests_per_minute=args.gemini_rpm, tokens_per_minute=args.gemini_tpm)
+
+
+def start_instrumentation(args):
+    """
+    Starts cProfile if --profile was given and arranges for the metrics and profile
+    files to be written when the process exits, including on early sys.exit().
+    """
+    if args.profile:
+        metrics.enable_profiling()
+    if args.profile or args.metrics_json or args.metrics_prometheus:
+        atexit.register(write_instrumentation, args)
+
+
+def write_instrumentation(args):
+    """Writes the metrics and profile files requested on the command line."""
+    try:
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_prometheus:
+            metrics.write_prometheus(args.metrics_prometheus)
+        if args.profile:
+            metrics.write_profile(args.profile)
+    except OSError as e:
+        logging.error(f"Could not write metrics or profile output: {e}")
+
+
+def build_ocr_options(args, ocr_cache=None, ocr_templates=None):
+    """
+    Returns the process_pdf_and_ocr keyword arguments selected on the command line,
+    after selecting the OCR engine (a process-wide setting).
+    """
+    from src.tesseract_engine import set_ocr_engine
+    set_ocr_engine(args.ocr_engine)
+    return {
+        'temp_dir': args.temp_dir,
+        'workers': args.ocr_workers,
+        'page_window': args.page_window,
+        'use_text_layer': not args.no_text_layer,
+        'min_text_chars': args.min_text_chars,
+        'ocr_cache': ocr_cache,
+        'adaptive': args.adaptive_ocr,
+        'min_confidence': args.min_ocr_confidence,
+        'templates': ocr_templates,
+        'pages_to_process': args.ocr_pages,
+        'page_triage': args.page_triage,
+        'triage_max_pages': args.triage_max_pages,
+    }
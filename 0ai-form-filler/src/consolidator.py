@@ -0,0 +1,196 @@
+import re
+import logging
+import time
+from datetime import datetime
+
+from src.local_extractor import PAN_DOCUMENT, AADHAAR_DOCUMENT, PASSBOOK_DOCUMENT
+from src.metrics import span, increment
+
+# Profile fields produced by consolidation (same list as the consolidation prompt)
+CONSOLIDATED_FIELDS = (
+    'full_name', 'date_of_birth', 'gender', 'pan_number', 'aadhaar_number', 'account_number',
+    'bank_name', 'branch_name', 'ifsc_code', 'address', 'father_name', 'email', 'phone_number',
+)
+
+# Which document type is the authoritative source for each field, best first.
+# Fields not listed here (email, phone_number) have no preferred source.
+FIELD_PRIORITY = {
+    'full_name': (PAN_DOCUMENT, AADHAAR_DOCUMENT, PASSBOOK_DOCUMENT),
+    'pan_number': (PAN_DOCUMENT,),
+    'father_name': (PAN_DOCUMENT,),
+    'date_of_birth': (PAN_DOCUMENT, AADHAAR_DOCUMENT),
+    'gender': (AADHAAR_DOCUMENT,),
+    'aadhaar_number': (AADHAAR_DOCUMENT,),
+    'address': (AADHAAR_DOCUMENT, PASSBOOK_DOCUMENT),
+    'account_number': (PASSBOOK_DOCUMENT,),
+    'ifsc_code': (PASSBOOK_DOCUMENT,),
+    'bank_name': (PASSBOOK_DOCUMENT,),
+    'branch_name': (PASSBOOK_DOCUMENT,),
+}
+
+# Alternative keys Gemini sometimes uses in per-document extraction
+FIELD_ALIASES = {
+    'name': 'full_name',
+    'dob': 'date_of_birth',
+    'birth_date': 'date_of_birth',
+    'pan': 'pan_number',
+    'aadhaar': 'aadhaar_number',
+    'aadhar_number': 'aadhaar_number',
+    'uid': 'aadhaar_number',
+    'fathers_name': 'father_name',
+    'guardian_name': 'father_name',
+    'account_no': 'account_number',
+    'ifsc': 'ifsc_code',
+    'branch': 'branch_name',
+    'mobile_number': 'phone_number',
+    'phone': 'phone_number',
+    'email_address': 'email',
+}
+
+_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d %b %Y', '%d %B %Y', '%d-%b-%Y')
+_NUMERIC_FIELDS = ('aadhaar_number', 'account_number', 'phone_number')
+
+
+def document_kind(document_type):
+    """Maps a free-form document type (e.g. 'PAN Card', 'Aadhar') to a known type, or None."""
+    lowered = str(document_type or '').lower()
+    if 'pan' in lowered and 'company' not in lowered:
+        return PAN_DOCUMENT
+    if 'aadhaar' in lowered or 'aadhar' in lowered:
+        return AADHAAR_DOCUMENT
+    if 'passbook' in lowered or 'bank' in lowered or 'statement' in lowered:
+        return PASSBOOK_DOCUMENT
+    return None
+
+
+def normalize_date_value(value):
+    """Returns a date string as YYYY-MM-DD if it can be parsed, otherwise unchanged."""
+    text = str(value).strip()
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return text
+
+
+def normalize_value(field, value):
+    """Cleans up a field value for output (dates as YYYY-MM-DD, collapsed whitespace)."""
+    if field == 'date_of_birth':
+        return normalize_date_value(value)
+    if isinstance(value, str):
+        value = re.sub(r'\s+', ' ', value).strip()
+        if field in ('pan_number', 'ifsc_code'):
+            value = value.upper()
+    return value
+
+
+def _comparison_key(field, value):
+    """Key under which two values count as the same (ignores case, spacing and punctuation)."""
+    text = str(value)
+    if field in _NUMERIC_FIELDS:
+        return re.sub(r'\D', '', text)
+    return re.sub(r'[^a-z0-9]', '', text.lower())
+
+
+def _collect_candidates(extracted_document_results):
+    """Returns {field: [(document kind, value), ...]} over all documents, in document order."""
+    candidates = {}
+    for result in extracted_document_results:
+        extracted = result.get('extracted') or {}
+        kind = document_kind(extracted.get('document_type'))
+        for key, value in (extracted.get('data') or {}).items():
+            field = FIELD_ALIASES.get(key, key)
+            if field not in CONSOLIDATED_FIELDS or value is None or isinstance(value, (dict, list)):
+                continue
+            if isinstance(value, str) and not value.strip():
+                continue
+            candidates.setdefault(field, []).append((kind, normalize_value(field, value)))
+    return candidates
+
+
+def _most_complete(values):
+    """Picks the longest value, e.g. the full name over an abbreviated one."""
+    return max(values, key=lambda value: len(str(value)))
+
+
+def merge_documents(extracted_document_results):
+    """
+    Merges per-document results with source-priority rules.
+
+    Returns:
+        tuple: (consolidated profile dict, conflicts). conflicts maps each field the
+               rules cannot settle to its candidates: [{'document_type', 'value'}, ...].
+    """
+    consolidated = {}
+    conflicts = {}
+
+    for field, field_candidates in _collect_candidates(extracted_document_results).items():
+        distinct = {}
+        for kind, value in field_candidates:
+            distinct.setdefault(_comparison_key(field, value), []).append((kind, value))
+
+        if len(distinct) == 1:
+            # Every document agrees; prefer the authoritative source's formatting
+            agreeing = next(iter(distinct.values()))
+            priority = FIELD_PRIORITY.get(field, ())
+            agreeing.sort(key=lambda candidate: priority.index(candidate[0]) if candidate[0] in priority else len(priority))
+            consolidated[field] = agreeing[0][1]
+            continue
+
+        # Documents disagree: the first priority source present decides, if it is self-consistent
+        decided = False
+        for kind in FIELD_PRIORITY.get(field, ()):
+            source_values = {_comparison_key(field, value): value for candidate_kind, value in field_candidates if candidate_kind == kind}
+            if len(source_values) == 1:
+                consolidated[field] = next(iter(source_values.values()))
+                decided = True
+                break
+            if source_values:
+                break  # The authoritative source contradicts itself
+
+        if not decided:
+            conflicts[field] = [{'document_type': kind or 'Other', 'value': value} for kind, value in field_candidates]
+
+    return consolidated, conflicts
+
+
+def consolidate_locally(extracted_document_results, resolve_conflicts=None):
+    """
+    Consolidates extraction results without a network call, escalating only the
+    conflicting fields.
+
+    Args:
+        extracted_document_results (list): [{'doc_path': ..., 'extracted': {...}}, ...]
+        resolve_conflicts (callable, optional): Called with the conflicts dict; should
+            return {field: chosen value}. Typically a small targeted Gemini prompt.
+            Fields it does not settle fall back to the most complete value.
+
+    Returns:
+        dict: The consolidated profile (may be empty if nothing was extracted).
+    """
+    start_time = time.perf_counter()
+    consolidated, conflicts = merge_documents(extracted_document_results)
+    logging.info(f"  Local consolidation merged {len(consolidated)} fields in {(time.perf_counter() - start_time) * 1000:.2f} ms.")
+
+    if not conflicts:
+        return consolidated
+
+    logging.info(f"  {len(conflicts)} conflicting fields need resolution: {list(conflicts)}")
+    increment('consolidation_conflicts_total', len(conflicts))
+    resolved = {}
+    if resolve_conflicts is not None:
+        try:
+            with span('consolidate.resolve_conflicts', fields=len(conflicts)):
+                resolved = resolve_conflicts(conflicts) or {}
+        except Exception as e:
+            logging.warning(f"  Conflict resolution failed: {e}")
+
+    for field, field_candidates in conflicts.items():
+        value = resolved.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            value = _most_complete([candidate['value'] for candidate in field_candidates])
+            logging.warning(f"  Conflict on '{field}' not resolved; using the most complete value.")
+        consolidated[field] = normalize_value(field, value)
+
+    return consolidated
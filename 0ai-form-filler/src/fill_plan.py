@@ -0,0 +1,223 @@
+import json
+import logging
+import hashlib
+from src.cache import make_cache_key
+from src.consolidator import CONSOLIDATED_FIELDS, normalize_date_value
+from src.metrics import span, increment
+
+# A fill plan is the compiled form of one entry in config/form_mappings.yaml:
+#
+#   {'form': 'local_test_form', 'url': 'http://...', 'mapping_hash': '...',
+#    'fields': [{'locator': '#dobInput', 'data_key': 'date_of_birth',
+#                'kind': 'date', 'strategy': 'batch', 'coerce': 'date'}, ...]}
+#
+# compile_form_plan() validates the mapping and builds the static part (no browser
+# needed). resolve_fill_plan() adds each element's kind, fill strategy and value
+# coercion from one DOM query, and caches the result keyed by mapping hash and
+# page fingerprint so repeat fills of an unchanged page skip the introspection.
+
+# Bump when the plan layout changes so stale cached plans are ignored
+FILL_PLAN_VERSION = 1
+
+# Input types filled like text fields
+TEXT_INPUT_TYPES = ('text', 'password', 'email', 'tel', 'search', 'url')
+
+# Signature of every form control on the page; changes whenever fields or options are added, removed or renamed
+PAGE_FINGERPRINT_SCRIPT = """
+return Array.from(document.querySelectorAll('input, select, textarea')).map(function (element) {
+    const options = element.tagName === 'SELECT' ? Array.from(element.options).map(o => o.value).join(',') : '';
+    return [element.tagName, element.getAttribute('type') || '', element.id, element.name || '', options].join('|');
+}).join('\\n');
+"""
+
+# Returns {locator: {found, tag, type, options}} for the given CSS locators in one round trip
+INTROSPECT_SCRIPT = """
+const report = {};
+for (const locator of arguments[0]) {
+    let element = null;
+    try {
+        element = document.querySelector(locator);
+    } catch (error) {}
+    if (!element) {
+        report[locator] = {found: false};
+        continue;
+    }
+    const tag = element.tagName;
+    report[locator] = {
+        found: true,
+        tag: tag,
+        type: (element.getAttribute('type') || (tag === 'INPUT' ? 'text' : '')).toLowerCase(),
+        options: tag === 'SELECT' ? Array.from(element.options).map(o => [o.value, o.text.trim()]) : [],
+    };
+}
+return report;
+"""
+
+
+def compile_form_plan(form_name, form_mappings):
+    """
+    Validates the mapping of form_name and returns its static fill plan.
+
+    Raises:
+        ValueError: If the form is missing, has no valid 'url', or a field entry is
+                    not a non-empty locator string mapped to a data key string.
+                    All problems of the form are reported in one message.
+    """
+    if form_name not in form_mappings:
+        raise ValueError(f"No form mapping found for target form: '{form_name}'. Please check config/form_mappings.yaml")
+    mapping = form_mappings[form_name]
+    if not isinstance(mapping, dict):
+        raise ValueError(f"Form mapping '{form_name}' must be a mapping of 'url' and field locators.")
+
+    problems = []
+    url = mapping.get('url')
+    if not isinstance(url, str) or not url.startswith(('http://', 'https://', 'file://')):
+        problems.append(f"'url' must be an http(s) or file URL, got {url!r}")
+
+    fields = []
+    for locator, data_key in mapping.items():
+        if locator == 'url':
+            continue
+        if not isinstance(locator, str) or not locator.strip():
+            problems.append(f"field locator {locator!r} must be a non-empty CSS selector")
+        elif not isinstance(data_key, str) or not data_key.strip():
+            problems.append(f"field '{locator}' must map to a data key name, got {data_key!r}")
+        else:
+            if data_key not in CONSOLIDATED_FIELDS:
+                logging.warning(f"Form '{form_name}': data key '{data_key}' of field '{locator}' is not a consolidated field; it is only filled if Gemini returns it.")
+            fields.append({'locator': locator, 'data_key': data_key})
+
+    if problems:
+        raise ValueError(f"Invalid form mapping '{form_name}': " + "; ".join(problems))
+    if not fields:
+        logging.warning(f"Form mapping '{form_name}' has no field locators; nothing will be filled.")
+
+    mapping_hash = make_cache_key(FILL_PLAN_VERSION, form_name, url, [[field['locator'], field['data_key']] for field in fields])
+    return {'form': form_name, 'url': url, 'mapping_hash': mapping_hash, 'fields': fields}
+
+
+def _field_kind(element):
+    """Maps an introspected element to (kind, strategy, coerce)."""
+    if not element.get('found'):
+        # Possibly rendered later; the per-field path waits for it
+        return 'missing', 'per_field', 'text'
+    tag, input_type = element['tag'], element['type']
+    if tag == 'SELECT':
+        return 'select', 'batch', 'select'
+    if tag == 'TEXTAREA':
+        return 'textarea', 'batch', 'text'
+    if tag == 'INPUT' and input_type == 'date':
+        return 'date', 'batch', 'date'
+    if tag == 'INPUT' and input_type == 'number':
+        return 'number', 'batch', 'digits'
+    if tag == 'INPUT' and input_type in TEXT_INPUT_TYPES:
+        return 'text', 'batch', 'text'
+    return 'unsupported', 'skip', None
+
+
+def page_fingerprint(driver):
+    """Returns a hash of the form controls on the loaded page (one execute_script call)."""
+    signature = driver.execute_script(PAGE_FINGERPRINT_SCRIPT) or ''
+    return hashlib.sha256(signature.encode('utf-8')).hexdigest()
+
+
+def resolve_fill_plan(driver, plan, plan_cache=None):
+    """
+    Returns plan with each field's kind, strategy and coercion resolved against the
+    page loaded in driver. With plan_cache (a DiskCache), a plan resolved earlier for
+    the same mapping and page fingerprint is reused instead of querying the DOM.
+    Returns None if the page could not be inspected.
+    """
+    try:
+        fingerprint = page_fingerprint(driver)
+    except Exception as e:
+        logging.warning(f"Could not fingerprint the form page: {e}")
+        return None
+
+    cache_key = make_cache_key('fill_plan', plan['mapping_hash'], fingerprint)
+    if plan_cache is not None:
+        cached = plan_cache.get(cache_key)
+        if cached is not None:
+            try:
+                resolved = json.loads(cached)
+                increment('fill_plans_total', source='cache')
+                logging.info(f"Using cached fill plan for form '{plan['form']}'.")
+                return resolved
+            except ValueError:
+                plan_cache.delete(cache_key)
+
+    try:
+        with span('form.introspect', fields=len(plan['fields'])):
+            elements = driver.execute_script(INTROSPECT_SCRIPT, [field['locator'] for field in plan['fields']]) or {}
+    except Exception as e:
+        logging.warning(f"Could not inspect the form fields: {e}")
+        return None
+
+    fields = []
+    for field in plan['fields']:
+        element = elements.get(field['locator']) or {'found': False}
+        kind, strategy, coerce = _field_kind(element)
+        resolved_field = dict(field, kind=kind, strategy=strategy, coerce=coerce)
+        if kind == 'select':
+            resolved_field['options'] = element.get('options') or []
+        elif kind == 'unsupported':
+            logging.warning(f"  Field '{field['locator']}' is a <{element['tag'].lower()}> type='{element['type']}'. Unsupported field type; it will be skipped.")
+        fields.append(resolved_field)
+
+    resolved = dict(plan, fields=fields, page_fingerprint=fingerprint)
+    increment('fill_plans_total', source='introspected')
+    if plan_cache is not None:
+        plan_cache.set(cache_key, json.dumps(resolved))
+    return resolved
+
+
+def _select_option(options, value):
+    """Returns the value of the option matching value by value or visible text, else value unchanged."""
+    wanted = value.strip().lower()
+    for option_value, option_text in options:
+        if option_value == value:
+            return option_value
+    for option_value, option_text in options:
+        if option_value.lower() == wanted or option_text.lower() == wanted:
+            return option_value
+    return value
+
+
+def coerce_value(field, value):
+    """Converts a consolidated value to the string the field expects."""
+    text = str(value).strip()
+    coerce = field.get('coerce')
+    if coerce == 'date':
+        return normalize_date_value(text)
+    if coerce == 'digits':
+        return ''.join(text.split())
+    if coerce == 'select':
+        return _select_option(field.get('options') or [], text)
+    return text
+
+
+def plan_fill_values(plan, data_to_fill):
+    """
+    Looks up and coerces the value of every planned field in data_to_fill.
+    Returns a list of (field, value) for the fields to fill; missing, empty and
+    unsupported fields are logged, counted and left out.
+    """
+    values = []
+    for field in plan['fields']:
+        field_locator, data_key = field['locator'], field['data_key']
+        if field.get('strategy') == 'skip':
+            increment('form_fields_total', status='unsupported', method='plan')
+            continue
+        if data_key not in data_to_fill:
+            logging.warning(f"  Data key '{data_key}' not found in extracted data. Skipping field '{field_locator}'.")
+            increment('form_fields_total', status='skipped_missing')
+            continue
+
+        value_to_fill = data_to_fill[data_key]
+        if value_to_fill is None or value_to_fill == "":
+            logging.debug(f"  Skipping empty value for field '{field_locator}' (data key: '{data_key}').")
+            increment('form_fields_total', status='skipped_empty')
+            continue
+
+        values.append((field, coerce_value(field, value_to_fill)))
+    return values
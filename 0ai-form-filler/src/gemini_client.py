@@ -0,0 +1,218 @@
+import json
+import random
+import logging
+import threading
+import time
+from src.metrics import span, increment
+
+# Client-side protection for the Gemini API: token buckets keep requests and prompt
+# tokens under the per-minute quota, retries back off exponentially with jitter, and
+# a circuit breaker fails calls fast while the API keeps erroring. One limiter and
+# one breaker are shared by all threads of the process.
+
+# Published limits of gemini-1.5-flash on the free tier; raise them for paid quotas
+DEFAULT_REQUESTS_PER_MINUTE = 15
+DEFAULT_TOKENS_PER_MINUTE = 1000000
+
+# Upper bound of any single retry wait, in seconds
+MAX_BACKOFF_SECONDS = 60
+
+# Quota errors wait at least this long before the first retry (quotas are per minute)
+QUOTA_BACKOFF_SECONDS = 10
+
+# Consecutive failed requests that open the circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30
+
+# Error classes by exception name (google.api_core.exceptions) or HTTP status code
+QUOTA_ERRORS = ('ResourceExhausted', 'TooManyRequests')
+TRANSIENT_ERRORS = ('ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError', 'GatewayTimeout',
+                    'BadGateway', 'Aborted', 'RetryError', 'ConnectionError', 'TimeoutError', 'Timeout')
+QUOTA_STATUS_CODES = (429,)
+TRANSIENT_STATUS_CODES = (408, 500, 502, 503, 504)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """
+    Refills at rate_per_minute / 60 units per second up to capacity. acquire() blocks
+    until enough units are available; requests larger than the capacity are let
+    through once the bucket is full, so they cannot wait forever.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        """Takes amount units, waiting for the refill if needed. Returns the seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        with self._condition:
+            self._refill()
+            while self._available < amount:
+                wait = (amount - self._available) / self.rate
+                start_time = time.monotonic()
+                self._condition.wait(wait)
+                waited += time.monotonic() - start_time
+                self._refill()
+            self._available -= amount
+        return waited
+
+
+class RateLimiter:
+    """Request and token buckets for one API quota, with queue depth and throttle statistics."""
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+
+    def acquire(self, tokens=0):
+        """Blocks until a request of about `tokens` prompt tokens fits in the quota."""
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            with span('gemini.throttle'):
+                waited = self.requests.acquire(1) if self.requests else 0.0
+                if self.tokens and tokens:
+                    waited += self.tokens.acquire(tokens)
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+        if waited > 0.01:
+            with self._lock:
+                self.throttled += 1
+                self.throttle_seconds += waited
+            increment('gemini_throttled_total')
+            increment('gemini_throttle_seconds_total', waited)
+        return waited
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures; while open, allow() raises
+    CircuitOpenError. After reset_seconds one trial request is let through (half
+    open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.opens = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    increment('gemini_circuit_rejections_total')
+                    raise CircuitOpenError(f"Gemini circuit breaker is open after {self._failures} consecutive failures; "
+                                           f"retrying in {self.reset_seconds - (time.monotonic() - self._opened_at):.0f}s.")
+                self.state = 'half_open'
+                logging.info("Gemini circuit breaker half open; sending a trial request.")
+            elif self.state == 'half_open':
+                # Only the trial request goes through until it has succeeded
+                increment('gemini_circuit_rejections_total')
+                raise CircuitOpenError("Gemini circuit breaker is waiting for its trial request.")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                logging.info("Gemini circuit breaker closed.")
+            self.state = 'closed'
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self._failures >= self.failure_threshold):
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self.opens += 1
+                increment('gemini_circuit_opens_total')
+                logging.error(f"Gemini circuit breaker opened after {self._failures} consecutive failures; "
+                              f"failing calls fast for {self.reset_seconds}s.")
+
+
+def classify_error(error):
+    """Returns 'quota', 'transient' or 'permanent' for an exception raised by the Gemini SDK."""
+    code = getattr(error, 'code', None)
+    code = getattr(code, 'value', code)  # grpc status codes wrap the number
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & set(QUOTA_ERRORS) or code in QUOTA_STATUS_CODES or 'quota' in str(error).lower():
+        return 'quota'
+    if names & set(TRANSIENT_ERRORS) or code in TRANSIENT_STATUS_CODES:
+        return 'transient'
+    return 'permanent'
+
+
+def backoff_delay(attempt, base_delay, error_kind='transient'):
+    """
+    Seconds to wait before retry number attempt + 1: exponential in attempt, with
+    half of it randomized so that threads that failed together do not retry together.
+    """
+    if error_kind == 'quota':
+        base_delay = max(base_delay, QUOTA_BACKOFF_SECONDS)
+    delay = min(MAX_BACKOFF_SECONDS, base_delay * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+_limiter = RateLimiter()
+_breaker = CircuitBreaker()
+_models = {}
+_models_lock = threading.Lock()
+
+
+def configure_client(requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+    """Replaces the process-wide rate limiter (0 disables a limit)."""
+    global _limiter
+    _limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
+
+def get_limiter():
+    return _limiter
+
+
+def get_breaker():
+    return _breaker
+
+
+def get_model(genai, model_name, generation_config):
+    """Returns the GenerativeModel for a model and generation config, created once and shared by all threads."""
+    key = (model_name, json.dumps(generation_config, sort_keys=True, default=str))
+    with _models_lock:
+        if key not in _models:
+            _models[key] = genai.GenerativeModel(model_name, generation_config=generation_config or None)
+        return _models[key]
+
+
+def get_client_stats():
+    """Returns the throttling and circuit breaker statistics of this process."""
+    return {
+        'queue_depth': _limiter.queue_depth,
+        'max_queue_depth': _limiter.max_queue_depth,
+        'throttled': _limiter.throttled,
+        'throttle_seconds': round(_limiter.throttle_seconds, 3),
+        'circuit_state': _breaker.state,
+        'circuit_opens': _breaker.opens,
+    }
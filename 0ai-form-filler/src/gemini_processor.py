@@ -1,24 +1,145 @@
-import google.generativeai as genai
 import os
 import logging
 import json
 import time
-import sys # Import sys
-
-# Configure Gemini API
-# Needs GOOGLE_API_KEY environment variable set
-try:
-    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-    logging.info("Gemini API configured.")
-except KeyError:
-    logging.error("GOOGLE_API_KEY environment variable not set. Please set it.")
-    logging.error("Refer to README.md for instructions.")
-    sys.exit(1) # Exit if API key is missing
+import hashlib
+import threading
+from src.cache import make_cache_key
+from src.metrics import span, increment
+from src.option_defaults import DEFAULT_TOKEN_BUDGET
+from src import gemini_client
+from src.gemini_client import CircuitOpenError, classify_error, backoff_delay
+from src.output_schema import (EXTRACTION_RESPONSE_SCHEMA, PROFILE_RESPONSE_SCHEMA, BATCH_EXTRACTION_RESPONSE_SCHEMA,
+                               REASK_PROMPT, validate_extraction,
+                               validate_fields, reask_field_list, reask_response_schema)
+from src.prompt_compaction import (estimate_tokens, compact_ocr_text, compact_json, truncate_text,
+                                   extraction_results_for_prompt, CHARS_PER_TOKEN)
+
+# The Gemini SDK takes about a second to import, so it is imported and configured
+# on first use rather than at import time. Needs GOOGLE_API_KEY environment variable set.
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def get_genai():
+    """Returns the configured google.generativeai module. Raises RuntimeError if GOOGLE_API_KEY is not set."""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            api_key = os.environ.get("GOOGLE_API_KEY")
+            if not api_key:
+                raise RuntimeError("GOOGLE_API_KEY environment variable not set. Please set it (see README.md).")
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            logging.info("Gemini API configured.")
+            _genai = genai
+        return _genai
 
 # Choose the specific model you know is available and works with your key
 # Based on your finding, use gemini-1.5-flash-latest
 GEMINI_MODEL = 'models/gemini-1.5-flash-latest'
 
+# Generation settings sent with every request. They are part of the response cache key.
+GENERATION_CONFIG = {}
+
+
+def json_generation_config(response_schema=None):
+    """GENERATION_CONFIG asking for a JSON reply, constrained to response_schema if given."""
+    config = dict(GENERATION_CONFIG, response_mime_type='application/json')
+    if response_schema is not None:
+        config['response_schema'] = response_schema
+    return config
+
+# Optional persistent cache of raw Gemini responses (a src.cache.DiskCache), set by run.py
+_response_cache = None
+
+
+def set_response_cache(cache):
+    """Enables (or, with None, disables) the Gemini response cache for this process."""
+    global _response_cache
+    _response_cache = cache
+
+
+# Prompt preparation: compact OCR text and JSON, and cap each prompt at token_budget tokens (0 = no cap)
+_prompt_options = {'compact': True, 'token_budget': DEFAULT_TOKEN_BUDGET}
+
+# Prompts estimated above this share of the budget are measured with the model's token counter
+EXACT_COUNT_THRESHOLD = 0.8
+
+# A truncated prompt is counted again and cut further, at most this many times
+MAX_TRUNCATION_ROUNDS = 5
+
+
+def set_prompt_options(compact=True, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Sets whether prompts are compacted and the per-call token budget for this process."""
+    _prompt_options['compact'] = compact
+    _prompt_options['token_budget'] = token_budget
+
+
+def count_prompt_tokens(prompt_text):
+    """
+    Counts the tokens of a prompt with the model's tokenizer (one API call).
+    Falls back to the character-based estimate if the API is not available.
+    """
+    try:
+        with span('gemini.count_tokens'):
+            return gemini_client.get_model(get_genai(), GEMINI_MODEL, GENERATION_CONFIG).count_tokens(prompt_text).total_tokens
+    except Exception as e:
+        logging.warning(f"  Could not count prompt tokens with {GEMINI_MODEL}, using an estimate: {e}")
+        return estimate_tokens(prompt_text)
+
+
+def prepare_prompt(instruction, label, body, raw_body=None, truncatable=False):
+    """
+    Builds '<instruction>\n\n<label>:\n<body>' and enforces the token budget. A
+    truncatable body (OCR text) is cut to fit; structured data that cannot be cut
+    without losing fields is sent whole with a warning. raw_body is the body before
+    compaction; the token counts before and after are logged.
+    Returns (prompt, body as sent), so follow-up requests can reuse the same body.
+    """
+    prompt = f"{instruction}\n\n{label}:\n{body}"
+    budget = _prompt_options['token_budget']
+    tokens = estimate_tokens(prompt)
+    exact = False
+    if budget and tokens > budget * EXACT_COUNT_THRESHOLD:
+        tokens, exact = count_prompt_tokens(prompt), True
+
+    if budget and tokens > budget:
+        if truncatable:
+            # Scale the body by the measured overshoot, with a margin for the uneven token density,
+            # and count again: the cut is based on an average density and can still overshoot
+            for _ in range(MAX_TRUNCATION_ROUNDS):
+                keep_chars = max(0, int(len(body) * (budget / tokens) * 0.95) - int(len(instruction) / CHARS_PER_TOKEN))
+                body = truncate_text(body, keep_chars)
+                prompt = f"{instruction}\n\n{label}:\n{body}"
+                tokens, exact = count_prompt_tokens(prompt), True
+                if tokens <= budget or not body:
+                    break
+            increment('gemini_prompts_truncated_total')
+            logging.warning(f"  Prompt exceeded the {budget} token budget; {label.lower()} truncated to {len(body)} characters ({tokens} tokens).")
+            if tokens > budget:
+                logging.warning(f"  Prompt still has {tokens} tokens after truncation, over the {budget} token budget.")
+        else:
+            logging.warning(f"  Prompt has {tokens} tokens, over the {budget} token budget; sending it whole.")
+
+    if raw_body is not None:
+        tokens_before = estimate_tokens(f"{instruction}\n\n{label}:\n{raw_body}")
+        tokens_after = tokens if exact else estimate_tokens(prompt)
+        increment('gemini_prompt_tokens_saved_total', max(0, tokens_before - tokens_after))
+        logging.info(f"  Prompt compacted from ~{tokens_before} to {'' if exact else '~'}{tokens_after} tokens.")
+    return prompt, body
+
+
+def _response_cache_key(prompt_text, generation_config=None):
+    prompt_hash = hashlib.sha256(prompt_text.encode('utf-8')).hexdigest()
+    return make_cache_key('gemini', GEMINI_MODEL, prompt_hash, GENERATION_CONFIG if generation_config is None else generation_config)
+
+
+def _discard_cached_response(prompt_text, generation_config=None):
+    """Drops a cached response that could not be used, so the next run asks Gemini again."""
+    if _response_cache is not None:
+        _response_cache.delete(_response_cache_key(prompt_text, generation_config))
+
 # Optional: Add a check here to see if this model is available
 # try:
 #      model_info = genai.get_model(GEMINI_MODEL)
@@ -32,18 +153,71 @@ GEMINI_MODEL = 'models/gemini-1.5-flash-latest'
 #      sys.exit(1)
 
 
-def call_gemini_api(prompt_text, max_retries=3, delay=5):
-    """Helper function to call Gemini API with retries."""
+def _wait_before_retry(delay, reason):
+    """Sleeps between attempts, recording the retry and the time spent waiting."""
+    increment('gemini_retries_total', reason=reason)
+    with span('gemini.retry_wait', reason=reason):
+        time.sleep(delay)
+
+
+def _record_token_usage(response):
+    """Adds the token counts Gemini reports for a response to the metrics, if present."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    increment('gemini_prompt_tokens_total', getattr(usage, 'prompt_token_count', 0) or 0)
+    increment('gemini_output_tokens_total', getattr(usage, 'candidates_token_count', 0) or 0)
+
+
+def call_gemini_api(prompt_text, max_retries=3, delay=5, generation_config=None):
+    """
+    Helper function to call Gemini API with retries. generation_config replaces
+    GENERATION_CONFIG for this call (e.g. json_generation_config(schema)). Requests wait for the shared
+    rate limiter; retries back off exponentially from delay seconds (longer for
+    quota errors), errors that cannot succeed on retry are not retried, and calls
+    fail fast while the circuit breaker is open.
+    """
     # Ensure prompt_text is not excessively long for the model
     # You might need to truncate text or use a model with a larger context window
     # Gemini 1.5 Flash has a large context window (1M tokens), so this is less likely to be an issue
     # compared to older models, but it's still good to be aware.
 
-    model = genai.GenerativeModel(GEMINI_MODEL)
+    cache_key = None
+    if _response_cache is not None:
+        cache_key = _response_cache_key(prompt_text, generation_config)
+        cached_response = _response_cache.get(cache_key)
+        if cached_response is not None:
+            logging.info("  Using cached Gemini response.")
+            increment('gemini_requests_total', status='cached')
+            return cached_response
+
+    increment('gemini_prompt_chars_total', len(prompt_text))
+
+    try:
+        genai = get_genai()
+    except (RuntimeError, ImportError) as e:
+        logging.error(f"Gemini API is not available: {e}")
+        increment('gemini_requests_total', status='failed')
+        return None
+
+    model = gemini_client.get_model(genai, GEMINI_MODEL, GENERATION_CONFIG if generation_config is None else generation_config)
+    breaker = gemini_client.get_breaker()
+    prompt_tokens = estimate_tokens(prompt_text)
 
     for attempt in range(max_retries):
         try:
-            response = model.generate_content(prompt_text)
+            breaker.allow()
+        except CircuitOpenError as e:
+            logging.error(f"Gemini API call skipped: {e}")
+            increment('gemini_requests_total', status='failed')
+            return None
+
+        try:
+            gemini_client.get_limiter().acquire(prompt_tokens)
+            with span('gemini.attempt', attempt=attempt + 1):
+                response = model.generate_content(prompt_text)
+            # Any answer, even a blocked one, means the API is reachable
+            breaker.record_success()
 
             # Check for blocked content or empty response
             if not response.candidates:
@@ -57,76 +231,126 @@ def call_gemini_api(prompt_text, max_retries=3, delay=5):
                  # If blocked on the last attempt, return None
                  if attempt == max_retries - 1:
                       logging.error("Max retries reached due to content blocking or empty response.")
+                      increment('gemini_requests_total', status='failed')
                       return None
                  else:
-                      logging.info(f"Retrying Gemini API call in {delay} seconds...")
-                      time.sleep(delay)
+                      retry_delay = backoff_delay(attempt, delay)
+                      logging.info(f"Retrying Gemini API call in {retry_delay:.1f} seconds...")
+                      _wait_before_retry(retry_delay, 'blocked')
                       continue # Go to the next attempt
 
             # Extract text from the response
             # response.text might raise ValueError if content is blocked (handled above)
             try:
-                return response.text.strip()
+                response_text = response.text.strip()
             except ValueError:
                  logging.warning("Gemini response text is not available (potentially blocked content).")
                  # This case should ideally be covered by checking candidates above, but as a fallback:
                  if attempt == max_retries - 1:
                       logging.error("Max retries reached and response text remains unavailable.")
+                      increment('gemini_requests_total', status='failed')
                       return None
                  else:
-                      logging.info(f"Retrying Gemini API call in {delay} seconds...")
-                      time.sleep(delay)
+                      retry_delay = backoff_delay(attempt, delay)
+                      logging.info(f"Retrying Gemini API call in {retry_delay:.1f} seconds...")
+                      _wait_before_retry(retry_delay, 'no_text')
                       continue # Go to the next attempt
 
+            _record_token_usage(response)
+            if cache_key is not None:
+                _response_cache.set(cache_key, response_text)
+            increment('gemini_requests_total', status='ok')
+            return response_text
 
         except Exception as e:
-            logging.error(f"Error calling Gemini API (Attempt {attempt + 1}/{max_retries}): {e}")
+            error_kind = classify_error(e)
+            logging.error(f"Error calling Gemini API (Attempt {attempt + 1}/{max_retries}, {error_kind}): {e}")
+            if error_kind == 'transient':
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if error_kind == 'permanent':
+                logging.error("Gemini API error is not retryable.")
+                increment('gemini_requests_total', status='failed')
+                return None
             if attempt < max_retries - 1:
-                logging.info(f"Retrying in {delay} seconds...")
-                time.sleep(delay)
+                retry_delay = backoff_delay(attempt, delay, error_kind)
+                logging.info(f"Retrying in {retry_delay:.1f} seconds...")
+                _wait_before_retry(retry_delay, error_kind)
             else:
                 logging.error("Max retries reached for Gemini API call.")
+                increment('gemini_requests_total', status='failed')
                 return None # Return None after all retries fail
 
     return None # Should not be reached if retries work or fail
 
 
+def _parse_json_response(gemini_raw_response, expected_type=dict):
+    """Parses a structured-output reply. Raises ValueError if it is not JSON of expected_type."""
+    parsed = json.loads(gemini_raw_response)
+    if not isinstance(parsed, expected_type):
+        raise ValueError(f"expected a JSON {'object' if expected_type is dict else 'array'}")
+    return parsed
+
+
+def reask_fields(fields, source_label, source_text):
+    """
+    Asks Gemini again for just the given fields, with the same source text, instead
+    of repeating the whole request. Returns {field: cleaned value} for the fields it
+    could fill with a valid value ({} on failure).
+    """
+    logging.info(f"  Asking Gemini again for {len(fields)} missing or malformed fields: {', '.join(fields)}")
+    increment('gemini_reasks_total')
+    generation_config = json_generation_config(reask_response_schema(fields))
+    prompt = f"{REASK_PROMPT.format(fields=reask_field_list(fields))}\n\n{source_label}:\n{source_text}"
+    gemini_raw_response = call_gemini_api(prompt, generation_config=generation_config)
+    if not gemini_raw_response:
+        return {}
+    try:
+        answer = _parse_json_response(gemini_raw_response)
+    except ValueError as e:
+        logging.warning(f"  Gemini re-ask response was not a valid JSON object: {e}")
+        _discard_cached_response(prompt, generation_config)
+        return {}
+    cleaned, still_invalid = validate_fields({field: answer.get(field) for field in fields})
+    if still_invalid:
+        logging.warning(f"  Fields still missing or malformed after re-ask: {', '.join(still_invalid)}")
+    return cleaned
+
+
 def process_document_with_gemini(ocr_text: str, initial_extraction_prompt: str):
     """
     Uses Gemini to classify a document and extract initial data.
-    Expects Gemini to return a JSON string.
+    The reply is constrained to EXTRACTION_RESPONSE_SCHEMA and validated against the
+    schema of the identified document type; required fields that are missing or
+    malformed are asked for again in a small follow-up request.
     """
     logging.info("  Sending text to Gemini for initial processing (classification + extraction)...")
-    # Ensure the prompt and text fit within the model's context window
-    # Gemini 1.5 Flash has a 1M token window, which is huge, so this is usually fine.
-    prompt = f"{initial_extraction_prompt}\n\nDocument Text:\n{ocr_text}"
-    gemini_raw_response = call_gemini_api(prompt)
+    # The OCR text is compacted and cut to the per-call token budget if needed
+    document_text = compact_ocr_text(ocr_text) if _prompt_options['compact'] else ocr_text
+    prompt, document_text = prepare_prompt(initial_extraction_prompt, "Document Text", document_text,
+                                           raw_body=ocr_text if _prompt_options['compact'] else None, truncatable=True)
+    generation_config = json_generation_config(EXTRACTION_RESPONSE_SCHEMA)
+    gemini_raw_response = call_gemini_api(prompt, generation_config=generation_config)
 
     if not gemini_raw_response:
         logging.warning("  Gemini initial processing returned empty or invalid response.")
         return None
 
-    # Try to parse the response as JSON
     try:
-        # Gemini might include markdown ```json ... ```
-        # Need to strip it
-        cleaned_response = gemini_raw_response.strip()
-        if cleaned_response.startswith('```json'):
-            cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith('```'):
-                 cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip() # Strip whitespace after removing markdown
-
-        extracted_data = json.loads(cleaned_response)
-        return extracted_data
-    except json.JSONDecodeError as e:
-        logging.error(f"  Gemini initial processing response was not valid JSON: {e}")
+        extracted_data, reask = validate_extraction(_parse_json_response(gemini_raw_response))
+        if extracted_data is None:
+            raise ValueError("expected 'document_type' and a 'data' object")
+    except ValueError as e:
+        logging.error(f"  Gemini initial processing response did not match the extraction schema: {e}")
+        _discard_cached_response(prompt, generation_config)
         logging.error(f"  Raw Gemini response: {gemini_raw_response}") # Log original raw response
         return None
-    except Exception as e:
-        logging.error(f"  An unexpected error occurred processing Gemini's initial response: {e}")
-        logging.error(f"  Raw Gemini response: {gemini_raw_response}")
-        return None
+
+    if reask:
+        # Same (compacted, possibly truncated) text the first request had
+        extracted_data['data'].update(reask_fields(reask, "Document Text", document_text))
+    return extracted_data
 
 
 def consolidate_data_with_gemini(list_of_extracted_data: list, consolidation_prompt: str):
@@ -134,41 +358,141 @@ def consolidate_data_with_gemini(list_of_extracted_data: list, consolidation_pro
     Uses Gemini to consolidate data from multiple documents.
     Expects list_of_extracted_data to be a list of dictionaries,
     each ideally having {'doc_path': '...', 'extracted': {'document_type': '...', 'data': {...}}}.
-    Expects Gemini to return a single JSON string representing the consolidated profile.
+    The reply is constrained to PROFILE_RESPONSE_SCHEMA; malformed fields are asked
+    for again in a small follow-up request.
     """
     logging.info("  Sending extracted data to Gemini for consolidation...")
 
     # Prepare the data to send to Gemini
     # Send the list of initial extraction results as a JSON string
     data_for_gemini = json.dumps(list_of_extracted_data, indent=2)
-
-    # Ensure the prompt and data fit within the model's context window
-    # Again, 1M token window is large, usually not an issue unless you have very long documents/many documents.
-    prompt = f"{consolidation_prompt}\n\nExtracted Data from Documents:\n{data_for_gemini}"
-    gemini_raw_response = call_gemini_api(prompt)
+    if _prompt_options['compact']:
+        # Compact JSON without file paths or empty values
+        source_data = compact_json(extraction_results_for_prompt(list_of_extracted_data))
+    else:
+        source_data = data_for_gemini
+    prompt, _ = prepare_prompt(consolidation_prompt, "Extracted Data from Documents", source_data,
+                               raw_body=data_for_gemini if _prompt_options['compact'] else None)
+    generation_config = json_generation_config(PROFILE_RESPONSE_SCHEMA)
+    gemini_raw_response = call_gemini_api(prompt, generation_config=generation_config)
 
     if not gemini_raw_response:
         logging.warning("  Gemini consolidation returned empty or invalid response.")
         return None
 
-    # Try to parse the consolidated response as JSON
     try:
-        # Strip markdown ```json ... ```
-        cleaned_response = gemini_raw_response.strip()
-        if cleaned_response.startswith('```json'):
-            cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith('```'):
-                 cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip() # Strip whitespace after removing markdown
-
-
-        consolidated_data = json.loads(cleaned_response)
-        return consolidated_data
-    except json.JSONDecodeError as e:
-        logging.error(f"  Gemini consolidation response was not valid JSON: {e}")
+        consolidated_data, reask = validate_fields(_parse_json_response(gemini_raw_response))
+    except ValueError as e:
+        logging.error(f"  Gemini consolidation response was not a valid JSON object: {e}")
+        _discard_cached_response(prompt, generation_config)
         logging.error(f"  Raw Gemini response: {gemini_raw_response}") # Log original raw response
         return None
-    except Exception as e:
-        logging.error(f"  An unexpected error occurred processing Gemini's consolidation response: {e}")
+
+    if reask:
+        consolidated_data.update(reask_fields(reask, "Extracted Data from Documents", source_data))
+    return consolidated_data
+
+def resolve_conflicts_with_gemini(conflicts: dict, conflict_prompt: str):
+    """
+    Asks Gemini to choose a value for each conflicting profile field.
+    conflicts maps field name -> list of {'document_type': ..., 'value': ...} candidates.
+    Returns a dict of field -> chosen value, or None on failure. Chosen values that
+    are malformed are left out, so the caller falls back to its own choice.
+    """
+    logging.info(f"  Sending {len(conflicts)} conflicting fields to Gemini for resolution...")
+
+    # Compact JSON: only the conflicting fields are sent, not the full extraction results
+    prompt, _ = prepare_prompt(conflict_prompt, "Conflicting Fields", json.dumps(conflicts, separators=(',', ':')))
+    generation_config = json_generation_config(reask_response_schema(list(conflicts)))
+    gemini_raw_response = call_gemini_api(prompt, generation_config=generation_config)
+
+    if not gemini_raw_response:
+        logging.warning("  Gemini conflict resolution returned empty or invalid response.")
+        return None
+
+    try:
+        answer = _parse_json_response(gemini_raw_response)
+    except ValueError as e:
+        logging.error(f"  Gemini conflict resolution response was not a valid JSON object: {e}")
+        _discard_cached_response(prompt, generation_config)
         logging.error(f"  Raw Gemini response: {gemini_raw_response}")
-        return None
\ No newline at end of file
+        return None
+
+    resolved, invalid = validate_fields({field: answer.get(field) for field in conflicts})
+    if invalid:
+        logging.warning(f"  Gemini conflict resolution chose malformed values for: {', '.join(invalid)}")
+    return resolved
+
+
+def process_documents_with_gemini(ocr_texts: list, batch_extraction_prompt: str, profile_prompt=None):
+    """
+    Uses Gemini to classify and extract several documents in one request. The
+    documents are numbered from 1 and delimited in the prompt; Gemini is expected to
+    return a JSON array with one {"document": n, "document_type": ..., "data": {...}}
+    object per document. With profile_prompt, it is also asked to append
+    {"consolidated_profile": {...}} built from all documents. The reply is
+    constrained to BATCH_EXTRACTION_RESPONSE_SCHEMA and validated like the
+    per-document path: missing or malformed fields are asked for again, per document.
+
+    Returns (list of {'document_type', 'data'} in input order, consolidated profile or None),
+    or (None, None) if the request failed, would exceed the token budget or the
+    response does not cover every document; callers then fall back to per-document calls.
+    """
+    logging.info(f"  Sending text of {len(ocr_texts)} documents to Gemini in one extraction request...")
+    if _prompt_options['compact']:
+        ocr_texts = [compact_ocr_text(ocr_text) for ocr_text in ocr_texts]
+    documents_text = "\n\n".join(f"<<<DOCUMENT {number}>>>\n{ocr_text}\n<<<END DOCUMENT {number}>>>"
+                                 for number, ocr_text in enumerate(ocr_texts, 1))
+    instruction = f"{batch_extraction_prompt}\n\n{profile_prompt}" if profile_prompt else batch_extraction_prompt
+    prompt = f"{instruction}\n\nDocuments:\n{documents_text}"
+
+    budget = _prompt_options['token_budget']
+    if budget and estimate_tokens(prompt) > budget:
+        logging.info(f"  Combined documents exceed the {budget} token budget; extracting them one by one.")
+        return None, None
+
+    generation_config = json_generation_config(BATCH_EXTRACTION_RESPONSE_SCHEMA)
+    gemini_raw_response = call_gemini_api(prompt, generation_config=generation_config)
+    if not gemini_raw_response:
+        logging.warning("  Gemini batched extraction returned empty or invalid response.")
+        return None, None
+
+    try:
+        items = _parse_json_response(gemini_raw_response, expected_type=list)
+
+        documents = {}
+        reasks = {}
+        profile = None
+        profile_reask = []
+        for item in items:
+            if not isinstance(item, dict):
+                raise ValueError("expected an object per document")
+            if item.get('document') is None and 'consolidated_profile' in item:
+                if isinstance(item['consolidated_profile'], dict):
+                    profile, profile_reask = validate_fields(item['consolidated_profile'])
+                continue
+            number = item.get('document')
+            if not isinstance(number, int) or not 1 <= number <= len(ocr_texts) or number in documents:
+                raise ValueError(f"unexpected document number {number!r}")
+            document_output, reasks[number] = validate_extraction({'document_type': item.get('document_type'), 'data': item.get('data')})
+            if document_output is None:
+                raise ValueError(f"document {number} has no 'document_type' or 'data' object")
+            documents[number] = document_output
+
+        if len(documents) != len(ocr_texts):
+            missing = sorted(set(range(1, len(ocr_texts) + 1)) - set(documents))
+            raise ValueError(f"no result for documents {missing}")
+    except ValueError as e:
+        logging.error(f"  Gemini batched extraction response could not be split into per-document results: {e}")
+        _discard_cached_response(prompt, generation_config)
+        logging.error(f"  Raw Gemini response: {gemini_raw_response}")
+        return None, None
+
+    # Re-asks use the text of the one document concerned, not the whole batch
+    for number, reask in reasks.items():
+        if reask:
+            documents[number]['data'].update(reask_fields(reask, "Document Text", ocr_texts[number - 1]))
+    document_outputs = [documents[number] for number in range(1, len(ocr_texts) + 1)]
+    if profile_reask:
+        profile.update(reask_fields(profile_reask, "Extracted Data from Documents", compact_json(document_outputs)))
+    return document_outputs, profile
@@ -0,0 +1,80 @@
+from PIL import Image, ImageOps
+
+# Skew angles (degrees) tried when straightening a page
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+
+# Longest side of the thumbnail used to estimate skew
+DESKEW_THUMBNAIL_SIZE = 600
+
+
+def otsu_threshold(gray_image: Image.Image):
+    """Returns the Otsu threshold (0-255) that best separates ink from paper in a grayscale image."""
+    histogram = gray_image.histogram()[:256]
+    total = sum(histogram)
+    if not total:
+        return 128
+
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    sum_background = 0
+    weight_background = 0
+    best_threshold, best_variance = 128, -1.0
+
+    for level, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += level * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+
+    return best_threshold
+
+
+def binarize(gray_image: Image.Image):
+    """Converts a grayscale image to pure black text on white using Otsu's threshold."""
+    threshold = otsu_threshold(gray_image)
+    return gray_image.point(lambda value: 255 if value > threshold else 0)
+
+
+def _row_profile_score(inverted_image: Image.Image):
+    """Sharpness of the horizontal projection profile; highest when text lines are level."""
+    # Resizing to one pixel wide averages each row, which is much faster than summing in Python
+    rows = list(inverted_image.resize((1, inverted_image.height), Image.BOX).getdata())
+    return sum((rows[i + 1] - rows[i]) ** 2 for i in range(len(rows) - 1))
+
+
+def estimate_skew(binary_image: Image.Image, max_angle=DESKEW_MAX_ANGLE, step=DESKEW_STEP):
+    """Estimates the small rotation (degrees) that makes text lines horizontal."""
+    thumbnail = binary_image.copy()
+    thumbnail.thumbnail((DESKEW_THUMBNAIL_SIZE, DESKEW_THUMBNAIL_SIZE))
+    inverted = ImageOps.invert(thumbnail)  # Text becomes bright, so rows with text score high
+
+    best_angle, best_score = 0.0, -1
+    steps = int(max_angle / step)
+    for i in range(-steps, steps + 1):
+        angle = i * step
+        score = _row_profile_score(inverted.rotate(angle, resample=Image.NEAREST, fillcolor=0))
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def deskew(binary_image: Image.Image):
+    """Rotates a binarized page so its text lines are horizontal."""
+    angle = estimate_skew(binary_image)
+    if not angle:
+        return binary_image
+    return binary_image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+
+def preprocess_for_ocr(image: Image.Image):
+    """Cheap clean-up before Tesseract: grayscale, binarization and deskew."""
+    gray = image.convert('L')
+    return deskew(binarize(gray))
@@ -0,0 +1,162 @@
+import time
+import queue
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from src.metrics import SpanCollector, span, increment
+from src.utils import percentile
+
+# Job queue of the worker service (service.py). Jobs wait in a bounded queue and are
+# run one at a time per worker thread by a run_job(job) callable, which returns an
+# applicant record (see src/applicant.py). Finished jobs are kept in memory, oldest
+# dropped first, so their status and profile can be fetched.
+
+DEFAULT_MAX_QUEUE = 100
+DEFAULT_JOB_WORKERS = 2
+
+# Finished jobs kept for status and profile requests
+MAX_FINISHED_JOBS = 1000
+
+# Fields of a job returned by status requests; the profile is fetched separately
+SUMMARY_FIELDS = ('job_id', 'status', 'applicant_id', 'documents', 'form', 'submitted', 'queued_seconds',
+                  'run_seconds', 'documents_extracted', 'form_filled', 'form_fields', 'error', 'metrics')
+
+
+class QueueFullError(RuntimeError):
+    """Raised by JobService.submit() when the job queue is at capacity."""
+
+
+class JobService:
+    """
+    Runs jobs from a bounded queue on `workers` threads.
+
+        service = JobService(run_job, max_queue=100, workers=2)
+        job = service.submit(['aadhaar.pdf', 'pan.pdf'], form='local_test_form')
+        service.get(job['job_id'])['status']  # 'queued', 'running', 'done' or 'failed'
+        service.close()
+    """
+
+    def __init__(self, run_job, max_queue=DEFAULT_MAX_QUEUE, workers=DEFAULT_JOB_WORKERS, max_finished=MAX_FINISHED_JOBS):
+        self._run_job = run_job
+        self.max_queue = max_queue
+        self.max_finished = max_finished
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._rejected = 0
+        self._workers = [threading.Thread(target=self._work, name=f'job_worker_{index}', daemon=True)
+                         for index in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, documents, form=None, applicant_id=None):
+        """Queues a job and returns its summary. Raises QueueFullError if the queue is full."""
+        job_id = secrets.token_hex(8)
+        job = {
+            'job_id': job_id,
+            'status': 'queued',
+            'applicant_id': applicant_id or job_id,
+            'documents': list(documents),
+            'form': form,
+            'submitted': datetime.now().isoformat(timespec='seconds'),
+            '_queued_at': time.perf_counter(),
+        }
+        with self._lock:
+            try:
+                self._queue.put_nowait(job_id)
+            except queue.Full:
+                self._rejected += 1
+                increment('service_jobs_rejected_total')
+                raise QueueFullError(f"Job queue is full ({self.max_queue} jobs waiting).") from None
+            self._jobs[job_id] = job
+            self._submitted += 1
+            summary = self._summary(job)
+        increment('service_jobs_submitted_total')
+        logging.info(f"Job {job_id} queued: {len(job['documents'])} documents, form {form or '-'}.")
+        return summary
+
+    def _summary(self, job):
+        return {field: job[field] for field in SUMMARY_FIELDS if field in job}
+
+    def get(self, job_id):
+        """Returns the summary of a job, or None if it is unknown (or was dropped)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._summary(job) if job is not None else None
+
+    def get_profile(self, job_id):
+        """Returns (status, consolidated profile or None) of a job, or (None, None) if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None, None
+            return job['status'], job.get('profile')
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                job['status'] = 'running'
+                job['queued_seconds'] = round(time.perf_counter() - job['_queued_at'], 3)
+            self._run(job)
+
+    def _run(self, job):
+        start_time = time.perf_counter()
+        try:
+            with SpanCollector() as collector, span('service.job', job_id=job['job_id']):
+                record = self._run_job(job)
+        except Exception as e:
+            logging.error(f"Job {job['job_id']} failed: {e}")
+            record = {'status': 'error', 'error': str(e)}
+
+        with self._lock:
+            job['status'] = 'done' if record.get('status') == 'ok' else 'failed'
+            job['run_seconds'] = round(time.perf_counter() - start_time, 3)
+            job['metrics'] = collector.totals()
+            for field in ('profile', 'documents_extracted', 'form_filled', 'form_fields', 'error'):
+                if field in record:
+                    job[field] = record[field]
+            self._drop_finished_jobs()
+        increment('service_jobs_total', status=job['status'])
+        logging.info(f"Job {job['job_id']}: {job['status']} in {job['run_seconds']:.2f}s "
+                     f"(queued {job['queued_seconds']:.2f}s).")
+
+    def _drop_finished_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] in ('done', 'failed')]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        """Returns queue, job count and latency statistics."""
+        with self._lock:
+            statuses = {}
+            latencies = []
+            for job in self._jobs.values():
+                statuses[job['status']] = statuses.get(job['status'], 0) + 1
+                if 'run_seconds' in job:
+                    latencies.append(job['queued_seconds'] + job['run_seconds'])
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'workers': len(self._workers),
+                'submitted': self._submitted,
+                'rejected': self._rejected,
+                'jobs': statuses,
+                'latency_p50_seconds': round(percentile(latencies, 0.5), 3),
+                'latency_p95_seconds': round(percentile(latencies, 0.95), 3),
+            }
+
+    def close(self):
+        """Stops the workers after the jobs already queued have run."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
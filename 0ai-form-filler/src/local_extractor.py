@@ -0,0 +1,242 @@
+import re
+import logging
+import threading
+from datetime import datetime
+
+# Document type names match the ones Gemini is asked to use in gemini_prompts.yaml
+PAN_DOCUMENT = 'PAN'
+AADHAAR_DOCUMENT = 'Aadhaar'
+PASSBOOK_DOCUMENT = 'Bank Passbook'
+
+# Fields that must be found for a local result to be trusted; otherwise Gemini is used
+REQUIRED_FIELDS = {
+    PAN_DOCUMENT: ('pan_number', 'full_name', 'date_of_birth'),
+    AADHAAR_DOCUMENT: ('aadhaar_number', 'full_name', 'date_of_birth'),
+    PASSBOOK_DOCUMENT: ('account_number', 'ifsc_code', 'full_name'),
+}
+
+PAN_PATTERN = re.compile(r'\b([A-Z]{5}[0-9]{4}[A-Z])\b')
+AADHAAR_PATTERN = re.compile(r'(?<!\d)([2-9]\d{3})[ -]?(\d{4})[ -]?(\d{4})(?!\d)')
+IFSC_PATTERN = re.compile(r'\b([A-Z]{4}0[A-Z0-9]{6})\b')
+DATE_PATTERN = re.compile(r'\b(\d{2})[/-](\d{2})[/-](\d{4})\b')
+ACCOUNT_PATTERN = re.compile(r'(?:A/?C|Account)\s*(?:No\.?|Number)?\s*[:.\-]?\s*(\d{9,18})\b', re.IGNORECASE)
+GENDER_PATTERN = re.compile(r'\b(MALE|FEMALE|TRANSGENDER)\b', re.IGNORECASE)
+NAME_LABEL_PATTERN = re.compile(r"^\s*(?:Name|Account Holder(?:'s)? Name|Customer Name)\s*[:/]?\s*(.*)$", re.IGNORECASE)
+FATHER_LABEL_PATTERN = re.compile(r"^\s*Father'?s?\s*Name\s*[:/]?\s*(.*)$", re.IGNORECASE)
+BANK_NAME_PATTERN = re.compile(r'\b([A-Z][A-Za-z&.]*(?:\s+[A-Z][A-Za-z&.]*){0,4}\s+BANK(?:\s+(?:OF|LTD\.?|LIMITED)(?:\s+[A-Z]+)?)?)\b', re.IGNORECASE)
+
+PAN_KEYWORDS = ('INCOME TAX DEPARTMENT', 'PERMANENT ACCOUNT NUMBER')
+AADHAAR_KEYWORDS = ('AADHAAR', 'UNIQUE IDENTIFICATION', 'UIDAI', 'ENROLMENT NO')
+PASSBOOK_KEYWORDS = ('PASSBOOK', 'IFSC', 'ACCOUNT NO', 'A/C NO', 'BRANCH')
+
+# Lines containing any of these words are labels or headers, never a person's name
+_NOT_NAME_WORDS = {'GOVERNMENT', 'GOVT', 'INDIA', 'INCOME', 'TAX', 'DEPARTMENT', 'PERMANENT', 'ACCOUNT',
+                   'AADHAAR', 'UNIQUE', 'AUTHORITY', 'SIGNATURE', 'DOB', 'BIRTH', 'MALE', 'FEMALE',
+                   'ADDRESS', 'BANK', 'BRANCH', 'IFSC', 'PAGE', 'CARD', 'NAME', 'FATHER', "FATHER'S"}
+
+# Verhoeff checksum tables used to validate Aadhaar numbers
+_VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 2, 3, 4, 0, 6, 7, 8, 9, 5), (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7), (4, 0, 1, 2, 3, 9, 5, 6, 7, 8), (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2), (7, 6, 5, 9, 8, 2, 1, 0, 4, 3), (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+_VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 5, 7, 6, 2, 8, 3, 0, 9, 4), (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7), (9, 4, 5, 3, 1, 2, 6, 8, 7, 0), (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5), (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+
+# Counts of documents handled locally vs. sent to Gemini in this process
+_stats_lock = threading.Lock()
+_stats = {'local': 0, 'fallback': 0}
+
+
+def verhoeff_valid(number: str):
+    """Returns True if a digit string passes the Verhoeff checksum used by Aadhaar."""
+    checksum = 0
+    for i, digit in enumerate(reversed(number)):
+        checksum = _VERHOEFF_D[checksum][_VERHOEFF_P[i % 8][int(digit)]]
+    return checksum == 0
+
+
+def normalize_date(day, month, year):
+    """Returns YYYY-MM-DD for a valid calendar date, else None."""
+    try:
+        return datetime(int(year), int(month), int(day)).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def _unique(values):
+    return list(dict.fromkeys(values))
+
+
+def _clean_name(line):
+    """Returns the line as a name if it looks like one (letters and spaces only), else None."""
+    candidate = re.sub(r'\s+', ' ', line).strip(' :.-')
+    if not candidate or not re.fullmatch(r"[A-Za-z][A-Za-z .']{1,60}", candidate):
+        return None
+    if _NOT_NAME_WORDS.intersection(candidate.upper().replace('.', ' ').split()):
+        return None
+    if len(candidate.split()) > 5:
+        return None
+    return candidate
+
+
+def _value_after_label(lines, label_pattern):
+    """Finds a labelled value either on the same line as the label or on the next line."""
+    for i, line in enumerate(lines):
+        match = label_pattern.match(line)
+        if not match:
+            continue
+        inline_value = _clean_name(match.group(1))
+        if inline_value:
+            return inline_value
+        for next_line in lines[i + 1:i + 3]:
+            value = _clean_name(next_line)
+            if value:
+                return value
+    return None
+
+
+def _find_dates(text):
+    return _unique(date for date in (normalize_date(*match) for match in DATE_PATTERN.findall(text)) if date)
+
+
+def classify_document(text: str):
+    """Returns the document type recognised from keywords and identifiers, or None if unclear."""
+    upper_text = text.upper()
+    candidates = []
+
+    if PAN_PATTERN.search(text) and any(keyword in upper_text for keyword in PAN_KEYWORDS):
+        candidates.append(PAN_DOCUMENT)
+    if any(keyword in upper_text for keyword in AADHAAR_KEYWORDS) and _find_aadhaar_numbers(text):
+        candidates.append(AADHAAR_DOCUMENT)
+    if IFSC_PATTERN.search(text) and any(keyword in upper_text for keyword in PASSBOOK_KEYWORDS):
+        candidates.append(PASSBOOK_DOCUMENT)
+
+    # Several matching types (e.g. a passbook page quoting a PAN) is ambiguous; let Gemini decide
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def _find_aadhaar_numbers(text):
+    numbers = (''.join(groups) for groups in AADHAAR_PATTERN.findall(text))
+    return _unique(number for number in numbers if verhoeff_valid(number))
+
+
+def _extract_pan(text, lines):
+    data = {}
+    pan_numbers = _unique(PAN_PATTERN.findall(text))
+    if len(pan_numbers) == 1:
+        data['pan_number'] = pan_numbers[0]
+
+    name = _value_after_label(lines, NAME_LABEL_PATTERN)
+    father_name = _value_after_label(lines, FATHER_LABEL_PATTERN)
+    if not name:
+        # Older PAN cards: name and father's name are the first two name-like lines after the header
+        header_index = next((i for i, line in enumerate(lines) if 'INCOME TAX' in line.upper()), None)
+        if header_index is not None:
+            names = [value for value in (_clean_name(line) for line in lines[header_index + 1:]) if value]
+            if names:
+                name = names[0]
+                father_name = father_name or (names[1] if len(names) > 1 else None)
+    if name:
+        data['full_name'] = name
+    if father_name:
+        data['father_name'] = father_name
+
+    dates = _find_dates(text)
+    if len(dates) == 1:
+        data['date_of_birth'] = dates[0]
+    return data
+
+
+def _extract_aadhaar(text, lines):
+    data = {}
+    numbers = _find_aadhaar_numbers(text)
+    if len(numbers) == 1:
+        number = numbers[0]
+        data['aadhaar_number'] = f"{number[:4]} {number[4:8]} {number[8:]}"
+
+    # The DOB line sits directly below the holder's name on the front of the card
+    for i, line in enumerate(lines):
+        if DATE_PATTERN.search(line) and re.search(r'DOB|Birth|YOB', line, re.IGNORECASE):
+            date = normalize_date(*DATE_PATTERN.search(line).groups())
+            if date:
+                data['date_of_birth'] = date
+            for previous_line in reversed(lines[max(0, i - 2):i]):
+                name = _clean_name(previous_line)
+                if name:
+                    data['full_name'] = name
+                    break
+            break
+
+    gender = _unique(match.upper() for match in GENDER_PATTERN.findall(text))
+    if len(gender) == 1:
+        data['gender'] = gender[0].title()
+    return data
+
+
+def _extract_passbook(text, lines):
+    data = {}
+    ifsc_codes = _unique(IFSC_PATTERN.findall(text))
+    if len(ifsc_codes) == 1:
+        data['ifsc_code'] = ifsc_codes[0]
+
+    account_numbers = _unique(ACCOUNT_PATTERN.findall(text))
+    if len(account_numbers) == 1:
+        data['account_number'] = account_numbers[0]
+
+    name = _value_after_label(lines, NAME_LABEL_PATTERN)
+    if name:
+        data['full_name'] = name
+
+    bank_match = BANK_NAME_PATTERN.search(text)
+    if bank_match:
+        data['bank_name'] = re.sub(r'\s+', ' ', bank_match.group(1)).strip()
+    return data
+
+
+_EXTRACTORS = {
+    PAN_DOCUMENT: _extract_pan,
+    AADHAAR_DOCUMENT: _extract_aadhaar,
+    PASSBOOK_DOCUMENT: _extract_passbook,
+}
+
+
+def extract_locally(ocr_text: str):
+    """
+    Classifies and extracts a known document type with regexes and layout heuristics.
+
+    Returns:
+        dict: {'document_type': ..., 'data': {...}} in the same shape as Gemini's output,
+              or None if the type is unknown or a required field is missing/ambiguous,
+              in which case the caller should fall back to Gemini.
+    """
+    document_type = classify_document(ocr_text)
+    if document_type is None:
+        logging.info("  Local extractor could not classify the document confidently.")
+        return None
+
+    lines = [line.strip() for line in ocr_text.splitlines() if line.strip() and not line.startswith('[--- Page')]
+    data = _EXTRACTORS[document_type](ocr_text, lines)
+
+    missing_fields = [field for field in REQUIRED_FIELDS[document_type] if not data.get(field)]
+    if missing_fields:
+        logging.info(f"  Local extractor found a {document_type} document but is missing {missing_fields}.")
+        return None
+
+    return {'document_type': document_type, 'data': data}
+
+
+def record_extraction(local: bool):
+    """Counts a document as handled locally or by the Gemini fallback."""
+    with _stats_lock:
+        _stats['local' if local else 'fallback'] += 1
+
+
+def get_local_extraction_stats():
+    """Returns {'local': n, 'fallback': n}; 'local' is the number of Gemini calls avoided."""
+    with _stats_lock:
+        return dict(_stats)
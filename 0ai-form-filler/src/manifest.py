@@ -0,0 +1,90 @@
+import os
+import csv
+import json
+import logging
+
+
+def _resolve(path, base_dir):
+    """Resolves a document path relative to the manifest's location."""
+    return path if os.path.isabs(path) else os.path.normpath(os.path.join(base_dir, path))
+
+
+def _load_directory_manifest(manifest_dir):
+    """Each sub-directory is one applicant; its PDF files are that applicant's documents."""
+    applicants = []
+    for entry in sorted(os.listdir(manifest_dir)):
+        applicant_dir = os.path.join(manifest_dir, entry)
+        if not os.path.isdir(applicant_dir):
+            continue
+        documents = [os.path.join(applicant_dir, filename) for filename in sorted(os.listdir(applicant_dir))
+                     if filename.lower().endswith('.pdf')]
+        if documents:
+            applicants.append({'applicant_id': entry, 'documents': documents})
+        else:
+            logging.warning(f"No PDF documents found for applicant folder: {applicant_dir}")
+    return applicants
+
+
+def _load_csv_manifest(manifest_path):
+    """
+    CSV with an 'applicant_id' column and either a 'document' column (one row per
+    document) or a 'documents' column (semicolon-separated paths).
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    applicants = {}
+    with open(manifest_path, newline='') as f:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames or 'applicant_id' not in reader.fieldnames:
+            raise ValueError(f"CSV manifest {manifest_path} must have an 'applicant_id' column.")
+
+        for row in reader:
+            applicant_id = (row.get('applicant_id') or '').strip()
+            paths = (row.get('documents') or row.get('document') or '').split(';')
+            paths = [path.strip() for path in paths if path.strip()]
+            if not applicant_id or not paths:
+                logging.warning(f"Skipping incomplete manifest row: {row}")
+                continue
+            documents = applicants.setdefault(applicant_id, [])
+            documents.extend(_resolve(path, base_dir) for path in paths)
+
+    return [{'applicant_id': applicant_id, 'documents': documents} for applicant_id, documents in applicants.items()]
+
+
+def _load_jsonl_manifest(manifest_path):
+    """JSON Lines with one {"applicant_id": ..., "documents": [...]} object per line."""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    applicants = []
+    with open(manifest_path) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                applicant_id = str(entry['applicant_id'])
+                documents = [_resolve(path, base_dir) for path in entry['documents']]
+            except (ValueError, KeyError, TypeError) as e:
+                logging.warning(f"Skipping invalid manifest line {line_number}: {e}")
+                continue
+            applicants.append({'applicant_id': applicant_id, 'documents': documents})
+    return applicants
+
+
+def load_manifest(manifest_path):
+    """
+    Loads a batch manifest: a directory of per-applicant folders, a .csv file or
+    a .jsonl file.
+
+    Returns:
+        list: [{'applicant_id': str, 'documents': [paths]}, ...] in manifest order.
+    """
+    if os.path.isdir(manifest_path):
+        return _load_directory_manifest(manifest_path)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Manifest not found: {manifest_path}")
+
+    extension = os.path.splitext(manifest_path)[1].lower()
+    if extension == '.csv':
+        return _load_csv_manifest(manifest_path)
+    if extension in ('.jsonl', '.ndjson'):
+        return _load_jsonl_manifest(manifest_path)
+    raise ValueError(f"Unsupported manifest format '{extension}'. Use a directory, .csv or .jsonl file.")
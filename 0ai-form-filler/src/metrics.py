@@ -0,0 +1,247 @@
+import sys
+import json
+import time
+import logging
+import threading
+import itertools
+import contextvars
+
+# In-process instrumentation: nested timing spans and counters, exported as JSON
+# or Prometheus text format at the end of a run. Recording is cheap (a lock and a
+# list append), so it is always on; nothing is written unless an export is asked for.
+
+# Finished spans beyond this many are only counted in the per-name totals
+MAX_RECORDED_SPANS = 50000
+
+# Prefix of every exported Prometheus metric
+PROMETHEUS_PREFIX = 'form_filler'
+
+_lock = threading.Lock()
+_span_ids = itertools.count(1)
+_current_span = contextvars.ContextVar('current_span', default=None)
+_current_collector = contextvars.ContextVar('span_collector', default=None)
+_run_start = time.perf_counter()
+_spans = []
+_span_totals = {}
+_counters = {}
+
+# cProfile state; None unless enable_profiling() was called
+_main_profiler = None
+_task_profilers = None
+
+# Before Python 3.12 a cProfile.Profile only sees the thread that enabled it, so each
+# propagate() task gets its own profiler. From 3.12 profilers are built on
+# sys.monitoring: one profiler sees every thread, and a second one cannot be enabled
+# while it runs.
+PER_TASK_PROFILERS = sys.version_info < (3, 12)
+
+
+class span:
+    """
+    Context manager timing a block of work. Spans opened inside another span (in
+    the same thread, or in a task submitted with propagate()) record it as parent.
+
+        with span('gemini.attempt', attempt=1):
+            ...
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = {key: str(value) for key, value in labels.items()}
+        self.span_id = None
+        self.parent_id = None
+        self.seconds = None
+
+    def __enter__(self):
+        self.span_id = next(_span_ids)
+        self.parent_id = _current_span.get()
+        self._token = _current_span.set(self.span_id)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        _current_span.reset(self._token)
+        self.seconds = end - self._start
+        record = {
+            'id': self.span_id,
+            'parent': self.parent_id,
+            'name': self.name,
+            'labels': self.labels,
+            'start': round(self._start - _run_start, 6),
+            'seconds': round(self.seconds, 6),
+            'thread': threading.current_thread().name,
+        }
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        collector = _current_collector.get()
+        if collector is not None:
+            collector.add(self.name, self.seconds)
+        with _lock:
+            if len(_spans) < MAX_RECORDED_SPANS:
+                _spans.append(record)
+            totals = _span_totals.setdefault(self.name, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            totals['count'] += 1
+            totals['seconds'] += self.seconds
+            totals['max_seconds'] = max(totals['max_seconds'], self.seconds)
+        return False
+
+
+class SpanCollector:
+    """
+    Context manager collecting per-name span totals of one unit of work (e.g. a
+    service job), including spans of tasks it submits with propagate(). Spans are
+    still recorded globally as well.
+
+        with SpanCollector() as collector:
+            process_applicant(...)
+        collector.totals()  # {'ocr.document': {'count': 3, 'seconds': 4.2}, ...}
+    """
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._token = _current_collector.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current_collector.reset(self._token)
+        return False
+
+    def add(self, name, seconds):
+        with self._lock:
+            totals = self._totals.setdefault(name, {'count': 0, 'seconds': 0.0})
+            totals['count'] += 1
+            totals['seconds'] += seconds
+
+    def totals(self):
+        with self._lock:
+            return {name: {'count': totals['count'], 'seconds': round(totals['seconds'], 6)}
+                    for name, totals in sorted(self._totals.items())}
+
+
+def increment(name, value=1, **labels):
+    """Adds value to the counter identified by name and labels."""
+    key = (name, tuple(sorted((label, str(label_value)) for label, label_value in labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def propagate(function):
+    """
+    Wraps a function submitted to a thread pool so spans it opens are nested under
+    the span active at submission time, and so it is profiled when --profile is on.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        if _task_profilers is None or not PER_TASK_PROFILERS:
+            return context.run(function, *args, **kwargs)
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            return context.run(profiler.runcall, function, *args, **kwargs)
+        finally:
+            with _lock:
+                _task_profilers.append(profiler)
+
+    return run
+
+
+def snapshot():
+    """Returns all recorded spans, per-span-name totals and counters as a dict."""
+    with _lock:
+        return {
+            'elapsed_seconds': round(time.perf_counter() - _run_start, 6),
+            'span_totals': {name: {'count': totals['count'], 'seconds': round(totals['seconds'], 6),
+                                   'max_seconds': round(totals['max_seconds'], 6)}
+                            for name, totals in sorted(_span_totals.items())},
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                         for (name, labels), value in sorted(_counters.items())],
+            'spans': list(_spans),
+            'spans_dropped': max(0, sum(totals['count'] for totals in _span_totals.values()) - len(_spans)),
+        }
+
+
+def reset():
+    """Clears everything recorded so far (e.g. between benchmark passes)."""
+    global _run_start
+    with _lock:
+        _spans.clear()
+        _span_totals.clear()
+        _counters.clear()
+        _run_start = time.perf_counter()
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ''
+    escaped = (key + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def to_prometheus():
+    """Returns the span totals and counters in Prometheus text exposition format."""
+    data = snapshot()
+    lines = [
+        f"# HELP {PROMETHEUS_PREFIX}_span_seconds Wall time spent in each instrumented span.",
+        f"# TYPE {PROMETHEUS_PREFIX}_span_seconds summary",
+    ]
+    for name, totals in data['span_totals'].items():
+        labels = _prometheus_labels([('span', name)])
+        lines.append(f"{PROMETHEUS_PREFIX}_span_seconds_sum{labels} {totals['seconds']}")
+        lines.append(f"{PROMETHEUS_PREFIX}_span_seconds_count{labels} {totals['count']}")
+
+    counter_names = sorted({counter['name'] for counter in data['counters']})
+    for counter_name in counter_names:
+        metric_name = f"{PROMETHEUS_PREFIX}_{counter_name}"
+        lines.append(f"# TYPE {metric_name} counter")
+        for counter in data['counters']:
+            if counter['name'] == counter_name:
+                lines.append(f"{metric_name}{_prometheus_labels(sorted(counter['labels'].items()))} {counter['value']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_json(path):
+    """Writes snapshot() to a JSON file."""
+    with open(path, 'w') as f:
+        json.dump(snapshot(), f, indent=2)
+    logging.info(f"Metrics written to {path}")
+
+
+def write_prometheus(path):
+    """Writes to_prometheus() to a text file (e.g. for the node_exporter textfile collector)."""
+    with open(path, 'w') as f:
+        f.write(to_prometheus())
+    logging.info(f"Prometheus metrics written to {path}")
+
+
+def enable_profiling():
+    """
+    Starts cProfile for the calling thread and for every task wrapped with propagate()
+    (on Python 3.12 and later, for every thread).
+    """
+    global _main_profiler, _task_profilers
+    import cProfile
+    _task_profilers = []
+    _main_profiler = cProfile.Profile()
+    _main_profiler.enable()
+
+
+def write_profile(path):
+    """Stops profiling and writes the merged statistics of all threads (readable with pstats or snakeviz)."""
+    global _main_profiler, _task_profilers
+    if _main_profiler is None:
+        return
+    import pstats
+    _main_profiler.disable()
+    stats = pstats.Stats(_main_profiler)
+    with _lock:
+        for profiler in _task_profilers:
+            stats.add(profiler)
+    stats.dump_stats(path)
+    _main_profiler, _task_profilers = None, None
+    logging.info(f"Profile written to {path}")
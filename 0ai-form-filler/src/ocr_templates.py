@@ -0,0 +1,151 @@
+import re
+import logging
+from src.utils import load_config
+
+# Region-of-interest OCR templates, loaded from config/ocr_templates.yaml. A template
+# names a document type with a fixed layout, the keywords that identify its pages,
+# and the regions holding its fields. pdf_ocr OCRs a page at low resolution to pick
+# a template, then OCRs only the template's regions, each with its own settings:
+#
+#   {'document_type': 'PAN', 'match': ['INCOME TAX DEPARTMENT', ...], 'header': '...',
+#    'regions': [{'field': 'pan_number', 'label': 'Permanent Account Number',
+#                 'box': [0.03, 0.24, 0.6, 0.36], 'psm': 7, 'whitelist': '...',
+#                 'pattern': '[A-Z]{5}[0-9]{4}[A-Z]', 'required': True}, ...]}
+#
+# Templates are plain data (patterns are kept as strings) so they can be sent to
+# OCR worker processes and used in cache keys.
+
+OCR_TEMPLATES_FILE = 'ocr_templates.yaml'
+
+# Tesseract page segmentation modes that make sense for a cropped region
+REGION_PSM_MODES = (6, 7, 8, 13)
+
+# Page segmentation mode used when a region does not set one (single text line)
+DEFAULT_REGION_PSM = 7
+
+
+def _compile_region(document_type, index, region, problems):
+    """Validates one region entry, appending problems. Returns the normalized region or None."""
+    where = f"{document_type} region {index + 1}"
+    if not isinstance(region, dict):
+        problems.append(f"{where} must be a mapping")
+        return None
+
+    field = region.get('field')
+    if not isinstance(field, str) or not field:
+        problems.append(f"{where} needs a 'field' name")
+        return None
+    where = f"{document_type} region '{field}'"
+
+    box = region.get('box')
+    if (not isinstance(box, list) or len(box) != 4 or not all(isinstance(value, (int, float)) for value in box)
+            or not (0 <= box[0] < box[2] <= 1 and 0 <= box[1] < box[3] <= 1)):
+        problems.append(f"{where}: 'box' must be [left, top, right, bottom] fractions of the page between 0 and 1, got {box!r}")
+        return None
+
+    psm = region.get('psm', DEFAULT_REGION_PSM)
+    if psm not in REGION_PSM_MODES:
+        problems.append(f"{where}: 'psm' must be one of {REGION_PSM_MODES}, got {psm!r}")
+
+    whitelist = region.get('whitelist')
+    if whitelist is not None and (not isinstance(whitelist, str) or not whitelist or ' ' in whitelist):
+        problems.append(f"{where}: 'whitelist' must be a non-empty string without spaces")
+
+    pattern = region.get('pattern')
+    if pattern is not None:
+        try:
+            re.compile(pattern)
+        except (re.error, TypeError) as e:
+            problems.append(f"{where}: invalid 'pattern' {pattern!r}: {e}")
+
+    return {
+        'field': field,
+        'label': region.get('label'),
+        'box': [float(value) for value in box],
+        'psm': psm,
+        'whitelist': whitelist,
+        'pattern': pattern,
+        'required': bool(region.get('required', False)),
+    }
+
+
+def compile_ocr_templates(config):
+    """
+    Validates the templates of config (the parsed YAML) and returns them as a list.
+
+    Raises:
+        ValueError: If a template has no match keywords or regions, or a region has
+                    an invalid box, psm, whitelist or pattern. All problems are
+                    reported in one message.
+    """
+    if not isinstance(config, dict) or not config:
+        raise ValueError("OCR templates must be a mapping of document types to templates.")
+
+    problems = []
+    templates = []
+    for document_type, template in config.items():
+        if not isinstance(template, dict):
+            problems.append(f"template '{document_type}' must be a mapping")
+            continue
+        match = template.get('match')
+        if not isinstance(match, list) or not match or not all(isinstance(keyword, str) and keyword for keyword in match):
+            problems.append(f"template '{document_type}' needs a non-empty 'match' list of keywords")
+        regions = template.get('regions')
+        if not isinstance(regions, list) or not regions:
+            problems.append(f"template '{document_type}' needs a non-empty 'regions' list")
+            continue
+        compiled_regions = [_compile_region(document_type, index, region, problems) for index, region in enumerate(regions)]
+        templates.append({
+            'document_type': document_type,
+            'match': [keyword.upper() for keyword in match or [] if isinstance(keyword, str)],
+            'header': template.get('header') or document_type,
+            'regions': [region for region in compiled_regions if region is not None],
+        })
+
+    if problems:
+        raise ValueError("Invalid OCR templates: " + "; ".join(problems))
+    return templates
+
+
+def load_ocr_templates(filepath):
+    """Loads and validates the OCR templates file. Raises FileNotFoundError or ValueError."""
+    templates = compile_ocr_templates(load_config(filepath))
+    logging.info(f"Loaded OCR templates for {', '.join(template['document_type'] for template in templates)}.")
+    return templates
+
+
+def match_template(page_text, templates):
+    """Returns the only template whose keywords appear in page_text, or None if none or several match."""
+    upper_text = page_text.upper()
+    matches = [template for template in templates if any(keyword in upper_text for keyword in template['match'])]
+    return matches[0] if len(matches) == 1 else None
+
+
+def region_pixel_box(region, width, height):
+    """Returns the region's box in pixels of a width x height page image."""
+    left, top, right, bottom = region['box']
+    return int(left * width), int(top * height), int(round(right * width)), int(round(bottom * height))
+
+
+def clean_region_text(region, text):
+    """
+    Returns the region's value from its OCR text: whitespace collapsed and, if the
+    region has a pattern, only the first match. Returns None if nothing usable is left.
+    """
+    text = ' '.join(text.split())
+    if not text:
+        return None
+    if region['pattern']:
+        match = re.search(region['pattern'], text)
+        return match.group(0) if match else None
+    return text
+
+
+def format_template_text(template, values):
+    """Returns the page text built from the header and the 'label: value' line of every found region."""
+    lines = [template['header']]
+    for region in template['regions']:
+        value = values.get(region['field'])
+        if value:
+            lines.append(f"{region['label']}: {value}" if region['label'] else value)
+    return "\n".join(lines)
@@ -0,0 +1,23 @@
+# Defaults of the command-line options shared by run.py, batch.py and service.py
+# (see cli_options.py). They live here, without imports, so the argument parsers can
+# be built without loading the OCR and Gemini modules that use them (and Pillow,
+# pdf2image and pytesseract behind those).
+
+# Pages whose embedded text layer has fewer characters than this are OCR'd instead
+MIN_TEXT_LAYER_CHARS = 50
+
+# Adaptive mode: mean word confidence (0-100) of the low-DPI pass below which a page
+# is re-rendered at full resolution
+ADAPTIVE_MIN_CONFIDENCE = 70
+
+# Tesseract backends; 'auto' uses tesserocr when it is installed
+OCR_ENGINES = ('auto', 'tesserocr', 'pytesseract')
+
+# Documents with fewer pages needing OCR than this are OCR'd in full without triage
+TRIAGE_MIN_PAGES = 3
+
+# Pages selected for full OCR per document by default
+TRIAGE_MAX_PAGES = 2
+
+# Maximum prompt tokens per Gemini call (0 = no cap)
+DEFAULT_TOKEN_BUDGET = 16000
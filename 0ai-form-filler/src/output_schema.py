@@ -0,0 +1,127 @@
+import re
+from src.local_extractor import PAN_DOCUMENT, AADHAAR_DOCUMENT, PASSBOOK_DOCUMENT, REQUIRED_FIELDS
+from src.consolidator import CONSOLIDATED_FIELDS, normalize_date_value, document_kind
+
+# Declared shape of the JSON Gemini returns. The response schemas are sent with the
+# request (structured output), so the reply is always parseable JSON of this shape;
+# the field rules below are then checked per document type, and only the fields
+# that are missing or malformed are asked for again.
+
+# Format rules of individual fields: (compiled pattern, description used in re-ask prompts)
+FIELD_RULES = {
+    'pan_number': (re.compile(r'^[A-Z]{5}[0-9]{4}[A-Z]$'), "10 characters: 5 capital letters, 4 digits, 1 capital letter"),
+    'aadhaar_number': (re.compile(r'^[2-9][0-9]{3} ?[0-9]{4} ?[0-9]{4}$'), "12 digits, first digit 2-9, optionally grouped as 'XXXX XXXX XXXX'"),
+    'ifsc_code': (re.compile(r'^[A-Z]{4}0[A-Z0-9]{6}$'), "11 characters: 4 capital letters, the digit 0, 6 letters or digits"),
+    'account_number': (re.compile(r'^[0-9]{9,18}$'), "9 to 18 digits, no spaces"),
+    'date_of_birth': (re.compile(r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$'), "date as YYYY-MM-DD"),
+    'gender': (re.compile(r'^(male|female|transgender)$', re.IGNORECASE), "Male, Female or Transgender"),
+    'email': (re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$'), "email address"),
+    'phone_number': (re.compile(r'^\+?[0-9][0-9 -]{8,14}$'), "phone number, digits only apart from a leading +"),
+}
+
+# Fields each document type must yield; others are extracted when present
+DOCUMENT_SCHEMAS = {
+    PAN_DOCUMENT: {'required': REQUIRED_FIELDS[PAN_DOCUMENT], 'optional': ('father_name',)},
+    AADHAAR_DOCUMENT: {'required': REQUIRED_FIELDS[AADHAAR_DOCUMENT], 'optional': ('gender', 'address')},
+    PASSBOOK_DOCUMENT: {'required': REQUIRED_FIELDS[PASSBOOK_DOCUMENT], 'optional': ('bank_name', 'branch_name', 'address')},
+}
+
+_NULLABLE_STRING = {'type': 'STRING', 'nullable': True}
+
+# Response schemas in the OpenAPI subset accepted by Gemini's response_schema
+EXTRACTION_RESPONSE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'document_type': {'type': 'STRING', 'description': "Aadhaar, PAN, Bank Passbook or Other"},
+        'data': {'type': 'OBJECT', 'properties': {field: _NULLABLE_STRING for field in CONSOLIDATED_FIELDS}},
+    },
+    'required': ['document_type', 'data'],
+}
+
+PROFILE_RESPONSE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {field: _NULLABLE_STRING for field in CONSOLIDATED_FIELDS},
+}
+
+# One item per document, plus an optional {"consolidated_profile": {...}} item
+BATCH_EXTRACTION_RESPONSE_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': {
+            'document': {'type': 'INTEGER', 'nullable': True, 'description': "Number of the document, from 1"},
+            'document_type': dict(EXTRACTION_RESPONSE_SCHEMA['properties']['document_type'], nullable=True),
+            'data': dict(EXTRACTION_RESPONSE_SCHEMA['properties']['data'], nullable=True),
+            'consolidated_profile': dict(PROFILE_RESPONSE_SCHEMA, nullable=True),
+        },
+    },
+}
+
+# Sent with the fields that need another look; the source text or data follows it
+REASK_PROMPT = """Some fields of the JSON you extracted are missing or malformed. Look at the text below again and return a JSON object with exactly these keys, each with the corrected value or null if it is not present:
+{fields}"""
+
+
+def reask_response_schema(fields):
+    """Response schema of a re-ask for the given fields."""
+    return {'type': 'OBJECT', 'properties': {field: _NULLABLE_STRING for field in fields}, 'required': list(fields)}
+
+
+def reask_field_list(fields):
+    """Returns the '- field: expected format' lines of a re-ask prompt."""
+    return "\n".join(f"- {field}: {FIELD_RULES[field][1]}" if field in FIELD_RULES else f"- {field}" for field in fields)
+
+
+def clean_field_value(field, value):
+    """
+    Returns value normalized for the field (dates as YYYY-MM-DD, codes without
+    spaces), or None if it is empty or does not match the field's format.
+    """
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    text = ' '.join(str(value).split())
+    if not text or text.lower() in ('null', 'none', 'n/a'):
+        return None
+    if field == 'date_of_birth':
+        text = normalize_date_value(text)
+    elif field in ('pan_number', 'ifsc_code'):
+        text = text.replace(' ', '').upper()
+    elif field == 'account_number':
+        text = text.replace(' ', '').replace('-', '')
+    rule = FIELD_RULES.get(field)
+    if rule is not None and not rule[0].match(text):
+        return None
+    return text
+
+
+def validate_fields(data, required=()):
+    """
+    Checks every field of data against its format rule, and that required fields are
+    present. Returns (cleaned data, fields to ask for again). Malformed values are
+    left out of the cleaned data; placeholders such as 'N/A' in free-text fields
+    count as missing.
+    """
+    cleaned = {}
+    invalid = []
+    for field, value in data.items():
+        cleaned_value = clean_field_value(field, value)
+        if cleaned_value is not None:
+            cleaned[field] = cleaned_value
+        elif value not in (None, '') and field in FIELD_RULES:
+            invalid.append(field)
+    missing = [field for field in required if field not in cleaned and field not in invalid]
+    return cleaned, invalid + missing
+
+
+def validate_extraction(extracted):
+    """
+    Validates an extraction result against the schema of its document type (matched
+    loosely, so 'PAN Card' uses the PAN schema). Returns (result with cleaned data, fields to ask for again), or (None, []) if it
+    is not an object with 'document_type' and a 'data' object.
+    """
+    if not isinstance(extracted, dict) or not isinstance(extracted.get('document_type'), str) \
+            or not isinstance(extracted.get('data'), dict):
+        return None, []
+    schema = DOCUMENT_SCHEMAS.get(document_kind(extracted['document_type']), {})
+    data, reask = validate_fields(extracted['data'], schema.get('required', ()))
+    return dict(extracted, data=data), reask
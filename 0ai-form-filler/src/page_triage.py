@@ -0,0 +1,68 @@
+from src.local_extractor import PAN_PATTERN, IFSC_PATTERN, ACCOUNT_PATTERN, DATE_PATTERN, AADHAAR_PATTERN
+from src.option_defaults import TRIAGE_MIN_PAGES, TRIAGE_MAX_PAGES
+
+# Page triage picks the pages of a long document worth a full 300 DPI OCR. pdf_ocr
+# renders every candidate page as a low-resolution thumbnail and OCRs it; the
+# thumbnail text is scored here. Passbooks and statements usually carry the holder
+# details on one or two pages and transactions on the rest, so pages with identity
+# keywords and IDs score high, and pages that look like transaction tables score low.
+
+# Bump when the scoring changes so cached triage decisions are ignored
+PAGE_TRIAGE_VERSION = 1
+
+# Resolution of the triage thumbnails
+TRIAGE_DPI = 100
+
+# Share of dark pixels below which a thumbnail counts as blank
+MIN_INK_RATIO = 0.002
+
+# Gray level (0-255) below which a thumbnail pixel counts as ink
+INK_THRESHOLD = 128
+
+# Words found on pages with the holder's details, each counted once per page
+HOLDER_KEYWORDS = ('NAME', 'IFSC', 'ACCOUNT', 'A/C', 'DOB', 'BIRTH', 'ADDRESS', 'CUSTOMER', 'NOMINEE', 'MICR',
+                   'BRANCH', 'FATHER', 'MOBILE', 'CIF')
+HOLDER_KEYWORD_SCORE = 2
+
+# Identifiers that are worth more than a keyword: (pattern, score)
+IDENTIFIER_SCORES = ((IFSC_PATTERN, 3), (ACCOUNT_PATTERN, 3), (PAN_PATTERN, 3), (AADHAAR_PATTERN, 2))
+
+# Column headers of transaction tables, each counted once per page
+TRANSACTION_KEYWORDS = ('WITHDRAWAL', 'DEPOSIT', 'BALANCE', 'PARTICULARS', 'NARRATION', 'CHEQUE', 'DEBIT', 'CREDIT')
+TRANSACTION_KEYWORD_SCORE = -1
+
+# Every this many dates on a page (transaction rows) costs one point, up to MAX_DATE_PENALTY
+DATES_PER_PENALTY = 5
+MAX_DATE_PENALTY = 3
+
+
+def ink_ratio(gray_image):
+    """Returns the share of pixels darker than INK_THRESHOLD in a grayscale ('L') image."""
+    histogram = gray_image.histogram()
+    total = sum(histogram)
+    return sum(histogram[:INK_THRESHOLD]) / total if total else 0.0
+
+
+def score_page_text(text):
+    """Returns how likely a page with this (thumbnail OCR) text holds the holder's details."""
+    upper_text = text.upper()
+    score = sum(HOLDER_KEYWORD_SCORE for keyword in HOLDER_KEYWORDS if keyword in upper_text)
+    score += sum(points for pattern, points in IDENTIFIER_SCORES if pattern.search(text))
+    score += sum(TRANSACTION_KEYWORD_SCORE for keyword in TRANSACTION_KEYWORDS if keyword in upper_text)
+    score -= min(len(DATE_PATTERN.findall(text)) // DATES_PER_PENALTY, MAX_DATE_PENALTY)
+    return score
+
+
+def select_pages(page_scores, max_pages=TRIAGE_MAX_PAGES):
+    """
+    Picks the pages to OCR from {page_number: score, or None for a blank page}.
+    Returns up to max_pages pages with a positive score, highest first (earlier pages
+    win ties), in page order. If no page scores above zero the triage cannot tell,
+    and every non-blank page (every page, if all look blank) is returned.
+    """
+    non_blank = [page_number for page_number in sorted(page_scores) if page_scores[page_number] is not None]
+    candidates = [page_number for page_number in non_blank if page_scores[page_number] > 0]
+    if not candidates:
+        return non_blank or sorted(page_scores)
+    ranked = sorted(candidates, key=lambda page_number: (-page_scores[page_number], page_number))
+    return sorted(ranked[:max_pages])
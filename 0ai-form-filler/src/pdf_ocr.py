@@ -1,19 +1,26 @@
 import os
 import sys
+import json
+import shlex
 import logging
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image  # Part of Pillow
 import pytesseract
-import pypdf  # Optional, currently unused
-
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+from src.cache import make_cache_key, hash_file
+from src.image_preprocess import preprocess_for_ocr
+from src import tesseract_engine
+from src.tesseract_engine import resolve_ocr_engine, get_ocr_engine, set_ocr_engine
+from src.ocr_templates import match_template, region_pixel_box, clean_region_text, format_template_text
+from src.page_triage import (PAGE_TRIAGE_VERSION, TRIAGE_DPI, TRIAGE_MIN_PAGES, TRIAGE_MAX_PAGES, MIN_INK_RATIO,
+                             ink_ratio, score_page_text, select_pages)
+from src.metrics import span, increment
+from src.option_defaults import ADAPTIVE_MIN_CONFIDENCE, MIN_TEXT_LAYER_CHARS
 
 # Import pdf2image and its exceptions
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
     from pdf2image.exceptions import PDFPageCountError, PDFSyntaxError
-    logging.info("pdf2image imported successfully.")
 except ImportError:
     logging.error("pdf2image is not installed. Please install it: pip install pdf2image")
     sys.exit(1)
@@ -21,27 +28,75 @@ except ImportError:
 # Configure Tesseract executable path if needed
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
-# Check if Tesseract is available
-try:
-    version = pytesseract.get_tesseract_version()
-    logging.info(f"Tesseract found, version: {version}")
-except pytesseract.TesseractNotFoundError:
-    logging.error("Tesseract is not installed or not in your system's PATH. Please install it.")
-    logging.error("Refer to README.md for installation instructions.")
-    sys.exit(1)
+# Tesseract is looked up on first use (a subprocess call), not at import time; per OCR engine
+_tesseract_versions = {}
+
+
+def get_tesseract_version():
+    """
+    Returns the version of Tesseract used by the selected OCR engine as a string,
+    checking for it on the first call.
+    Raises RuntimeError if Tesseract is not installed or not in PATH.
+    """
+    engine = resolve_ocr_engine()
+    if engine not in _tesseract_versions:
+        if engine == 'tesserocr':
+            _tesseract_versions[engine] = tesseract_engine.tesserocr_version()
+        else:
+            try:
+                _tesseract_versions[engine] = str(pytesseract.get_tesseract_version())
+            except pytesseract.TesseractNotFoundError:
+                raise RuntimeError("Tesseract is not installed or not in your system's PATH. Please install it (see README.md).") from None
+        logging.info(f"Tesseract found, version: {_tesseract_versions[engine]} ({engine})")
+    return _tesseract_versions[engine]
+
+# Resolution used when rendering PDF pages for OCR
+OCR_DPI = 300
+
+# Tesseract language model used for OCR
+OCR_LANG = 'eng'
+
+# Adaptive mode: first pass resolution. Pages whose mean word confidence is below
+# ADAPTIVE_MIN_CONFIDENCE (see option_defaults.py) are re-rendered at OCR_DPI
+ADAPTIVE_LOW_DPI = 150
+
+# Resolution of the pass that matches a page to an OCR template (--roi_ocr)
+ROI_CLASSIFY_DPI = 100
 
 # Function to perform Tesseract OCR on a Pillow Image object
-def ocr_image(image: Image.Image):
-    """Performs Tesseract OCR on a Pillow Image object."""
+def _tesseract_config(psm=None, whitelist=None):
+    """Returns the tesseract command line options for a page segmentation mode and character whitelist."""
+    options = []
+    if psm is not None:
+        options.append(f"--psm {psm}")
+    if whitelist:
+        options.append(f"-c tessedit_char_whitelist={shlex.quote(whitelist)}")
+    return ' '.join(options)
+
+
+def ocr_image(image: Image.Image, psm=None, whitelist=None):
+    """
+    Performs Tesseract OCR on a Pillow Image object, in process when the tesserocr
+    engine is selected, otherwise through a pytesseract subprocess.
+    psm and whitelist override Tesseract's page segmentation mode and the characters
+    it may output, e.g. for a cropped single-line field.
+    """
     if image is None:
         return ""
 
+    if resolve_ocr_engine() == 'tesserocr':
+        try:
+            return tesseract_engine.image_to_string(image, OCR_LANG, psm=psm, whitelist=whitelist)
+        except Exception as e:
+            logging.error(f"Error during OCR processing: {e}")
+            return ""
+
     try:
         # Optional preprocessing:
         # image = image.convert('L')  # Convert to grayscale
         # from PIL import ImageFilter
         # image = image.filter(ImageFilter.SHARPEN)
-        text = pytesseract.image_to_string(image, lang='eng')
+        text = pytesseract.image_to_string(image, lang=OCR_LANG, config=_tesseract_config(psm, whitelist))
         return text.strip()
     except pytesseract.TesseractNotFoundError:
         logging.error("Tesseract executable not found during OCR processing.")
@@ -50,68 +105,543 @@ def ocr_image(image: Image.Image):
         logging.error(f"Error during OCR processing: {e}")
         return ""
 
-# Main processing function
-def process_pdf_and_ocr(pdf_path: str, temp_dir: str, pages_to_process=None):
+def ocr_image_with_confidence(image: Image.Image):
+    """
+    Performs Tesseract OCR and also returns the mean word confidence (0-100).
+    Text and confidences come from a single Tesseract run (image_to_data with pytesseract).
+    Returns (text, confidence); confidence is 0 when no words were found.
     """
-    Processes a PDF file, converts pages to images using pdf2image,
-    performs OCR using Tesseract, and returns concatenated text.
+    if image is None:
+        return "", 0.0
 
-    Args:
-        pdf_path (str): Path to the PDF file.
-        temp_dir (str): Directory to save temporary images.
-        pages_to_process (list, optional): 1-based page numbers to process.
+    if resolve_ocr_engine() == 'tesserocr':
+        try:
+            return tesseract_engine.image_to_text_and_confidence(image, OCR_LANG)
+        except Exception as e:
+            logging.error(f"Error during OCR processing: {e}")
+            return "", 0.0
 
-    Returns:
-        str: OCR-extracted text from specified pages.
+    try:
+        data = pytesseract.image_to_data(image, lang=OCR_LANG, output_type=pytesseract.Output.DICT)
+    except pytesseract.TesseractNotFoundError:
+        logging.error("Tesseract executable not found during OCR processing.")
+        return "", 0.0
+    except Exception as e:
+        logging.error(f"Error during OCR processing: {e}")
+        return "", 0.0
+
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data['text']):
+        word = (word or '').strip()
+        if not word:
+            continue
+        line_key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(line_key, []).append(word)
+        confidence = float(data['conf'][i])
+        if confidence >= 0:
+            confidences.append(confidence)
+
+    text = "\n".join(" ".join(words) for words in lines.values())
+    mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, mean_confidence
+
+# Worker function for parallel OCR. Runs in a separate process, so it renders
+# its own page instead of receiving a full-resolution image over a pipe.
+def _ocr_page(pdf_path: str, page_number: int, dpi: int = OCR_DPI):
+    """Renders a single PDF page and performs OCR on it. Returns (page_number, text)."""
+    try:
+        with span('ocr.rasterize', page=page_number, dpi=dpi):
+            images = convert_from_path(pdf_path, first_page=page_number, last_page=page_number, dpi=dpi)
+    except Exception as e:
+        logging.error(f"Could not render page {page_number} of {pdf_path}: {e}")
+        return page_number, ""
+
+    if not images:
+        return page_number, ""
+
+    logging.info(f"Performing OCR on page {page_number}...")
+    with span('ocr.tesseract', page=page_number):
+        page_text = ocr_image(images[0])
+
+    for image in images:
+        try:
+            image.close()
+        except Exception:
+            pass
+
+    return page_number, page_text
+
+
+def _ocr_page_adaptive(pdf_path: str, page_number: int, min_confidence=ADAPTIVE_MIN_CONFIDENCE):
+    """
+    OCRs a page at ADAPTIVE_LOW_DPI after cheap preprocessing and only re-renders it
+    at OCR_DPI when Tesseract's mean word confidence is below min_confidence.
+    Returns (page_number, text). Safe to run in a worker process.
+    """
+    best_text, best_confidence = "", -1.0
+
+    for dpi in (ADAPTIVE_LOW_DPI, OCR_DPI):
+        try:
+            with span('ocr.rasterize', page=page_number, dpi=dpi):
+                images = convert_from_path(pdf_path, first_page=page_number, last_page=page_number, dpi=dpi)
+        except Exception as e:
+            logging.error(f"Could not render page {page_number} of {pdf_path} at {dpi} DPI: {e}")
+            break
+
+        if not images:
+            break
+
+        logging.info(f"Performing OCR on page {page_number} at {dpi} DPI...")
+        image = images[0]
+        with span('ocr.preprocess', page=page_number, dpi=dpi):
+            processed_image = preprocess_for_ocr(image)
+        with span('ocr.tesseract', page=page_number, dpi=dpi):
+            text, confidence = ocr_image_with_confidence(processed_image)
+        processed_image.close()
+        image.close()
+
+        if confidence >= best_confidence:
+            best_text, best_confidence = text, confidence
+        if confidence >= min_confidence:
+            break
+        if dpi != OCR_DPI:
+            increment('ocr_adaptive_rerenders_total')
+            logging.info(f"Page {page_number}: confidence {confidence:.0f} below {min_confidence} at {dpi} DPI, re-rendering at {OCR_DPI} DPI.")
+
+    logging.info(f"Page {page_number}: OCR confidence {max(best_confidence, 0):.0f}.")
+    return page_number, best_text
+
+
+def _ocr_regions(image: Image.Image, template, page_number):
+    """
+    OCRs the regions of template on a page image. Returns the page text built from
+    them, or None if a required region yields no (matching) text.
     """
-    all_text = []
-    images = []
+    values = {}
+    region_pixels = 0
+    for region in template['regions']:
+        crop = image.crop(region_pixel_box(region, image.width, image.height))
+        region_pixels += crop.width * crop.height
+        with span('ocr.region', page=page_number, field=region['field']):
+            value = clean_region_text(region, ocr_image(crop, psm=region['psm'], whitelist=region['whitelist']))
+        crop.close()
+        if value is None and region['required']:
+            logging.info(f"Page {page_number}: required region '{region['field']}' of the {template['document_type']} template is empty or malformed, OCR'ing the full page.")
+            return None
+        values[region['field']] = value
 
+    logging.info(f"Page {page_number}: {template['document_type']} template, OCR'd {len(values)} regions "
+                 f"({region_pixels / (image.width * image.height):.0%} of the page).")
+    return format_template_text(template, values)
+
+
+def _ocr_page_roi(pdf_path: str, page_number: int, templates):
+    """
+    Renders a page at OCR_DPI, matches it to one of the OCR templates from a pass at
+    ROI_CLASSIFY_DPI, and OCRs only that template's regions. Pages no single template
+    matches, or where a required region comes out empty, are OCR'd in full.
+    Returns (page_number, text). Safe to run in a worker process.
+    """
     try:
-        logging.info("Converting PDF pages to images using pdf2image...")
+        with span('ocr.rasterize', page=page_number, dpi=OCR_DPI):
+            images = convert_from_path(pdf_path, first_page=page_number, last_page=page_number, dpi=OCR_DPI)
+    except Exception as e:
+        logging.error(f"Could not render page {page_number} of {pdf_path}: {e}")
+        return page_number, ""
+
+    if not images:
+        return page_number, ""
+
+    image = images[0]
+    try:
+        with span('ocr.classify', page=page_number, dpi=ROI_CLASSIFY_DPI):
+            small_image = image.reduce(max(1, OCR_DPI // ROI_CLASSIFY_DPI))
+            template = match_template(ocr_image(small_image), templates)
+            small_image.close()
+
+        if template is None:
+            increment('ocr_roi_pages_total', result='unmatched')
+            logging.info(f"Page {page_number}: no OCR template matched, OCR'ing the full page.")
+        else:
+            page_text = _ocr_regions(image, template, page_number)
+            if page_text is not None:
+                increment('ocr_roi_pages_total', result='regions')
+                return page_number, page_text
+            increment('ocr_roi_pages_total', result='fallback')
+
+        logging.info(f"Performing OCR on page {page_number}...")
+        with span('ocr.tesseract', page=page_number):
+            return page_number, ocr_image(image)
+    finally:
+        image.close()
+
+
+def _get_page_numbers(pdf_path: str, pages_to_process=None):
+    """Returns the sorted list of 1-based page numbers to process for a PDF."""
+    if pages_to_process:
+        return sorted(set(pages_to_process))
+
+    page_count = pdfinfo_from_path(pdf_path)["Pages"]
+    return list(range(1, page_count + 1))
+
+
+def _resolve_page_numbers(pdf_path: str, pages_to_process=None):
+    """_get_page_numbers, logging errors. Returns [] if the PDF cannot be read."""
+    try:
+        return _get_page_numbers(pdf_path, pages_to_process)
+    except (PDFPageCountError, PDFSyntaxError) as e:
+        logging.error(f"Could not read PDF file: {pdf_path}. Error: {e}")
+    except Exception as e:
+        logging.error(f"Unexpected error reading PDF info: {e}")
+    return []
+
+
+def _process_pdf_parallel(pdf_path: str, page_numbers, workers=None, page_function=_ocr_page, page_args=()):
+    """
+    Renders and OCRs pages in a pool of worker processes, calling
+    page_function(pdf_path, page_number, *page_args) for each page.
+    Results are collected in page order, so the output matches the serial path.
+    """
+    max_workers = min(workers or os.cpu_count() or 1, len(page_numbers))
+    logging.info(f"Running OCR on {len(page_numbers)} pages using {max_workers} worker processes...")
+
+    # Spans opened in the worker processes are not collected; the pool is timed as a whole.
+    # Each worker selects the same OCR engine and keeps it loaded for all of its pages.
+    with span('ocr.parallel', pages=len(page_numbers), workers=max_workers), \
+         ProcessPoolExecutor(max_workers=max_workers, initializer=set_ocr_engine, initargs=(get_ocr_engine(),)) as executor:
+        # executor.map yields results in submission order, keeping pages ordered
+        extra_args = [[arg] * len(page_numbers) for arg in page_args]
+        return list(executor.map(page_function, [pdf_path] * len(page_numbers), page_numbers, *extra_args))
 
-        first_page = pages_to_process[0] if pages_to_process else 1
-        last_page = pages_to_process[-1] if pages_to_process else None
 
-        images = convert_from_path(pdf_path, first_page=first_page, last_page=last_page, dpi=300)
+def _page_windows(page_numbers, window_size):
+    """Splits sorted page numbers into runs of consecutive pages, each at most window_size long."""
+    window = []
+    for page_number in page_numbers:
+        if window and (page_number != window[-1] + 1 or len(window) >= window_size):
+            yield window
+            window = []
+        window.append(page_number)
+    if window:
+        yield window
+
+
+def _process_pdf_streaming(pdf_path: str, page_numbers, page_window=1):
+    """
+    Renders and OCRs a few pages at a time, closing each image as soon as it has
+    been OCR'd. At most page_window full-resolution images are held in memory.
+    """
+    logging.info(f"Streaming OCR over {len(page_numbers)} pages, {page_window} page(s) at a time...")
+
+    for window in _page_windows(page_numbers, page_window):
+        try:
+            with span('ocr.rasterize', pages=f"{window[0]}-{window[-1]}", dpi=OCR_DPI):
+                images = convert_from_path(pdf_path, first_page=window[0], last_page=window[-1], dpi=OCR_DPI)
+        except Exception as e:
+            logging.error(f"Could not render pages {window[0]}-{window[-1]} of {pdf_path}: {e}")
+            continue
+
+        for page_number, image in zip(window, images):
+            logging.info(f"Performing OCR on page {page_number}...")
+            with span('ocr.tesseract', page=page_number):
+                page_text = ocr_image(image)
+            try:
+                image.close()
+            except Exception:
+                pass
+            yield page_number, page_text
+
+
+def _process_pdf_adaptive(pdf_path: str, page_numbers, min_confidence=ADAPTIVE_MIN_CONFIDENCE):
+    """Serial adaptive OCR: pages are rendered one at a time, first at low DPI. Yields (page_number, text)."""
+    for page_number in page_numbers:
+        yield _ocr_page_adaptive(pdf_path, page_number, min_confidence)
+
+
+def _process_pdf_roi(pdf_path: str, page_numbers, templates=()):
+    """Serial region-of-interest OCR: pages are rendered and matched to a template one at a time. Yields (page_number, text)."""
+    for page_number in page_numbers:
+        yield _ocr_page_roi(pdf_path, page_number, templates)
+
+
+def _process_pdf_in_memory(pdf_path: str, page_numbers):
+    """
+    Converts all requested pages to images up front, then OCRs them one by one.
+    Pages are rendered one run of consecutive pages per pdf2image call (the whole
+    document in one call), so pages that are not requested are never rasterized.
+    Yields (page_number, text) tuples.
+    """
+    images = []  # (page_number, image)
+
+    try:
+        logging.info("Converting PDF pages to images using pdf2image...")
+
+        for page_run in _page_windows(page_numbers, len(page_numbers)):
+            first_page, last_page = page_run[0], page_run[-1]
+            with span('ocr.rasterize', pages=f"{first_page}-{last_page}", dpi=OCR_DPI):
+                run_images = convert_from_path(pdf_path, first_page=first_page, last_page=last_page, dpi=OCR_DPI)
+            images.extend((first_page + i, image) for i, image in enumerate(run_images))
 
         logging.info(f"Successfully converted {len(images)} pages to images.")
 
     except (PDFPageCountError, PDFSyntaxError) as e:
         logging.error(f"Could not read PDF file: {pdf_path}. Error: {e}")
-        return ""
+        return
     # except PDFPopplerPathError:
     #     logging.error("Poppler is not installed or not in your system's PATH.")
     #     logging.error("Please install Poppler and add its 'bin' directory to your system's PATH.")
-    #     return ""
+    #     return
     except Exception as e:
         logging.error(f"Unexpected error during PDF to image conversion: {e}")
-        return ""
+        return
 
     if not images:
         logging.warning(f"No images generated from PDF {pdf_path}. Cannot perform OCR.")
-        return ""
-
-    for i, image in enumerate(images):
-        original_page_number = first_page + i
-        if pages_to_process is not None and original_page_number not in pages_to_process:
-            continue
+        return
 
+    for original_page_number, image in images:
         logging.info(f"Performing OCR on page {original_page_number}...")
-        page_text = ocr_image(image)
+        # Optionally save image for debugging
+        # image_path = os.path.join(temp_dir, f"{os.path.basename(pdf_path)}_page_{original_page_number}.png")
+        # image.save(image_path)
+        with span('ocr.tesseract', page=original_page_number):
+            page_text = ocr_image(image)
+        yield original_page_number, page_text
 
-        if page_text:
-            all_text.append(f"[--- Page {original_page_number} ---]\n{page_text}")
-            # Optionally save image for debugging
-            # image_path = os.path.join(temp_dir, f"{os.path.basename(pdf_path)}_page_{original_page_number}.png")
-            # image.save(image_path)
-        else:
-            logging.warning(f"No text obtained from OCR for page {original_page_number}.")
-
-    for image in images:
+    for _, image in images:
         try:
             image.close()
         except Exception:
             pass
 
+
+def extract_text_layer(pdf_path: str, pages_to_process=None, min_chars=MIN_TEXT_LAYER_CHARS):
+    """
+    Reads the embedded text layer of a PDF with pypdf.
+
+    Returns:
+        tuple: ({page_number: text} for pages with at least min_chars of embedded text,
+                list of all 1-based page numbers considered). The page list is None
+                if the PDF could not be read, in which case every page should be OCR'd.
+    """
+    import pypdf  # Imported here since it is slow to import and only needed for text layers
+
+    try:
+        reader = pypdf.PdfReader(pdf_path)
+        page_count = len(reader.pages)
+        if pages_to_process:
+            # Pages past the end (e.g. a page list given for several documents) are left out
+            page_numbers = [page_number for page_number in pages_to_process if page_number <= page_count]
+        else:
+            page_numbers = list(range(1, page_count + 1))
+    except Exception as e:
+        logging.warning(f"Could not read text layer of {pdf_path} with pypdf: {e}")
+        return {}, None
+
+    page_texts = {}
+    for page_number in page_numbers:
+        try:
+            text = (reader.pages[page_number - 1].extract_text() or "").strip()
+        except Exception as e:
+            logging.warning(f"Could not extract text layer from page {page_number}: {e}")
+            text = ""
+
+        if len(text) >= min_chars:
+            logging.info(f"Page {page_number}: using embedded text layer ({len(text)} chars).")
+            page_texts[page_number] = text
+        else:
+            logging.info(f"Page {page_number}: text layer missing or too thin ({len(text)} chars), falling back to OCR.")
+
+    return page_texts, page_numbers
+
+
+def _score_thumbnails(pdf_path: str, page_numbers):
+    """
+    Renders the pages at TRIAGE_DPI, one run of consecutive pages per call, and
+    scores each thumbnail's OCR text. Returns {page_number: score, or None if blank}.
+    """
+    page_scores = {}
+    for page_run in _page_windows(page_numbers, len(page_numbers)):
+        with span('ocr.rasterize', pages=f"{page_run[0]}-{page_run[-1]}", dpi=TRIAGE_DPI):
+            thumbnails = convert_from_path(pdf_path, first_page=page_run[0], last_page=page_run[-1], dpi=TRIAGE_DPI,
+                                           grayscale=True)
+        for page_number, thumbnail in zip(page_run, thumbnails):
+            if ink_ratio(thumbnail) < MIN_INK_RATIO:
+                page_scores[page_number] = None
+            else:
+                page_scores[page_number] = score_page_text(ocr_image(thumbnail))
+            thumbnail.close()
+    return page_scores
+
+
+def _log_skipped_pages(pdf_path: str, page_numbers, selected_pages):
+    skipped_pages = [page_number for page_number in page_numbers if page_number not in selected_pages]
+    if skipped_pages:
+        logging.warning(f"Page triage of {pdf_path}: skipping pages {skipped_pages}; "
+                        f"fields found only on them will be missing.")
+
+
+def _triage_pages(pdf_path: str, page_numbers, max_pages=TRIAGE_MAX_PAGES, ocr_cache=None):
+    """
+    Picks the pages worth a full OCR from thumbnails (see page_triage.py). Returns
+    page_numbers unchanged for documents with fewer than TRIAGE_MIN_PAGES pages to
+    OCR, or if the pages could not be rendered. The decision is kept in ocr_cache.
+    """
+    if len(page_numbers) < TRIAGE_MIN_PAGES:
+        return page_numbers
+
+    cache_key = None
+    if ocr_cache is not None:
+        cache_key = make_cache_key('triage', PAGE_TRIAGE_VERSION, hash_file(pdf_path), page_numbers, max_pages,
+                                   TRIAGE_DPI, OCR_LANG, get_tesseract_version(), resolve_ocr_engine())
+        cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            selected_pages = json.loads(cached)
+            _log_skipped_pages(pdf_path, page_numbers, selected_pages)
+            return selected_pages
+
+    try:
+        with span('ocr.triage', pages=len(page_numbers), dpi=TRIAGE_DPI):
+            page_scores = _score_thumbnails(pdf_path, page_numbers)
+    except Exception as e:
+        logging.warning(f"Page triage failed for {pdf_path}, OCR'ing all pages: {e}")
+        return page_numbers
+
+    selected_pages = select_pages(page_scores, max_pages)
+    increment('pages_triaged_total', len(selected_pages), result='selected')
+    increment('pages_triaged_total', len(page_numbers) - len(selected_pages), result='skipped')
+    logging.info(f"Page triage of {pdf_path}: OCR'ing pages {selected_pages} of {len(page_numbers)} "
+                 f"(scores: {', '.join(f'{page}={score}' for page, score in sorted(page_scores.items()))}).")
+    _log_skipped_pages(pdf_path, page_numbers, selected_pages)
+    if cache_key is not None:
+        ocr_cache.set(cache_key, json.dumps(selected_pages))
+    return selected_pages
+
+
+def _load_cached_pages(pdf_path: str, page_numbers, ocr_cache, page_texts, cache_variant=()):
+    """
+    Fills page_texts with cached OCR results and returns (pages still to OCR,
+    {page_number: cache key} for those pages so their results can be stored).
+    cache_variant holds extra key parts for OCR modes that produce different text.
+    """
+    try:
+        file_hash = hash_file(pdf_path)
+    except Exception as e:
+        logging.warning(f"OCR cache disabled for {pdf_path}: {e}")
+        return page_numbers, {}
+
+    missing_pages = []
+    cache_keys = {}
+    for page_number in page_numbers:
+        key = make_cache_key('ocr', file_hash, page_number, OCR_DPI, OCR_LANG, get_tesseract_version(), resolve_ocr_engine(),
+                             *cache_variant)
+        cached_text = ocr_cache.get(key)
+        if cached_text is None:
+            missing_pages.append(page_number)
+            cache_keys[page_number] = key
+        else:
+            logging.info(f"Page {page_number}: using cached OCR text.")
+            if cached_text:
+                page_texts[page_number] = cached_text
+
+    return missing_pages, cache_keys
+
+
+# Main processing function
+def process_pdf_and_ocr(pdf_path: str, temp_dir: str, pages_to_process=None, workers=1, page_window=None,
+                        use_text_layer=True, min_text_chars=MIN_TEXT_LAYER_CHARS, ocr_cache=None,
+                        adaptive=False, min_confidence=ADAPTIVE_MIN_CONFIDENCE, templates=None,
+                        page_triage=False, triage_max_pages=TRIAGE_MAX_PAGES):
+    """
+    Processes a PDF file and returns the text of its pages, concatenated.
+    Pages with a usable embedded text layer are read directly with pypdf;
+    the rest are converted to images using pdf2image and OCR'd with Tesseract.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        temp_dir (str): Directory to save temporary images.
+        pages_to_process (list, optional): 1-based page numbers to process.
+        workers (int, optional): Number of processes used to OCR pages in parallel.
+            1 runs the serial loop, 0 or None uses one process per CPU core.
+        page_window (int, optional): Stream the PDF, rendering at most this many
+            pages at a time instead of loading every page image up front.
+        use_text_layer (bool, optional): Try the embedded text layer before OCR.
+        min_text_chars (int, optional): Minimum characters of embedded text for a
+            page to skip OCR.
+        ocr_cache (DiskCache, optional): Persistent cache of per-page OCR text, keyed
+            by file content hash, page number, DPI, language, Tesseract version and
+            OCR engine.
+        adaptive (bool, optional): OCR pages at ADAPTIVE_LOW_DPI with preprocessing
+            first, re-rendering at OCR_DPI only pages below min_confidence.
+        min_confidence (float, optional): Mean Tesseract word confidence (0-100)
+            a low-resolution page needs to be accepted in adaptive mode.
+        templates (list, optional): OCR templates (see ocr_templates.py). Pages
+            matching one are OCR'd only in the template's regions. Takes
+            precedence over adaptive mode.
+        page_triage (bool, optional): For documents with at least TRIAGE_MIN_PAGES
+            pages to OCR, OCR only the pages that low-resolution thumbnails show to
+            hold the holder's details. Not applied when pages_to_process is given.
+        triage_max_pages (int, optional): Pages kept per document by page triage.
+
+    Returns:
+        str: Text from specified pages.
+    """
+    page_texts = {}
+    ocr_pages = pages_to_process
+
+    if use_text_layer:
+        with span('ocr.text_layer'):
+            page_texts, all_pages = extract_text_layer(pdf_path, pages_to_process, min_text_chars)
+        increment('pages_total', len(page_texts), source='text_layer')
+        if all_pages is not None:
+            ocr_pages = [page_number for page_number in all_pages if page_number not in page_texts]
+            if not ocr_pages:
+                logging.info(f"All {len(all_pages)} pages of {pdf_path} have a text layer. Skipping OCR.")
+
+    if ocr_pages is None or ocr_pages:
+        get_tesseract_version()  # Fails with a clear error before any page is rendered
+        # Resolved once here; every OCR path below takes the list of page numbers
+        ocr_pages = _resolve_page_numbers(pdf_path, ocr_pages)
+
+    if page_triage and pages_to_process is None and ocr_pages:
+        ocr_pages = _triage_pages(pdf_path, ocr_pages, triage_max_pages, ocr_cache)
+
+    cache_keys = {}
+    if ocr_cache is not None and ocr_pages:
+        if templates:
+            cache_variant = ('roi', ROI_CLASSIFY_DPI, make_cache_key(templates))
+        else:
+            cache_variant = ('adaptive', ADAPTIVE_LOW_DPI, min_confidence) if adaptive else ()
+        text_layer_pages = len(page_texts)
+        ocr_pages, cache_keys = _load_cached_pages(pdf_path, ocr_pages, ocr_cache, page_texts, cache_variant)
+        increment('pages_total', len(page_texts) - text_layer_pages, source='ocr_cache')
+
+    if ocr_pages:
+        if templates and workers != 1:
+            page_results = _process_pdf_parallel(pdf_path, ocr_pages, workers, _ocr_page_roi, (templates,))
+        elif templates:
+            page_results = _process_pdf_roi(pdf_path, ocr_pages, templates)
+        elif adaptive and workers != 1:
+            page_results = _process_pdf_parallel(pdf_path, ocr_pages, workers, _ocr_page_adaptive, (min_confidence,))
+        elif adaptive:
+            page_results = _process_pdf_adaptive(pdf_path, ocr_pages, min_confidence)
+        elif workers != 1:
+            page_results = _process_pdf_parallel(pdf_path, ocr_pages, workers)
+        elif page_window:
+            page_results = _process_pdf_streaming(pdf_path, ocr_pages, page_window)
+        else:
+            page_results = _process_pdf_in_memory(pdf_path, ocr_pages)
+
+        for page_number, page_text in page_results:
+            increment('pages_total', source='tesseract')
+            # Empty results are not cached, since they may come from a transient Tesseract error
+            if page_text and page_number in cache_keys:
+                ocr_cache.set(cache_keys[page_number], page_text)
+            if page_text:
+                page_texts[page_number] = page_text
+            else:
+                logging.warning(f"No text obtained from OCR for page {page_number}.")
+
+    all_text = [f"[--- Page {page_number} ---]\n{page_texts[page_number]}" for page_number in sorted(page_texts)]
     return "\n".join(all_text)
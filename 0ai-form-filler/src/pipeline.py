@@ -0,0 +1,331 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.pdf_ocr import process_pdf_and_ocr
+from src.gemini_processor import (process_document_with_gemini, process_documents_with_gemini, consolidate_data_with_gemini,
+                                  resolve_conflicts_with_gemini)
+from src.consolidator import consolidate_locally
+from src.local_extractor import extract_locally, record_extraction
+from src.utils import PeakMemoryMonitor
+from src.cache import hash_file
+from src.metrics import span, increment, propagate
+
+# Documents with less OCR text than this are not sent to Gemini
+MIN_OCR_TEXT_CHARS = 50
+
+# Documents being OCR'd in this process, and how many have started in total. Memory
+# is measured for the whole process, so a document's peak is only its own if no
+# other document was OCR'd at the same time (--ocr_concurrency 1, or by chance).
+_ocr_activity = {'running': 0, 'started': 0}
+_ocr_activity_lock = threading.Lock()
+
+
+@contextmanager
+def _track_ocr():
+    """Yields a dict whose 'alone' is True after the block if no other OCR overlapped it."""
+    with _ocr_activity_lock:
+        state = {'alone': _ocr_activity['running'] == 0}
+        _ocr_activity['running'] += 1
+        _ocr_activity['started'] += 1
+        started = _ocr_activity['started']
+    try:
+        yield state
+    finally:
+        with _ocr_activity_lock:
+            _ocr_activity['running'] -= 1
+            state['alone'] = state['alone'] and _ocr_activity['started'] == started
+
+
+def ocr_document(doc_path: str, ocr_options: dict):
+    """
+    Runs OCR on one document. ocr_options are passed through to process_pdf_and_ocr
+    (temp_dir, workers, page_window, ...).
+    Returns the OCR text, or None if the document is missing or has too little text.
+    """
+    if not os.path.exists(doc_path):
+        logging.warning(f"Document not found, skipping: {doc_path}")
+        return None
+
+    logging.info(f"Running OCR on {doc_path}...")
+    try:
+        # process_pdf_and_ocr needs to handle the Poppler/Image conversion and Tesseract call
+        with _track_ocr() as activity:
+            with span('document.ocr', document=os.path.basename(doc_path)), PeakMemoryMonitor() as memory_monitor:
+                full_ocr_text = process_pdf_and_ocr(doc_path, **ocr_options)
+        if activity['alone']:
+            logging.info(f"  Peak memory during OCR of {doc_path}: {memory_monitor.peak_mb:.1f} MB")
+    except Exception as e:
+        # Catch potential errors during processing one document to allow others to proceed
+        logging.error(f"  Error running OCR on {doc_path}: {e}", exc_info=True)
+        return None
+
+    if not full_ocr_text or len(full_ocr_text.strip()) < MIN_OCR_TEXT_CHARS: # Basic check for sufficient text
+        logging.warning(f"  Could not get enough text from {doc_path} via OCR. Skipping extraction for this document.")
+        return None
+
+    return full_ocr_text
+
+
+def extract_document_locally(doc_path: str, full_ocr_text: str):
+    """Tries the local rule-based extractor. Returns the extraction result, or None if Gemini is needed."""
+    with span('document.extract_local', document=os.path.basename(doc_path)):
+        local_output = extract_locally(full_ocr_text)
+    record_extraction(local=local_output is not None)
+    if local_output is None:
+        return None
+    increment('documents_extracted_total', method='local')
+    logging.info(f"  Local extractor identified document type for {doc_path}: {local_output['document_type']} (Gemini call skipped)")
+    return {'doc_path': doc_path, 'extracted': local_output}
+
+
+def extract_document(doc_path: str, full_ocr_text: str, initial_extraction_prompt: str, local_extraction=True):
+    """
+    Classifies a document and extracts its data from OCR text. Known document types
+    are tried with the local rule-based extractor first; Gemini is used otherwise.
+    Returns {'doc_path': ..., 'extracted': {'document_type': ..., 'data': {...}}} or None.
+    """
+    document_name = os.path.basename(doc_path)
+    if local_extraction:
+        local_result = extract_document_locally(doc_path, full_ocr_text)
+        if local_result is not None:
+            return local_result
+
+    logging.info(f"Sending text of {doc_path} to Gemini for initial processing...")
+    try:
+        # Expect Gemini to return JSON like {'document_type': '...', 'data': {...}}
+        with span('document.extract_gemini', document=document_name):
+            gemini_output = process_document_with_gemini(full_ocr_text, initial_extraction_prompt)
+        increment('documents_extracted_total', method='gemini')
+    except Exception as e:
+        logging.error(f"  Error extracting data from {doc_path}: {e}", exc_info=True)
+        return None
+
+    if gemini_output and isinstance(gemini_output, dict) and 'document_type' in gemini_output and 'data' in gemini_output and isinstance(gemini_output['data'], dict):
+        logging.info(f"  Gemini identified document type for {doc_path}: {gemini_output['document_type']}")
+        logging.info(f"  Gemini extracted initial data: {json.dumps(gemini_output['data'], indent=2)[:500]}...") # Log snippet
+        return {
+            'doc_path': doc_path, # Keep track of the source file
+            'extracted': gemini_output # Store the structured output from Gemini
+        }
+
+    logging.warning(f"  Gemini did not return expected structured output (dict with 'document_type' and 'data' keys) for {doc_path}.")
+    return None
+
+
+def _ocr_with_journal(doc_path: str, ocr_options: dict, journal=None, index=0):
+    """
+    ocr_document, reusing the text recorded in the run journal if the file has not
+    changed since, and recording it otherwise. Failures are not recorded, so a
+    resumed run OCRs the document again.
+    """
+    if journal is None or not os.path.exists(doc_path):
+        return ocr_document(doc_path, ocr_options)
+
+    stage = f"ocr-{index}"
+    file_hash = hash_file(doc_path)
+    entry = journal.load(stage)
+    if entry and entry.get('doc_path') == doc_path and entry.get('sha256') == file_hash and entry.get('text'):
+        logging.info(f"Using OCR text of {doc_path} from the run journal.")
+        increment('journal_stages_reused_total', stage='ocr')
+        return entry['text']
+
+    full_ocr_text = ocr_document(doc_path, ocr_options)
+    if full_ocr_text:
+        journal.save(stage, {'doc_path': doc_path, 'sha256': file_hash, 'text': full_ocr_text})
+    return full_ocr_text
+
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _journaled_extraction(journal, index, doc_path, full_ocr_text):
+    """Returns the extraction result recorded for this document and OCR text, or None."""
+    if journal is None:
+        return None
+    entry = journal.load(f"extract-{index}")
+    if entry and entry.get('doc_path') == doc_path and entry.get('text_sha256') == _text_hash(full_ocr_text):
+        logging.info(f"Using extraction result of {doc_path} from the run journal.")
+        increment('journal_stages_reused_total', stage='extract')
+        return entry['result']
+    return None
+
+
+def _record_extraction(journal, index, doc_path, full_ocr_text, result):
+    if journal is not None and result is not None:
+        journal.save(f"extract-{index}", {'doc_path': doc_path, 'text_sha256': _text_hash(full_ocr_text), 'result': result})
+
+
+def _extract_with_journal(doc_path, full_ocr_text, initial_extraction_prompt, local_extraction=True, journal=None, index=0):
+    """extract_document, reusing or recording the result in the run journal. Failures are not recorded."""
+    result = _journaled_extraction(journal, index, doc_path, full_ocr_text)
+    if result is None:
+        result = extract_document(doc_path, full_ocr_text, initial_extraction_prompt, local_extraction)
+        _record_extraction(journal, index, doc_path, full_ocr_text, result)
+    return result
+
+
+def extract_documents(doc_paths, initial_extraction_prompt: str, ocr_options: dict,
+                      ocr_pool=None, gemini_pool=None, ocr_concurrency=1, gemini_concurrency=2,
+                      local_extraction=True, journal=None):
+    """
+    OCRs and extracts a list of documents as a two-stage pipeline: as soon as a
+    document's OCR finishes, its Gemini call is submitted, so OCR of the next
+    document overlaps with network waits for the previous one.
+
+    Args:
+        doc_paths (list): Paths to the PDF documents.
+        initial_extraction_prompt (str): Prompt for classification and extraction.
+        ocr_options (dict): Keyword arguments for process_pdf_and_ocr.
+        ocr_pool, gemini_pool (Executor, optional): Shared executors to run the two
+            stages on. If not given, pools sized by the concurrency caps are created.
+        ocr_concurrency (int): Maximum documents OCR'd at the same time.
+        gemini_concurrency (int): Maximum Gemini requests in flight at the same time.
+        local_extraction (bool): Try the local rule-based extractor before Gemini.
+        journal (RunJournal, optional): Records each document's OCR text and extraction
+            result, and reuses those of an earlier attempt of the same run.
+
+    Returns:
+        list: Successful extraction results, in the same order as doc_paths.
+    """
+    own_pools = []
+    if ocr_pool is None:
+        ocr_pool = ThreadPoolExecutor(max_workers=ocr_concurrency, thread_name_prefix='ocr')
+        own_pools.append(ocr_pool)
+    if gemini_pool is None:
+        gemini_pool = ThreadPoolExecutor(max_workers=gemini_concurrency, thread_name_prefix='gemini')
+        own_pools.append(gemini_pool)
+
+    try:
+        # propagate() keeps the per-document spans nested under the caller's span
+        ocr_futures = {ocr_pool.submit(propagate(_ocr_with_journal), doc_path, ocr_options, journal, index): index
+                       for index, doc_path in enumerate(doc_paths)}
+        extraction_futures = {}
+
+        for future in as_completed(ocr_futures):
+            index = ocr_futures[future]
+            full_ocr_text = future.result()
+            if full_ocr_text:
+                extraction_futures[index] = gemini_pool.submit(
+                    propagate(_extract_with_journal), doc_paths[index], full_ocr_text, initial_extraction_prompt,
+                    local_extraction, journal, index)
+
+        results = [extraction_futures[index].result() for index in sorted(extraction_futures)]
+        return [result for result in results if result is not None]
+    finally:
+        for pool in own_pools:
+            pool.shutdown(wait=True)
+
+
+def extract_documents_batched(doc_paths, gemini_prompts: dict, ocr_options: dict,
+                              ocr_pool=None, gemini_pool=None, ocr_concurrency=1, gemini_concurrency=2,
+                              local_extraction=True, include_profile=False, journal=None):
+    """
+    Like extract_documents, but the documents the local extractor cannot handle are
+    sent to Gemini together in one request ('batch_extraction' prompt) instead of
+    one request each. If the combined response cannot be split into per-document
+    results, those documents are extracted with one call each as usual.
+
+    With include_profile, Gemini is also asked for the consolidated profile in the
+    same request ('batch_extraction_profile' prompt), which saves the consolidation
+    call. This is only done when every extracted document is in the request.
+    journal is used as in extract_documents.
+
+    Returns:
+        tuple: (successful extraction results in the same order as doc_paths,
+                consolidated profile dict or None).
+    """
+    own_pools = []
+    if ocr_pool is None:
+        ocr_pool = ThreadPoolExecutor(max_workers=ocr_concurrency, thread_name_prefix='ocr')
+        own_pools.append(ocr_pool)
+    if gemini_pool is None:
+        gemini_pool = ThreadPoolExecutor(max_workers=gemini_concurrency, thread_name_prefix='gemini')
+        own_pools.append(gemini_pool)
+
+    try:
+        ocr_futures = [ocr_pool.submit(propagate(_ocr_with_journal), doc_path, ocr_options, journal, index)
+                       for index, doc_path in enumerate(doc_paths)]
+        results = [None] * len(doc_paths)
+        ocr_texts = {}
+        pending = []  # Indexes of documents that need Gemini
+        for index, future in enumerate(ocr_futures):
+            full_ocr_text = future.result()
+            if not full_ocr_text:
+                continue
+            ocr_texts[index] = full_ocr_text
+            results[index] = _journaled_extraction(journal, index, doc_paths[index], full_ocr_text)
+            if results[index] is None and local_extraction:
+                results[index] = extract_document_locally(doc_paths[index], full_ocr_text)
+            if results[index] is None:
+                pending.append((index, full_ocr_text))
+
+        profile = None
+        if len(pending) > 1:
+            profile_prompt = None
+            if include_profile and not any(results):
+                profile_prompt = gemini_prompts.get('batch_extraction_profile')
+            with span('documents.extract_gemini_batch', documents=len(pending)):
+                extracted, profile = gemini_pool.submit(
+                    propagate(process_documents_with_gemini), [text for _, text in pending],
+                    gemini_prompts['batch_extraction'], profile_prompt).result()
+
+            if extracted is not None:
+                for (index, _), document_output in zip(pending, extracted):
+                    logging.info(f"  Gemini identified document type for {doc_paths[index]}: {document_output['document_type']} (batched request)")
+                    results[index] = {'doc_path': doc_paths[index], 'extracted': document_output}
+                increment('documents_extracted_total', len(pending), method='gemini_batch')
+                pending = []
+            else:
+                increment('batch_extraction_fallbacks_total')
+                logging.warning(f"  Batched extraction failed; extracting {len(pending)} documents with one Gemini call each.")
+
+        # Single documents, and documents of a failed batched request, get a call each
+        fallback_futures = {index: gemini_pool.submit(propagate(extract_document), doc_paths[index], full_ocr_text,
+                                                      gemini_prompts['initial_extraction'], False)
+                            for index, full_ocr_text in pending}
+        for index, future in fallback_futures.items():
+            results[index] = future.result()
+
+        for index, full_ocr_text in ocr_texts.items():
+            _record_extraction(journal, index, doc_paths[index], full_ocr_text, results[index])
+
+        return [result for result in results if result is not None], profile
+    finally:
+        for pool in own_pools:
+            pool.shutdown(wait=True)
+
+
+def consolidate_documents(extracted_document_results, consolidation_prompt: str, conflict_prompt=None,
+                          local_consolidation=True):
+    """
+    Merges per-document extraction results into a single profile.
+
+    With local_consolidation, source-priority rules merge the documents without a
+    network call, and only fields that genuinely conflict are sent to Gemini using
+    conflict_prompt. Otherwise (or without a conflict prompt) the whole list is
+    consolidated by Gemini.
+    Returns the consolidated dict, or None if consolidation failed.
+    """
+    if local_consolidation and conflict_prompt:
+        logging.info(f"Consolidating data from {len(extracted_document_results)} documents locally...")
+        with span('consolidate', method='local'):
+            consolidated_data = consolidate_locally(
+                extracted_document_results,
+                resolve_conflicts=lambda conflicts: resolve_conflicts_with_gemini(conflicts, conflict_prompt))
+    else:
+        if local_consolidation:
+            logging.warning("No 'conflict_resolution' prompt configured; consolidating with Gemini instead.")
+        logging.info(f"Consolidating data from {len(extracted_document_results)} documents using Gemini...")
+        with span('consolidate', method='gemini'):
+            consolidated_data = consolidate_data_with_gemini(extracted_document_results, consolidation_prompt)
+
+    if not consolidated_data or not isinstance(consolidated_data, dict):
+        logging.error("Failed to consolidate data or consolidation returned invalid format.")
+        return None
+    return consolidated_data
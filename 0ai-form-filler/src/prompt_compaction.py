@@ -0,0 +1,143 @@
+import re
+import json
+from src.local_extractor import (PAN_PATTERN, AADHAAR_PATTERN, IFSC_PATTERN, DATE_PATTERN, ACCOUNT_PATTERN,
+                                 GENDER_PATTERN, PAN_KEYWORDS, AADHAAR_KEYWORDS, PASSBOOK_KEYWORDS)
+
+# Shrinks what is sent to Gemini without losing what the prompts ask for: OCR text
+# is cleaned up line by line and page by page, structured data is serialized without
+# indentation or empty values. Token counts are estimated from characters here; the
+# model's own counter is used by gemini_processor when a prompt nears its budget.
+
+# Average characters per token of OCR'd English text with many digits (on the safe side)
+CHARS_PER_TOKEN = 3.5
+
+# Page marker written by process_pdf_and_ocr
+PAGE_MARKER_PATTERN = re.compile(r'^\[--- Page (\d+) ---\]$', re.MULTILINE)
+
+# Lines with fewer letters/digits than this are Tesseract noise ('|', '~ _', '. ,')
+MIN_LINE_ALNUM = 2
+
+# Share of a line's non-space characters that must be letters/digits
+MIN_LINE_ALNUM_RATIO = 0.5
+
+# Page footers ('Page 2 of 3', '- 2 -') carry nothing the prompts need
+PAGE_NUMBER_LINE_PATTERN = re.compile(r'^(?:page\s*\d+(?:\s*of\s*\d+)?|-\s*\d{1,3}\s*-)$', re.IGNORECASE)
+
+# A bare number is only taken for a page number as a page's first or last line;
+# elsewhere it may be a house or flat number printed on its own line
+BARE_PAGE_NUMBER_PATTERN = re.compile(r'^\d{1,3}$')
+
+# Stray OCR characters at the start or end of a line (table borders, scan specks)
+EDGE_NOISE_CHARACTERS = ' |~_`\'"'
+
+# Words that make a page worth sending even when no ID pattern matches
+RELEVANT_WORDS = ('NAME', 'BIRTH', 'DOB', 'ADDRESS', 'GENDER', 'FATHER', 'MOBILE', 'PHONE', 'EMAIL', 'BANK')
+RELEVANT_PATTERNS = (PAN_PATTERN, AADHAAR_PATTERN, IFSC_PATTERN, DATE_PATTERN, ACCOUNT_PATTERN, GENDER_PATTERN)
+RELEVANT_KEYWORDS = PAN_KEYWORDS + AADHAAR_KEYWORDS + PASSBOOK_KEYWORDS + RELEVANT_WORDS
+
+
+def estimate_tokens(text):
+    """Returns an approximate token count of text."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def _split_pages(ocr_text):
+    """Returns [(page number or None, page text), ...] split at the page markers."""
+    markers = list(PAGE_MARKER_PATTERN.finditer(ocr_text))
+    if not markers:
+        return [(None, ocr_text)]
+    pages = []
+    for index, marker in enumerate(markers):
+        end = markers[index + 1].start() if index + 1 < len(markers) else len(ocr_text)
+        pages.append((int(marker.group(1)), ocr_text[marker.end():end]))
+    return pages
+
+
+def _is_noise(line):
+    alnum = sum(character.isalnum() for character in line)
+    return alnum < MIN_LINE_ALNUM or alnum < MIN_LINE_ALNUM_RATIO * len(line.replace(' ', ''))
+
+
+def _is_relevant(page_text):
+    upper_text = page_text.upper()
+    return (any(keyword in upper_text for keyword in RELEVANT_KEYWORDS)
+            or any(pattern.search(page_text) for pattern in RELEVANT_PATTERNS))
+
+
+def _clean_page_lines(page_text):
+    """Returns the page's lines with whitespace collapsed, and noise and page numbers dropped."""
+    lines = []
+    for line in page_text.splitlines():
+        line = ' '.join(line.split()).strip(EDGE_NOISE_CHARACTERS)
+        if line and not _is_noise(line) and not PAGE_NUMBER_LINE_PATTERN.match(line):
+            lines.append(line)
+    if lines and BARE_PAGE_NUMBER_PATTERN.match(lines[-1]):
+        lines.pop()
+    if lines and BARE_PAGE_NUMBER_PATTERN.match(lines[0]):
+        lines.pop(0)
+    return lines
+
+
+def compact_ocr_text(ocr_text):
+    """
+    Returns a smaller version of OCR text for a prompt:
+      * whitespace runs are collapsed and blank lines dropped;
+      * noise lines (mostly punctuation, single characters) and page numbers are dropped;
+      * pages with no identity keywords, ID numbers or dates are dropped, unless no page has any;
+      * a line seen before (repeated headers and footers, duplicated blocks) is kept only once;
+      * page markers are shortened to '[Page N]'.
+    Relevance is judged on each page's own lines, before lines repeated from earlier
+    pages are removed.
+    """
+    pages = []
+    for page_number, page_text in _split_pages(ocr_text):
+        lines = _clean_page_lines(page_text)
+        if lines:
+            pages.append((page_number, lines))
+
+    relevant_pages = [page for page in pages if _is_relevant("\n".join(page[1]))]
+    if relevant_pages:
+        pages = relevant_pages
+
+    compacted = []
+    seen_lines = set()
+    for page_number, lines in pages:
+        unique_lines = []
+        for line in lines:
+            key = line.lower()
+            if key not in seen_lines:
+                seen_lines.add(key)
+                unique_lines.append(line)
+        if unique_lines:
+            compacted.append((page_number, "\n".join(unique_lines)))
+
+    if len(compacted) == 1 and compacted[0][0] in (None, 1):
+        return compacted[0][1]
+    return "\n".join(page_text if page_number is None else f"[Page {page_number}]\n{page_text}"
+                     for page_number, page_text in compacted)
+
+
+def truncate_text(text, max_chars):
+    """Cuts text to at most max_chars, at a line break where possible."""
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    return text[:cut if cut > max_chars // 2 else max_chars]
+
+
+def _without_empty_values(value):
+    if isinstance(value, dict):
+        return {key: _without_empty_values(item) for key, item in value.items() if item not in (None, '', [], {})}
+    if isinstance(value, list):
+        return [_without_empty_values(item) for item in value]
+    return value
+
+
+def compact_json(data):
+    """Serializes data without indentation, spaces or empty values."""
+    return json.dumps(_without_empty_values(data), separators=(',', ':'), ensure_ascii=False)
+
+
+def extraction_results_for_prompt(extracted_document_results):
+    """Returns the extraction results without their local file paths, which Gemini does not need."""
+    return [result.get('extracted', result) for result in extracted_document_results]
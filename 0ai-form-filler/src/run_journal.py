@@ -0,0 +1,125 @@
+import os
+import re
+import json
+import logging
+import shutil
+import secrets
+import tempfile
+from datetime import datetime
+
+# A run journal records the progress of one run: each stage's output (per-document
+# OCR text and extraction, the consolidated profile, ...) is written to its own JSON
+# file as soon as it completes. Unlike the OCR and Gemini caches, which are shared
+# across runs, it lets one interrupted run continue where it stopped (--resume).
+# Journals hold OCR text and applicant profiles, so a run's journal is deleted once
+# the run completes, apart from the newest --keep_runs completed runs.
+
+METADATA_FILE = 'run.json'
+
+
+def _stage_filename(stage):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', stage) + '.json'
+
+
+class RunJournal:
+    """
+    Directory of atomically written stage results for one run (or, via scope(), for
+    one applicant of a batch run).
+
+        journal = RunJournal.create('.runs/', {'documents': [...]})
+        text = journal.load('ocr-0')
+        if text is None:
+            journal.save('ocr-0', run_ocr())
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def run_id(self):
+        return os.path.basename(os.path.normpath(self.directory))
+
+    @classmethod
+    def create(cls, journal_dir, metadata):
+        """Starts a new run with a fresh id and records its metadata (inputs, options)."""
+        run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+        journal = cls(os.path.join(journal_dir, run_id))
+        journal.save_metadata(dict(metadata, run_id=run_id, created=datetime.now().isoformat(timespec='seconds')))
+        return journal
+
+    @classmethod
+    def open(cls, journal_dir, run_id):
+        """Opens the journal of an earlier run. Raises FileNotFoundError if there is none."""
+        directory = os.path.join(journal_dir, run_id)
+        if not os.path.isfile(os.path.join(directory, METADATA_FILE)):
+            raise FileNotFoundError(f"No run journal '{run_id}' in {journal_dir}")
+        return cls(directory)
+
+    def _write(self, filename, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.directory, filename))
+
+    def _read(self, filename):
+        try:
+            with open(os.path.join(self.directory, filename), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable journal entry {filename} in {self.directory}: {e}")
+            return None
+
+    @property
+    def metadata(self):
+        return self._read(METADATA_FILE) or {}
+
+    def save_metadata(self, metadata):
+        self._write(METADATA_FILE, metadata)
+
+    def complete(self):
+        """Marks the run as completed, making its journal eligible for prune_run_journals()."""
+        self.save_metadata(dict(self.metadata, completed=datetime.now().isoformat(timespec='seconds')))
+
+    def load(self, stage):
+        """Returns the recorded output of a stage, or None if it has not completed."""
+        entry = self._read(_stage_filename(stage))
+        return entry['value'] if isinstance(entry, dict) and 'value' in entry else None
+
+    def save(self, stage, value):
+        """Records the output of a completed stage. A failed write is logged, not raised."""
+        try:
+            self._write(_stage_filename(stage), {'stage': stage, 'completed': datetime.now().isoformat(timespec='seconds'),
+                                                 'value': value})
+        except (OSError, TypeError) as e:
+            logging.warning(f"Could not write journal entry '{stage}' to {self.directory}: {e}")
+
+    def scope(self, name):
+        """Returns a journal in a sub-directory, e.g. for one applicant of a batch."""
+        return RunJournal(os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_.-]', '_', str(name))))
+
+
+def prune_run_journals(journal_dir, keep=0):
+    """
+    Deletes the journals of completed runs in journal_dir, apart from the newest keep.
+    Interrupted runs are left for --resume. Returns the number of journals deleted.
+    """
+    completed = []
+    for run_id in os.listdir(journal_dir) if os.path.isdir(journal_dir) else []:
+        directory = os.path.join(journal_dir, run_id)
+        if os.path.isdir(directory):
+            completed_at = RunJournal(directory).metadata.get('completed')
+            if completed_at:
+                completed.append((completed_at, directory))
+
+    completed.sort(reverse=True)
+    deleted = 0
+    for _, directory in completed[max(0, keep):]:
+        try:
+            shutil.rmtree(directory)
+            deleted += 1
+        except OSError as e:
+            logging.warning(f"Could not delete run journal {directory}: {e}")
+    return deleted
@@ -1,5 +1,6 @@
 import logging
 import time
+import threading
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select # Import Select
@@ -7,18 +8,126 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager # Use Chrome for example
 from selenium.webdriver.chrome.service import Service as ChromeService
+from src.metrics import span, increment
+from src.fill_plan import compile_form_plan, resolve_fill_plan, plan_fill_values
 
+# Fills every field of a form in a single WebDriver round trip. Values are set through
+# the native value setters and followed by bubbling 'input' and 'change' events, so
+# React-controlled inputs pick them up. Returns {locator: {status, tag, type}}; status
+# is 'filled', 'not_found', 'not_interactable', 'rejected', 'no_option', 'unsupported'
+# or 'error'.
+BATCH_FILL_SCRIPT = """
+const plan = arguments[0];
+const report = {};
+const setters = {
+    INPUT: Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set,
+    TEXTAREA: Object.getOwnPropertyDescriptor(HTMLTextAreaElement.prototype, 'value').set,
+    SELECT: Object.getOwnPropertyDescriptor(HTMLSelectElement.prototype, 'value').set,
+};
+const textTypes = ['text', 'password', 'email', 'tel', 'number', 'date', 'search', 'url'];
 
-def get_browser_driver():
-    """Initializes and returns a Selenium WebDriver."""
+function toIsoDate(value) {
+    const match = /^(\\d{2})[\\/.-](\\d{2})[\\/.-](\\d{4})$/.exec(value);
+    return match ? match[3] + '-' + match[2] + '-' + match[1] : value;
+}
+
+for (const [locator, value] of plan) {
+    let element;
+    try {
+        element = document.querySelector(locator);
+    } catch (error) {
+        report[locator] = {status: 'error', detail: String(error)};
+        continue;
+    }
+    if (!element) {
+        report[locator] = {status: 'not_found'};
+        continue;
+    }
+
+    const tag = element.tagName;
+    const type = (element.getAttribute('type') || (tag === 'INPUT' ? 'text' : '')).toLowerCase();
+    if (!element.getClientRects().length || element.disabled || element.readOnly) {
+        report[locator] = {status: 'not_interactable', tag: tag, type: type};
+        continue;
+    }
+
+    try {
+        if (tag === 'SELECT') {
+            const wanted = value.trim().toLowerCase();
+            const options = Array.from(element.options);
+            const option = options.find(o => o.value === value)
+                || options.find(o => o.value.toLowerCase() === wanted || o.text.trim().toLowerCase() === wanted);
+            if (!option) {
+                report[locator] = {status: 'no_option', tag: tag, type: type};
+                continue;
+            }
+            setters.SELECT.call(element, option.value);
+        } else if (tag === 'TEXTAREA' || (tag === 'INPUT' && textTypes.includes(type))) {
+            const text = type === 'date' ? toIsoDate(value) : value;
+            setters[tag].call(element, text);
+            if (element.value !== text) {
+                report[locator] = {status: 'rejected', tag: tag, type: type};
+                continue;
+            }
+        } else {
+            report[locator] = {status: 'unsupported', tag: tag, type: type};
+            continue;
+        }
+        element.dispatchEvent(new Event('input', {bubbles: true}));
+        element.dispatchEvent(new Event('change', {bubbles: true}));
+        report[locator] = {status: 'filled', tag: tag, type: type};
+    } catch (error) {
+        report[locator] = {status: 'error', tag: tag, type: type, detail: String(error)};
+    }
+}
+return report;
+"""
+
+# Batched fill results that are final; any other status is retried with per-field calls
+BATCH_FINAL_STATUSES = ('filled', 'not_found', 'unsupported')
+
+# (tag, input type) of each fill plan element kind, so per-field fills need not query them
+KIND_ELEMENTS = {
+    'text': ('input', 'text'),
+    'number': ('input', 'number'),
+    'date': ('input', 'date'),
+    'textarea': ('textarea', None),
+    'select': ('select', None),
+}
+
+
+# Path of the chromedriver binary, resolved once per process
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def get_driver_path():
+    """
+    Returns the chromedriver path from webdriver-manager. The lookup checks the
+    installed Chrome version and may hit the network, so it is done only once.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def get_browser_driver(headless=False):
+    """
+    Initializes and returns a Selenium WebDriver. The browser is visible for user
+    review unless headless is set (batch runs, benchmarks).
+    """
     try:
         # Use webdriver-manager to handle driver download/setup
-        service = ChromeService(ChromeDriverManager().install())
+        service = ChromeService(get_driver_path())
 
-        # Configure Chrome options - ensure it's NOT headless for user review
         options = webdriver.ChromeOptions()
-        # options.add_argument('--headless') # REMOVE THIS LINE FOR VISIBLE BROWSER
-        options.add_argument('--start-maximized') # Optional: Start browser maximized
+        if headless:
+            options.add_argument('--headless=new')
+            options.add_argument('--window-size=1920,1080')
+        else:
+            options.add_argument('--start-maximized') # Optional: Start browser maximized
         # options.add_argument('--incognito') # Optional: Use incognito mode
 
         driver = webdriver.Chrome(service=service, options=options)
@@ -30,111 +139,196 @@ def get_browser_driver():
         logging.error("Please ensure Chrome browser is installed and the driver is compatible or install manually.")
         logging.error("webdriver_manager attempts to manage this, but manual intervention may be needed.")
         return None
+    except Exception as e:
+        # webdriver_manager raises its own errors, e.g. when offline and no driver is cached
+        logging.error(f"Failed to set up the Chrome driver: {e}")
+        return None
 
 
-def fill_online_form(form_name, data_to_fill, form_mappings, timeout=20):
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait, Select
-    from selenium.webdriver.support import expected_conditions as EC
-    from selenium.common.exceptions import NoSuchElementException, TimeoutException
-    import logging
+def _fill_field(driver, field_locator, value_to_fill_str, kind=None):
+    """
+    Fills one form field with per-field WebDriver calls. kind comes from the fill
+    plan; if it is unknown, the element's tag and type are read from the page.
+    Returns a status: 'filled', 'not_found', 'timeout', 'unsupported' or 'error'.
+    """
+    try:
+        element = WebDriverWait(driver, 5).until(
+            EC.visibility_of_element_located((By.CSS_SELECTOR, field_locator))
+        )
+        WebDriverWait(driver, 2).until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, field_locator))
+        )
 
-    driver = None
+        if kind in KIND_ELEMENTS:
+            tag_name, input_type = KIND_ELEMENTS[kind]
+        else:
+            tag_name = element.tag_name.lower()
+            input_type = element.get_attribute('type')
 
-    if form_name not in form_mappings or 'url' not in form_mappings[form_name]:
-        logging.error(f"Form '{form_name}' not found in mappings or missing 'url'. Cannot proceed with form filling.")
-        return None
+        if tag_name == 'input' and input_type in ('text', 'password', 'email', 'tel', 'number', 'date'):
+            logging.debug(f"  Attempting to fill input field '{field_locator}' of type '{input_type}'...")
+
+            if input_type == "date":
+                driver.execute_script("""
+                    arguments[0].value = arguments[1];
+                    arguments[0].dispatchEvent(new Event('input', { bubbles: true }));
+                """, element, value_to_fill_str)
+                logging.info(f"  Set date field '{field_locator}' with '{value_to_fill_str}' using JS.")
+            else:
+                element.clear()
+                element.send_keys(value_to_fill_str)
+                logging.info(f"  Filled text field '{field_locator}' with '{value_to_fill_str}'.")
+
+        elif tag_name == 'textarea':
+            element.clear()
+            element.send_keys(value_to_fill_str)
+            logging.info(f"  Filled textarea '{field_locator}' with '{value_to_fill_str}'.")
+
+        elif tag_name == 'select':
+            select_element = Select(element)
+            try:
+                select_element.select_by_value(value_to_fill_str)
+                logging.info(f"  Selected dropdown '{field_locator}' by value '{value_to_fill_str}'.")
+            except NoSuchElementException:
+                select_element.select_by_visible_text(value_to_fill_str)
+                logging.info(f"  Selected dropdown '{field_locator}' by visible text '{value_to_fill_str}'.")
+
+        else:
+            logging.warning(f"  Field '{field_locator}' is a <{tag_name}> type='{input_type}'. Unsupported field type. Skipping.")
+            return 'unsupported'
+
+        return 'filled'
+
+    except NoSuchElementException:
+        logging.warning(f"  Could not find element with locator: {field_locator}. Skipping.")
+        return 'not_found'
+    except TimeoutException:
+        logging.warning(f"  Timeout waiting for element with locator: {field_locator}. Skipping.")
+        return 'timeout'
+    except Exception as e:
+        logging.error(f"  An error occurred filling field '{field_locator}': {e}", exc_info=True)
+        return 'error'
 
-    form_url = form_mappings[form_name]['url']
-    field_mappings = {k: v for k, v in form_mappings[form_name].items() if k != 'url'}
 
+def _fill_fields_batched(driver, plan):
+    """
+    Fills all fields of plan ({locator: value}) with one execute_script call.
+    Returns ({locator: value} for the fields the script could not handle, which
+    should be retried with per-field WebDriver calls, {locator: status} of the others).
+    """
     try:
-        driver = get_browser_driver()
-        if driver is None:
-            return None
+        with span('form.batch_fill', fields=len(plan)):
+            report = driver.execute_script(BATCH_FILL_SCRIPT, list(plan.items())) or {}
+    except Exception as e:
+        logging.warning(f"  Batched form fill failed, falling back to per-field filling: {e}")
+        return dict(plan), {}
 
-        logging.info(f"Navigating to URL: {form_url}")
-        driver.get(form_url)
+    fallback = {}
+    statuses = {}
+    for field_locator, value in plan.items():
+        result = report.get(field_locator) or {'status': 'error'}
+        status = result.get('status')
+        if status not in BATCH_FINAL_STATUSES:
+            logging.info(f"  Batched fill could not set '{field_locator}' ({status}); retrying with WebDriver calls.")
+            fallback[field_locator] = value
+            continue
 
-        if field_mappings:
-            first_locator = list(field_mappings.keys())[0]
-            logging.info(f"Waiting for key element '{first_locator}' to be visible and clickable...")
-            WebDriverWait(driver, timeout).until(EC.element_to_be_clickable((By.CSS_SELECTOR, first_locator)))
+        increment('form_fields_total', status=status, method='batch')
+        statuses[field_locator] = status
+        if status == 'filled':
+            logging.info(f"  Filled <{result.get('tag', '').lower()}> '{field_locator}' with '{value}'.")
+        elif status == 'not_found':
+            logging.warning(f"  Could not find element with locator: {field_locator}. Skipping.")
         else:
-            WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
+            logging.warning(f"  Field '{field_locator}' is a <{result.get('tag', '').lower()}> type='{result.get('type')}'. Unsupported field type. Skipping.")
+    return fallback, statuses
+
+
+def fill_online_form(form_name, data_to_fill, form_mappings, timeout=20, headless=False, batch_fill=True, driver=None,
+                     plan=None, plan_cache=None):
+    """
+    Opens the form and fills the mapped fields from data_to_fill. With batch_fill,
+    all values are set in one JavaScript call and per-field WebDriver calls are
+    only used for fields the script could not handle.
+
+    plan is the form's compiled fill plan (compiled from form_mappings if not
+    given). Element kinds are resolved once per page layout and cached in
+    plan_cache (a DiskCache), if given.
+
+    If driver is given (e.g. leased from a BrowserPool) it is used instead of
+    launching a new browser, and is never quit here.
+    Returns (driver left open for review, or None on failure, field report). The
+    field report maps each field locator that had a value to its fill status:
+    'filled', 'not_found', 'unsupported', 'timeout' or 'error'.
+    """
+    own_driver = driver is None
+    field_report = {}
+
+    if plan is None:
+        try:
+            plan = compile_form_plan(form_name, form_mappings)
+        except ValueError as e:
+            logging.error(f"{e}. Cannot proceed with form filling.")
+            return None, field_report
+
+    form_url = plan['url']
+
+    try:
+        if own_driver:
+            with span('form.browser_start'):
+                driver = get_browser_driver(headless=headless)
+            if driver is None:
+                return None, field_report
+
+        logging.info(f"Navigating to URL: {form_url}")
+        with span('form.page_load', form=form_name):
+            driver.get(form_url)
+
+            if plan['fields']:
+                first_locator = plan['fields'][0]['locator']
+                logging.info(f"Waiting for key element '{first_locator}' to be visible and clickable...")
+                WebDriverWait(driver, timeout).until(EC.element_to_be_clickable((By.CSS_SELECTOR, first_locator)))
+            else:
+                WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
 
         logging.info("Page loaded or key element found.")
+        # Without a resolved plan every field goes through the batch script, which checks element types itself
+        plan = resolve_fill_plan(driver, plan, plan_cache) or plan
         logging.info("Starting to fill form fields...")
 
-        for field_locator, data_key in field_mappings.items():
-            if data_key in data_to_fill:
-                value_to_fill = data_to_fill[data_key]
-                logging.info(f"  Attempting to fill field '{field_locator}' with data key '{data_key}' = '{value_to_fill}'")
-
-                if value_to_fill is None or value_to_fill == "":
-                    logging.debug(f"  Skipping empty value for field '{field_locator}' (data key: '{data_key}').")
-                    continue
-
-                value_to_fill_str = str(value_to_fill)
-
-                try:
-                    element = WebDriverWait(driver, 5).until(
-                        EC.visibility_of_element_located((By.CSS_SELECTOR, field_locator))
-                    )
-                    WebDriverWait(driver, 2).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, field_locator))
-                    )
-
-                    tag_name = element.tag_name.lower()
-                    input_type = element.get_attribute('type')
-
-                    if tag_name == 'input' and input_type in ('text', 'password', 'email', 'tel', 'number', 'date'):
-                        logging.debug(f"  Attempting to fill input field '{field_locator}' of type '{input_type}'...")
-
-                        if input_type == "date":
-                            driver.execute_script("""
-                                arguments[0].value = arguments[1];
-                                arguments[0].dispatchEvent(new Event('input', { bubbles: true }));
-                            """, element, value_to_fill_str)
-                            logging.info(f"  Set date field '{field_locator}' with '{value_to_fill_str}' using JS.")
-                        else:
-                            element.clear()
-                            element.send_keys(value_to_fill_str)
-                            logging.info(f"  Filled text field '{field_locator}' with '{value_to_fill_str}'.")
-
-                    elif tag_name == 'textarea':
-                        element.clear()
-                        element.send_keys(value_to_fill_str)
-                        logging.info(f"  Filled textarea '{field_locator}' with '{value_to_fill_str}'.")
-
-                    elif tag_name == 'select':
-                        select_element = Select(element)
-                        try:
-                            select_element.select_by_value(value_to_fill_str)
-                            logging.info(f"  Selected dropdown '{field_locator}' by value '{value_to_fill_str}'.")
-                        except NoSuchElementException:
-                            select_element.select_by_visible_text(value_to_fill_str)
-                            logging.info(f"  Selected dropdown '{field_locator}' by visible text '{value_to_fill_str}'.")
-
-                    else:
-                        logging.warning(f"  Field '{field_locator}' is a <{tag_name}> type='{input_type}'. Unsupported field type. Skipping.")
-
-                except NoSuchElementException:
-                    logging.warning(f"  Could not find element with locator: {field_locator}. Skipping.")
-                except TimeoutException:
-                    logging.warning(f"  Timeout waiting for element with locator: {field_locator}. Skipping.")
-                except Exception as e:
-                    logging.error(f"  An error occurred filling field '{field_locator}': {e}", exc_info=True)
-            else:
-                logging.warning(f"  Data key '{data_key}' not found in extracted data. Skipping field '{field_locator}'.")
+        with span('form.fill', form=form_name, fields=len(plan['fields'])):
+            batch_plan = {}
+            remaining_fields = {}
+            kinds = {}
+            for field, value_to_fill_str in plan_fill_values(plan, data_to_fill):
+                field_locator = field['locator']
+                kinds[field_locator] = field.get('kind')
+                logging.info(f"  Attempting to fill field '{field_locator}' with data key '{field['data_key']}' = '{value_to_fill_str}'")
+                if batch_fill and field.get('strategy', 'batch') == 'batch':
+                    batch_plan[field_locator] = value_to_fill_str
+                else:
+                    remaining_fields[field_locator] = value_to_fill_str
+
+            if batch_plan:
+                fallback_fields, field_report = _fill_fields_batched(driver, batch_plan)
+                remaining_fields.update(fallback_fields)
+            for field_locator, value_to_fill_str in remaining_fields.items():
+                with span('form.field', field=field_locator):
+                    status = _fill_field(driver, field_locator, value_to_fill_str, kinds.get(field_locator))
+                increment('form_fields_total', status=status, method='per_field')
+                field_report[field_locator] = status
 
+        failed_fields = [field_locator for field_locator, status in field_report.items() if status != 'filled']
+        if failed_fields:
+            logging.warning(f"Could not fill {len(failed_fields)} of {len(field_report)} fields: {', '.join(failed_fields)}")
         logging.info("Finished attempting to fill all mapped fields.")
-        return driver
+        return driver, field_report
 
     except Exception as e:
         logging.error(f"An unexpected error occurred during form filling: {e}", exc_info=True)
         print("\n>>> An unexpected error occurred during form filling. Check logs above.")
-        input(">>> Press Enter to close the browser...")
-        if driver:
+        if not headless:
+            input(">>> Press Enter to close the browser...")
+        if driver and own_driver:
             driver.quit()
-        return None
+        return None, field_report
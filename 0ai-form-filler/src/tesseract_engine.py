@@ -0,0 +1,128 @@
+import logging
+import threading
+from PIL import Image  # Part of Pillow
+from src.metrics import span, increment
+from src.option_defaults import OCR_ENGINES
+
+# In-process Tesseract through tesserocr (optional dependency: pip install tesserocr).
+# pytesseract writes every page to a temporary image file and starts a tesseract
+# process that loads the language model again for each page. Here each thread (and
+# so each OCR worker process) keeps one engine with the model loaded, and page
+# images are handed over as raw pixel buffers, without PNG encoding or disk writes.
+# When tesserocr is not installed, pdf_ocr falls back to pytesseract.
+
+_requested_engine = 'auto'
+_resolved_engine = None
+_engines = threading.local()
+
+
+def tesserocr_available():
+    """Returns True if tesserocr can be imported."""
+    try:
+        import tesserocr  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def set_ocr_engine(name='auto'):
+    """
+    Selects the OCR engine: 'tesserocr', 'pytesseract', or 'auto' (tesserocr when it
+    is installed). Also used as the initializer of OCR worker processes.
+    """
+    global _requested_engine, _resolved_engine
+    if name not in OCR_ENGINES:
+        raise ValueError(f"Unknown OCR engine '{name}'; expected one of {', '.join(OCR_ENGINES)}")
+    _requested_engine = name
+    _resolved_engine = None
+
+
+def get_ocr_engine():
+    """Returns the engine name as requested, possibly 'auto'."""
+    return _requested_engine
+
+
+def resolve_ocr_engine():
+    """Returns the engine actually used, 'tesserocr' or 'pytesseract'."""
+    global _resolved_engine
+    if _resolved_engine is None:
+        if _requested_engine == 'pytesseract':
+            _resolved_engine = 'pytesseract'
+        elif tesserocr_available():
+            _resolved_engine = 'tesserocr'
+        else:
+            if _requested_engine == 'tesserocr':
+                logging.warning("tesserocr is not installed (pip install tesserocr); falling back to pytesseract.")
+            _resolved_engine = 'pytesseract'
+        logging.debug(f"OCR engine: {_resolved_engine}")
+    return _resolved_engine
+
+
+def tesserocr_version():
+    """Returns the version of the Tesseract library tesserocr is linked against, e.g. '5.3.0'."""
+    import tesserocr
+    # tesseract_version() returns e.g. 'tesseract 5.3.0\n leptonica-1.82.0\n ...'
+    return tesserocr.tesseract_version().split()[1]
+
+
+def _get_api(lang):
+    """Returns this thread's engine for lang, loading the language model on first use."""
+    api = getattr(_engines, 'api', None)
+    if api is None or _engines.lang != lang:
+        import tesserocr
+        if api is not None:
+            api.End()
+        with span('ocr.engine_load', lang=lang):
+            api = tesserocr.PyTessBaseAPI(lang=lang)
+        increment('ocr_engine_loads_total')
+        _engines.api, _engines.lang = api, lang
+    return api
+
+
+def _set_image(api, image: Image.Image):
+    """Passes the image's pixel buffer to Tesseract as it is in memory."""
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('L' if image.mode in ('1', 'LA', 'I', 'F') else 'RGB')
+    bytes_per_pixel = 1 if image.mode == 'L' else 3
+    api.SetImageBytes(image.tobytes(), image.width, image.height, bytes_per_pixel, bytes_per_pixel * image.width)
+
+
+def image_to_string(image: Image.Image, lang, psm=None, whitelist=None):
+    """
+    Performs OCR with this thread's engine. Returns the stripped text. psm and
+    whitelist apply to this call only; the engine's defaults are restored after it.
+    """
+    import tesserocr
+    api = _get_api(lang)
+    if psm is not None:
+        api.SetPageSegMode(psm)
+    if whitelist:
+        api.SetVariable('tessedit_char_whitelist', whitelist)
+    _set_image(api, image)
+    try:
+        return api.GetUTF8Text().strip()
+    finally:
+        api.Clear()
+        if psm is not None:
+            api.SetPageSegMode(tesserocr.PSM.AUTO)
+        if whitelist:
+            api.SetVariable('tessedit_char_whitelist', '')
+
+
+def image_to_text_and_confidence(image: Image.Image, lang):
+    """
+    Performs OCR with this thread's engine. Returns (text, mean word confidence 0-100);
+    lines are returned with their words separated by single spaces, as pdf_ocr does
+    for the pytesseract path.
+    """
+    api = _get_api(lang)
+    _set_image(api, image)
+    try:
+        raw_text = api.GetUTF8Text()
+        confidences = [confidence for confidence in api.AllWordConfidences() if confidence >= 0]
+    finally:
+        api.Clear()
+
+    text = "\n".join(" ".join(line.split()) for line in raw_text.splitlines() if line.strip())
+    mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, float(mean_confidence)
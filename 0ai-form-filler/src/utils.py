@@ -1,6 +1,7 @@
 import yaml
 import os
 import logging
+import threading
 
 def load_config(filepath):
     """Loads configuration from a YAML file."""
@@ -28,4 +29,68 @@ def cleanup_temp_dir(temp_dir):
                     pass # For this prototype, assuming flat temp dir
             except Exception as e:
                 logging.warning(f"Failed to delete {file_path}. Reason: {e}")
-        logging.info(f"Cleaned up temporary directory: {temp_dir}")
\ No newline at end of file
+        logging.info(f"Cleaned up temporary directory: {temp_dir}")
+
+def get_current_rss_bytes():
+    """Returns the resident memory of this process in bytes, or 0 if it cannot be measured."""
+    try:
+        # Linux: second field of statm is the resident set size in pages
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        # Other Unix systems only expose the high-water mark (KB on Linux, bytes on macOS)
+        import resource
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+    except (ImportError, OSError):
+        return 0
+
+def percentile(values, fraction):
+    """Returns the given percentile (0.0-1.0) of a list of numbers using linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class PeakMemoryMonitor:
+    """
+    Context manager that samples this process's resident memory in a background
+    thread and records the peak seen while the block runs.
+
+    Memory used by child processes (e.g. parallel OCR workers) is not included.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        self.peak_bytes = max(self.peak_bytes, get_current_rss_bytes())
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop_event.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+    @property
+    def peak_mb(self):
+        return self.peak_bytes / (1024 * 1024)
@@ -0,0 +1,63 @@
+from src.consolidator import document_kind, normalize_date_value, merge_documents, consolidate_locally
+
+
+def _result(document_type, **data):
+    return {'doc_path': f"{document_type}.pdf", 'extracted': {'document_type': document_type, 'data': data}}
+
+
+def test_document_kind():
+    assert document_kind('PAN Card') == 'PAN'
+    assert document_kind('Aadhar') == 'Aadhaar'
+    assert document_kind('Bank Statement') == 'Bank Passbook'
+    assert document_kind('Company PAN') is None
+    assert document_kind(None) is None
+
+
+def test_normalize_date_value():
+    assert normalize_date_value('15/08/1990') == '1990-08-15'
+    assert normalize_date_value('15 Aug 1990') == '1990-08-15'
+    assert normalize_date_value('1990-08-15') == '1990-08-15'
+    assert normalize_date_value('sometime in 1990') == 'sometime in 1990'
+
+
+def test_aliases_are_mapped_to_profile_fields():
+    consolidated, conflicts = merge_documents([_result('PAN', name='Ravi Kumar', dob='15/08/1990', pan='abcde1234f')])
+    assert consolidated == {'full_name': 'Ravi Kumar', 'date_of_birth': '1990-08-15', 'pan_number': 'ABCDE1234F'}
+    assert conflicts == {}
+
+
+def test_agreeing_values_use_the_priority_source_formatting():
+    consolidated, conflicts = merge_documents([
+        _result('Bank Passbook', full_name='RAVI  KUMAR'),
+        _result('PAN', full_name='Ravi Kumar'),
+    ])
+    assert consolidated['full_name'] == 'Ravi Kumar'
+    assert conflicts == {}
+
+
+def test_priority_source_decides_disagreements():
+    consolidated, conflicts = merge_documents([
+        _result('Aadhaar', date_of_birth='01/01/1990', address='12 MG Road'),
+        _result('PAN', date_of_birth='15/08/1990'),
+        _result('Bank Passbook', address='Flat 4, 12 MG Road'),
+    ])
+    assert consolidated == {'date_of_birth': '1990-08-15', 'address': '12 MG Road'}
+    assert conflicts == {}
+
+
+def test_fields_without_priority_source_conflict():
+    consolidated, conflicts = merge_documents([
+        _result('Aadhaar', phone_number='9876543210'),
+        _result('Bank Passbook', phone_number='9123456780'),
+    ])
+    assert 'phone_number' not in consolidated
+    assert conflicts['phone_number'] == [{'document_type': 'Aadhaar', 'value': '9876543210'},
+                                         {'document_type': 'Bank Passbook', 'value': '9123456780'}]
+
+
+def test_conflicts_are_resolved_or_fall_back_to_the_most_complete_value():
+    results = [_result('Other', email='ravi@example.com', phone_number='9876543210'),
+               _result('Other', email='ravi.kumar@example.com', phone_number='9123456780')]
+    consolidated = consolidate_locally(results, resolve_conflicts=lambda conflicts: {'phone_number': '9123456780'})
+    assert consolidated['phone_number'] == '9123456780'
+    assert consolidated['email'] == 'ravi.kumar@example.com'
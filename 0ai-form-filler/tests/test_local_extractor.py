@@ -0,0 +1,84 @@
+from src.local_extractor import (PAN_DOCUMENT, AADHAAR_DOCUMENT, PASSBOOK_DOCUMENT, verhoeff_valid, normalize_date,
+                                 classify_document, extract_locally)
+
+# Passes the Verhoeff check; changing any digit breaks it
+VALID_AADHAAR = '234567890124'
+
+PAN_TEXT = """INCOME TAX DEPARTMENT
+GOVT. OF INDIA
+Permanent Account Number Card
+ABCDE1234F
+Name
+RAVI KUMAR
+Father's Name
+SURESH KUMAR
+Date of Birth
+15/08/1990"""
+
+AADHAAR_TEXT = f"""Government of India
+Unique Identification Authority of India
+Ravi Kumar
+DOB: 15/08/1990
+MALE
+{VALID_AADHAAR[:4]} {VALID_AADHAAR[4:8]} {VALID_AADHAAR[8:]}"""
+
+PASSBOOK_TEXT = """STATE BANK OF INDIA
+Branch: MG Road
+Customer Name: Ravi Kumar
+A/C No: 123456789012
+IFSC: SBIN0001234"""
+
+
+def test_verhoeff_accepts_valid_aadhaar():
+    assert verhoeff_valid(VALID_AADHAAR)
+
+
+def test_verhoeff_rejects_single_digit_error():
+    assert not verhoeff_valid(VALID_AADHAAR[:-1] + '5')
+    assert not verhoeff_valid('3' + VALID_AADHAAR[1:])
+
+
+def test_normalize_date():
+    assert normalize_date('15', '08', '1990') == '1990-08-15'
+    assert normalize_date('31', '02', '1990') is None
+
+
+def test_classify_document():
+    assert classify_document(PAN_TEXT) == PAN_DOCUMENT
+    assert classify_document(AADHAAR_TEXT) == AADHAAR_DOCUMENT
+    assert classify_document(PASSBOOK_TEXT) == PASSBOOK_DOCUMENT
+    assert classify_document("Electricity bill for March") is None
+
+
+def test_classify_document_is_unsure_about_mixed_documents():
+    assert classify_document(PASSBOOK_TEXT + "\nPAN: ABCDE1234F\nINCOME TAX DEPARTMENT") is None
+
+
+def test_aadhaar_keyword_needs_valid_number():
+    assert classify_document(AADHAAR_TEXT.replace(VALID_AADHAAR[8:], '0125')) is None
+
+
+def test_extract_pan():
+    result = extract_locally(PAN_TEXT)
+    assert result == {'document_type': PAN_DOCUMENT,
+                      'data': {'pan_number': 'ABCDE1234F', 'full_name': 'RAVI KUMAR', 'father_name': 'SURESH KUMAR',
+                               'date_of_birth': '1990-08-15'}}
+
+
+def test_extract_aadhaar():
+    result = extract_locally(AADHAAR_TEXT)
+    assert result['document_type'] == AADHAAR_DOCUMENT
+    assert result['data'] == {'aadhaar_number': '2345 6789 0124', 'date_of_birth': '1990-08-15',
+                              'full_name': 'Ravi Kumar', 'gender': 'Male'}
+
+
+def test_extract_passbook():
+    result = extract_locally(PASSBOOK_TEXT)
+    assert result['document_type'] == PASSBOOK_DOCUMENT
+    assert result['data']['account_number'] == '123456789012'
+    assert result['data']['ifsc_code'] == 'SBIN0001234'
+    assert result['data']['full_name'] == 'Ravi Kumar'
+
+
+def test_missing_required_field_falls_back_to_gemini():
+    assert extract_locally(PAN_TEXT.replace('15/08/1990', '')) is None
@@ -0,0 +1,44 @@
+from src.output_schema import clean_field_value, validate_fields, validate_extraction
+
+
+def test_clean_field_value_normalizes():
+    assert clean_field_value('pan_number', 'abcde 1234f') == 'ABCDE1234F'
+    assert clean_field_value('account_number', '1234-5678 9012') == '123456789012'
+    assert clean_field_value('date_of_birth', '15/08/1990') == '1990-08-15'
+    assert clean_field_value('full_name', '  Ravi   Kumar ') == 'Ravi Kumar'
+
+
+def test_clean_field_value_rejects_empty_and_malformed():
+    assert clean_field_value('full_name', 'N/A') is None
+    assert clean_field_value('pan_number', 'ABCD1234F') is None
+    assert clean_field_value('ifsc_code', 'SBIN1001234') is None
+    assert clean_field_value('address', {'line1': '12 MG Road'}) is None
+
+
+def test_validate_fields_reports_malformed_then_missing():
+    cleaned, reask = validate_fields({'pan_number': 'XX', 'full_name': 'Ravi Kumar', 'note': 'kept'},
+                                     required=('pan_number', 'date_of_birth'))
+    assert cleaned == {'full_name': 'Ravi Kumar', 'note': 'kept'}
+    assert reask == ['pan_number', 'date_of_birth']
+
+
+def test_validate_fields_treats_rejected_free_text_as_missing():
+    cleaned, reask = validate_fields({'full_name': 'null', 'address': {'line1': '12 MG Road'}}, required=('full_name',))
+    assert cleaned == {}
+    assert reask == ['full_name']
+
+    extracted, reask = validate_extraction({'document_type': 'PAN', 'data': {
+        'pan_number': 'ABCDE1234F', 'full_name': 'N/A', 'date_of_birth': '15/08/1990'}})
+    assert 'full_name' not in extracted['data']
+    assert reask == ['full_name']
+
+
+def test_validate_extraction_matches_document_type_loosely():
+    extracted, reask = validate_extraction({'document_type': 'PAN Card', 'data': {'pan_number': 'ABCDE1234F'}})
+    assert extracted['data'] == {'pan_number': 'ABCDE1234F'}
+    assert reask == ['full_name', 'date_of_birth']
+
+
+def test_validate_extraction_rejects_wrong_shape():
+    assert validate_extraction({'document_type': 'PAN', 'data': 'ABCDE1234F'}) == (None, [])
+    assert validate_extraction(['PAN']) == (None, [])
@@ -0,0 +1,30 @@
+from PIL import Image
+from src.page_triage import ink_ratio, score_page_text, select_pages
+
+HOLDER_PAGE = """Customer Name: Ravi Kumar
+A/C No: 123456789012
+IFSC: SBIN0001234 Branch: MG Road"""
+
+TRANSACTION_PAGE = "\n".join(["Date Particulars Withdrawal Deposit Balance"] +
+                             [f"{day:02d}/03/2024 UPI transfer 500.00 12000.00" for day in range(1, 21)])
+
+
+def test_holder_page_outscores_transaction_page():
+    assert score_page_text(HOLDER_PAGE) > 0
+    assert score_page_text(TRANSACTION_PAGE) < 0
+
+
+def test_ink_ratio():
+    assert ink_ratio(Image.new('L', (10, 10), 255)) == 0
+    page = Image.new('L', (10, 10), 255)
+    page.paste(0, (0, 0, 10, 1))
+    assert ink_ratio(page) == 0.1
+
+
+def test_select_pages_keeps_best_pages_in_page_order():
+    assert select_pages({1: 3, 2: -2, 3: 8, 4: 3, 5: None}, max_pages=2) == [1, 3]
+
+
+def test_select_pages_falls_back_when_unsure():
+    assert select_pages({1: 0, 2: None, 3: -1}) == [1, 3]
+    assert select_pages({1: None, 2: None}) == [1, 2]
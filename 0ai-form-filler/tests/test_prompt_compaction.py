@@ -0,0 +1,25 @@
+from src.prompt_compaction import compact_ocr_text, truncate_text
+
+
+def test_page_repeating_a_keyword_line_keeps_its_own_lines():
+    ocr_text = ("[--- Page 1 ---]\nName: Ravi Kumar\nPAN: ABCDE1234F\n"
+                "[--- Page 2 ---]\nName: Ravi Kumar\nFlat 4, MG Road")
+    compacted = compact_ocr_text(ocr_text)
+    assert compacted.count("Name: Ravi Kumar") == 1
+    assert "[Page 2]\nFlat 4, MG Road" in compacted
+
+
+def test_bare_numbers_are_page_numbers_only_at_page_edges():
+    ocr_text = "[--- Page 1 ---]\n12\nName: Ravi Kumar\nAddress: Flat\n404\nMG Road\n3"
+    assert compact_ocr_text(ocr_text) == "Name: Ravi Kumar\nAddress: Flat\n404\nMG Road"
+
+
+def test_footers_noise_and_irrelevant_pages_are_dropped():
+    ocr_text = ("[--- Page 1 ---]\nName: Ravi Kumar\n| ~ _\nPage 1 of 2\n"
+                "[--- Page 2 ---]\nTerms and conditions apply\n- 2 -")
+    assert compact_ocr_text(ocr_text) == "Name: Ravi Kumar"
+
+
+def test_truncate_text_cuts_at_a_line_break():
+    assert truncate_text("first line\nsecond line", 15) == "first line"
+    assert truncate_text("short", 15) == "short"
@@ -0,0 +1,25 @@
+import pytest
+from benchmarks.bench_startup import ENTRY_POINTS, LAZY_MODULES, DEFAULT_BUDGET_MS, import_times, eagerly_imported
+
+
+@pytest.fixture(scope='module', params=ENTRY_POINTS)
+def entry_point_times(request):
+    _, times = import_times(request.param)
+    return request.param, times
+
+
+def test_entry_point_import_within_budget(entry_point_times):
+    entry_point, times = entry_point_times
+    assert times[entry_point] / 1000 <= DEFAULT_BUDGET_MS
+
+
+def test_entry_point_does_not_import_backends(entry_point_times):
+    _, times = entry_point_times
+    assert eagerly_imported(times, LAZY_MODULES) == []
+
+
+@pytest.mark.parametrize('entry_point', ENTRY_POINTS)
+def test_help_does_not_import_backends(entry_point):
+    # Building the parser (cli_options.add_pipeline_arguments) must not load the OCR stack either
+    _, times = import_times(entry_point, ['--help'])
+    assert eagerly_imported(times, LAZY_MODULES) == []